@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import logging
+import os
+import random
+import re
+import time
+
+parser = argparse.ArgumentParser(description='Benchmark for CurrentTree.cmp_dicts using synthetic trees')
+
+parser.add_argument('-n', '--nrecords', type=int, default=1000000,
+                    help="Number of records in the synthetic production tree. Default: 1000000")
+parser.add_argument('--changes', type=float, default=0.01,
+                    help="Fraction of records that will be new, withdrawn, moved and replaced "
+                         "(each) in the synthetic DB tree. Default: 0.01")
+parser.add_argument('--legacy', action='store_true',
+                    help="Also run the legacy (quadratic) implementation and check that both results "
+                         "are identical. Only feasible with small --nrecords")
+parser.add_argument('--compact', action='store_true',
+                    help="Store the synthetic trees in CompactTree objects and report their memory usage")
+parser.add_argument('--seed', type=int, default=1, help="Seed for the random number generator")
+parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
+args = parser.parse_args()
+
+# logging
+loglevel = args.log
+numeric_level = getattr(logging, loglevel.upper(), None)
+if not isinstance(numeric_level, int):
+    raise ValueError('Invalid log level: %s' % loglevel)
+
+logging.basicConfig(level=numeric_level)
+
+# cmp_dicts logs at INFO level, keep the benchmark output readable
+logging.getLogger('igsr_archive.current_tree').setLevel(logging.WARNING)
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+from igsr_archive.current_tree import CurrentTree
+from igsr_archive.change_events import ChangeEvents
+from igsr_archive.compact_tree import CompactTree, dict_memory_usage
+
+def synthetic_trees(n, changes, seed):
+    """
+    Function to generate a pair of synthetic trees with
+    FTP-like paths
+
+    Parameters
+    ----------
+    n : int
+        Number of records in the production tree.
+    changes : float
+              Fraction of records for each of the new, withdrawn,
+              moved and replaced categories.
+    seed : int
+           Seed for the random number generator.
+
+    Returns
+    -------
+    db_dict, file_dict : tuple of dict
+                         { 'path' : md5 }
+    """
+    rnd = random.Random(seed)
+    file_dict = {}
+    for i in range(n):
+        path = f"ftp/data_collections/collection_{i % 50}/data/SAMPLE{i % 3000:05d}/alignment/file_{i}.cram"
+        file_dict[path] = hashlib.md5(str(i).encode()).hexdigest()
+
+    db_dict = dict(file_dict)
+    nchanges = int(n * changes)
+    paths = rnd.sample(list(file_dict.keys()), 3 * nchanges)
+    withdrawn, moved, replaced = (paths[:nchanges], paths[nchanges:2 * nchanges],
+                                  paths[2 * nchanges:])
+    for p in withdrawn:
+        del db_dict[p]
+    for p in moved:
+        db_dict[p.replace('/alignment/', '/alignment_moved/')] = db_dict.pop(p)
+    for p in replaced:
+        db_dict[p] = hashlib.md5(f"{p}.new".encode()).hexdigest()
+    for i in range(nchanges):
+        db_dict[f"ftp/data_collections/new_collection/file_{i}.cram"] = \
+            hashlib.md5(f"new_{i}".encode()).hexdigest()
+
+    return db_dict, file_dict
+
+def legacy_cmp_dicts(db_dict, file_dict):
+    """
+    Implementation of CurrentTree.cmp_dicts scanning both dicts for each new path.
+    Used as reference for the results
+    """
+    d1_keys = set(db_dict.keys())
+    d2_keys = set(file_dict.keys())
+    shared_keys = d1_keys.intersection(d2_keys)
+    new_in_db = d1_keys - d2_keys
+    new = d1_keys - d2_keys
+    withdrawn = d2_keys - d1_keys
+    moved = {}
+
+    p = re.compile(".*changelog_details_.*_.*")
+    for r in new_in_db:
+        if p.match(r):
+            new.remove(r)
+            continue
+        md5 = db_dict[r]
+        pathfdict = [key for (key, value) in file_dict.items() if value == md5]
+        pathdbdict = [key for (key, value) in db_dict.items() if value == md5]
+        for i, j in zip(pathfdict, pathdbdict):
+            if j in new:
+                new.remove(j)
+            if i in withdrawn:
+                withdrawn.remove(i)
+            moved[j] = i
+
+    replacement = {o: (db_dict[o], file_dict[o]) for o in shared_keys if db_dict[o] != file_dict[o]}
+    replacement.pop('ftp/CHANGELOG', None)
+    replacement.pop('ftp/current.tree', None)
+
+    return ChangeEvents(new, withdrawn, moved, replacement)
+
+logger.info(f"Generating synthetic trees with {args.nrecords} records")
+db_dict, file_dict = synthetic_trees(args.nrecords, args.changes, args.seed)
+
+if args.compact:
+    dict_size = dict_memory_usage(db_dict) + dict_memory_usage(file_dict)
+    db_dict, file_dict = CompactTree(db_dict), CompactTree(file_dict)
+    compact_size = db_dict.memory_usage() + file_dict.memory_usage()
+    logger.info(f"Memory used by the dicts: {dict_size / 2**20:.1f} MB, "
+                f"by the CompactTree objects: {compact_size / 2**20:.1f} MB")
+
+ctree = CurrentTree(db=None, api=None, prod_tree=None, staging_tree=None)
+
+start = time.perf_counter()
+chgEvents = ctree.cmp_dicts(db_dict=db_dict, file_dict=file_dict)
+elapsed = time.perf_counter() - start
+
+logger.info(f"cmp_dicts: {elapsed:.2f}s for {args.nrecords} records "
+            f"({args.nrecords / elapsed:.0f} records/s)")
+logger.info(f"new: {len(chgEvents.new)}, withdrawn: {len(chgEvents.withdrawn)}, "
+            f"moved: {len(chgEvents.moved)}, replacement: {len(chgEvents.replacement)}")
+
+if args.legacy:
+    start = time.perf_counter()
+    legacyEvents = legacy_cmp_dicts(db_dict=db_dict, file_dict=file_dict)
+    elapsed = time.perf_counter() - start
+    logger.info(f"legacy cmp_dicts: {elapsed:.2f}s for {args.nrecords} records")
+
+    assert chgEvents.new == legacyEvents.new
+    assert chgEvents.withdrawn == legacyEvents.withdrawn
+    assert chgEvents.moved == legacyEvents.moved
+    assert chgEvents.replacement == legacyEvents.replacement
+    logger.info("Results are identical")
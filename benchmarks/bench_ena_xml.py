@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+
+parser = argparse.ArgumentParser(description='Benchmark of the CPU time and memory used for extracting the sample '
+                                             'attributes from a synthetic ENA browser XML response, with xmltodict '
+                                             'and with the streaming extractor')
+
+parser.add_argument('-n', '--nsamples', type=int, default=10000,
+                    help="Number of samples in the synthetic <SAMPLE_SET>. Default: 10000")
+parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
+args = parser.parse_args()
+
+# logging
+loglevel = args.log
+numeric_level = getattr(logging, loglevel.upper(), None)
+if not isinstance(numeric_level, int):
+    raise ValueError('Invalid log level: %s' % loglevel)
+
+logging.basicConfig(level=numeric_level)
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+import xmltodict
+
+from igsr_archive.ena.xml_extractor import iter_entries
+
+def synthetic_xml(n):
+    """
+    Function to generate a synthetic <SAMPLE_SET> like
+    the ones returned by the ENA browser API
+
+    Parameters
+    ----------
+    n : int
+        Number of samples.
+
+    Returns
+    -------
+    bytes
+    """
+    attrbs = "".join(f"<SAMPLE_ATTRIBUTE><TAG>tag{j}</TAG><VALUE>value{j}</VALUE></SAMPLE_ATTRIBUTE>"
+                     for j in range(12))
+    samples = "".join(f"<SAMPLE accession=\"ERS{i:07d}\" alias=\"sample{i}\"><IDENTIFIERS>"
+                      f"<PRIMARY_ID>ERS{i:07d}</PRIMARY_ID>"
+                      f"<EXTERNAL_ID namespace=\"BioSample\">SAMEA{i:07d}</EXTERNAL_ID></IDENTIFIERS>"
+                      f"<TITLE>Sample {i}</TITLE><SAMPLE_LINKS><SAMPLE_LINK><XREF_LINK><DB>ENA-SUBMISSION</DB>"
+                      f"<ID>ERA{i:07d}</ID></XREF_LINK></SAMPLE_LINK></SAMPLE_LINKS><SAMPLE_ATTRIBUTES>{attrbs}"
+                      f"<SAMPLE_ATTRIBUTE><TAG>population</TAG><VALUE>POP{i % 26}</VALUE></SAMPLE_ATTRIBUTE>"
+                      f"</SAMPLE_ATTRIBUTES></SAMPLE>" for i in range(n))
+
+    return f"<?xml version=\"1.0\" encoding=\"UTF-8\"?><SAMPLE_SET>{samples}</SAMPLE_SET>".encode()
+
+def with_xmltodict(data):
+    """
+    Function getting the population of each sample with xmltodict,
+    as ENAbrowser.query and ENAbrowser.fetch_attrbs do
+    """
+    xmld = xmltodict.parse(data)
+    pops = {}
+    for sample in xmld['SAMPLE_SET']['SAMPLE']:
+        for item in sample['SAMPLE_ATTRIBUTES']['SAMPLE_ATTRIBUTE']:
+            if item['TAG'] == 'population':
+                pops[sample['@accession']] = item['VALUE']
+
+    return pops
+
+def with_iter_entries(data):
+    """
+    Function getting the population of each sample with iter_entries,
+    reading the response in chunks as ENAbrowser.iter_entries does
+    """
+    chunks = (data[i:i + 65536] for i in range(0, len(data), 65536))
+
+    return {e['accession']: e['attrbs'].get('population')
+            for e in iter_entries(chunks, alist=['population'])}
+
+def measure(label, extract, data):
+    """
+    Function to measure the time and the peak of memory used
+    for extracting the populations
+
+    Parameters
+    ----------
+    label : str
+            Name of the method.
+    extract : function
+              Function extracting the populations from the XML.
+    data : bytes
+           XML document.
+
+    Returns
+    -------
+    dict
+        Populations extracted.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    pops = extract(data)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc slows down the allocations, so the
+    # memory is measured in a separate run
+    gc.collect()
+    tracemalloc.start()
+    extract(data)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    logger.info(f"{label}: {elapsed:.2f}s and {peak / 2**20:.0f} MB peak for {len(pops)} samples")
+
+    return pops
+
+logger.info(f"Generating a <SAMPLE_SET> with {args.nsamples} samples")
+data = synthetic_xml(args.nsamples)
+logger.info(f"Size of the XML: {len(data) / 2**20:.0f} MB")
+
+pops_xmltodict = measure("xmltodict", with_xmltodict, data)
+pops_iter_entries = measure("iter_entries", with_iter_entries, data)
+
+if pops_xmltodict != pops_iter_entries:
+    raise Exception("The populations extracted with xmltodict and iter_entries are different")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+import argparse
+import gc
+import hashlib
+import logging
+import time
+import tracemalloc
+
+parser = argparse.ArgumentParser(description='Benchmark of the construction cost and memory usage of File '
+                                             'and FileRecord objects created from synthetic DB rows')
+
+parser.add_argument('-n', '--nrows', type=int, default=1000000,
+                    help="Number of synthetic rows of the 'file' table. Default: 1000000")
+parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
+args = parser.parse_args()
+
+# logging
+loglevel = args.log
+numeric_level = getattr(logging, loglevel.upper(), None)
+if not isinstance(numeric_level, int):
+    raise ValueError('Invalid log level: %s' % loglevel)
+
+logging.basicConfig(level=numeric_level)
+
+# File logs at DEBUG level for each object, keep the benchmark output readable
+logging.getLogger('igsr_archive.file').setLevel(logging.WARNING)
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+from igsr_archive.db import FILE_COLUMNS
+from igsr_archive.file import File
+from igsr_archive.file_record import FileRecord
+
+def synthetic_rows(n):
+    """
+    Function to generate synthetic rows of the 'file' table,
+    as returned by the DB cursor
+
+    Parameters
+    ----------
+    n : int
+        Number of rows.
+
+    Returns
+    -------
+    list of tuples
+    """
+    return [(i, f"/nfs/1000g-archive/vol1/ftp/data_collections/bench/data/sample_{i}/file_{i}.cram",
+             hashlib.md5(str(i).encode()).hexdigest(), "CRAM", i, 1, 0,
+             "2021-01-01 00:00:00", "2021-01-01 00:00:00") for i in range(n)]
+
+def measure(label, build, rows):
+    """
+    Function to measure the time and the memory used
+    for creating an object for each of the rows
+
+    Parameters
+    ----------
+    label : str
+            Name of the type of object.
+    build : function
+            Function creating the objects from the rows.
+    rows : list of tuples
+    """
+    gc.collect()
+    start = time.perf_counter()
+    objs = build(rows)
+    elapsed = time.perf_counter() - start
+    del objs
+
+    # tracemalloc slows down the allocations, so the
+    # memory is measured in a separate run
+    gc.collect()
+    tracemalloc.start()
+    objs = build(rows)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_million = 1000000 / len(rows)
+    logger.info(f"{label}: {elapsed * per_million:.2f}s and {current * per_million / 2**20:.0f} MB "
+                f"per million rows ({len(rows) / elapsed:.0f} objects/s)")
+    del objs
+
+logger.info(f"Generating {args.nrows} synthetic rows")
+rows = synthetic_rows(args.nrows)
+
+measure("File", lambda rows: [File(**dict(zip(FILE_COLUMNS, row))) for row in rows], rows)
+measure("FileRecord", lambda rows: [FileRecord._make(row) for row in rows], rows)
+measure("FileRecord.to_file", lambda rows: [FileRecord._make(row).to_file() for row in rows], rows)
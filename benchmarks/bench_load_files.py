@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import logging
+import os
+import time
+import uuid
+
+parser = argparse.ArgumentParser(description='Benchmark for DB.load_files using synthetic file entries. The '
+                                             'entries are deleted from the DB after the benchmark')
+
+parser.add_argument('-s', '--settings', required=True,
+                    help="Path to .ini file with settings")
+parser.add_argument('-n', '--nfiles', type=int, default=100000,
+                    help="Number of synthetic entries loaded in the 'file' table. Default: 100000")
+parser.add_argument('--batch_size', type=int, default=1000,
+                    help="Number of entries loaded in each batch. Default: 1000")
+parser.add_argument('--per_file', type=int, default=0,
+                    help="Also load this number of entries one by one using DB.load_file for comparison. "
+                         "Default: 0")
+parser.add_argument('--dbpwd', help="Password for MYSQL server. If not provided then it will try to guess"
+                                    "the password from the $DBPWD env variable")
+parser.add_argument('--dbname', help="Database name. If not provided then it will try to guess"
+                                     "the dbname from the $DBNAME env variable")
+parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
+
+args = parser.parse_args()
+
+# logging
+loglevel = args.log
+numeric_level = getattr(logging, loglevel.upper(), None)
+if not isinstance(numeric_level, int):
+    raise ValueError('Invalid log level: %s' % loglevel)
+
+logging.basicConfig(level=numeric_level)
+
+# load_file logs at INFO level for each file, keep the benchmark output readable
+logging.getLogger('igsr_archive.db').setLevel(logging.WARNING)
+
+# Create logger
+logger = logging.getLogger(__name__)
+
+if not os.path.isfile(args.settings):
+    raise Exception(f"Config file provided using --settings option({args.settings}) not found!")
+# set the CONFIG_FILE env variable
+os.environ["CONFIG_FILE"] = os.path.abspath(args.settings)
+
+from igsr_archive.db import DB
+from igsr_archive.file import File
+
+dbpwd = args.dbpwd if args.dbpwd is not None else os.getenv('DBPWD')
+dbname = args.dbname if args.dbname is not None else os.getenv('DBNAME')
+assert dbname, "$DBNAME undefined"
+assert dbpwd, "$DBPWD undefined"
+
+db = DB(pwd=dbpwd, dbname=dbname)
+
+# all the synthetic entries share this prefix, so they can be deleted afterwards
+prefix = f"/tmp/bench_load_files_{uuid.uuid4().hex}"
+
+def synthetic_files(n, tag):
+    return [File(name=f"{prefix}/{tag}/file_{i}.cram",
+                 type="BENCH",
+                 md5=hashlib.md5(f"{tag}_{i}".encode()).hexdigest(),
+                 size=i,
+                 created="2021-01-01 00:00:00") for i in range(n)]
+
+try:
+    files = synthetic_files(args.nfiles, "batch")
+    start = time.perf_counter()
+    codes = db.load_files(files, batch_size=args.batch_size, dry=False)
+    elapsed = time.perf_counter() - start
+    assert codes.count(0) == args.nfiles, f"{codes.count(1)} files could not be loaded"
+    logger.info(f"load_files: {args.nfiles} rows in {elapsed:.2f}s "
+                f"({args.nfiles / elapsed:.0f} rows/s) with batch_size={args.batch_size}")
+
+    if args.per_file > 0:
+        files = synthetic_files(args.per_file, "per_file")
+        start = time.perf_counter()
+        for f in files:
+            db.load_file(f, dry=False)
+        elapsed = time.perf_counter() - start
+        logger.info(f"load_file: {args.per_file} rows in {elapsed:.2f}s "
+                    f"({args.per_file / elapsed:.0f} rows/s)")
+finally:
+    cursor = db.conn.cursor()
+    cursor.execute("DELETE FROM file WHERE name LIKE %s", [prefix + "/%"])
+    db.conn.commit()
+    cursor.close()
+    logger.info(f"Synthetic entries deleted from the DB")
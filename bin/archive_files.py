@@ -34,6 +34,15 @@ parser.add_argument('--dbname', help="Database name. If not provided then it wil
                                      "the dbname from the $DBNAME env variable")
 parser.add_argument('--firepwd', help="FIRE api password. If not provided then it will try to guess"
                                       "the FIRE pwd from the $FIRE_PWD env variable")
+parser.add_argument('--workers', type=int, default=1, help="Number of files archived at once. Default: 1")
+parser.add_argument('--max_uploads', type=int, help="Max number of files uploaded to FIRE at once. "
+                                                     "Default: same as --workers")
+parser.add_argument('--batch_size', type=int, default=1000, help="Number of archived files for which the DB entries "
+                                                                "are updated at once. Default: 1000")
+parser.add_argument('--md5_cache', help="Path to a SQLite file used for caching the md5sums of the files. If not "
+                                         "provided then the 'path' option in the 'md5_cache' section of the "
+                                         "settings file will be used (if any)")
+parser.add_argument('--no_md5_cache', action='store_true', help="Do not use the md5 cache")
 parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
 
 args = parser.parse_args()
@@ -62,7 +71,9 @@ settingsO.read(args.settings)
 from igsr_archive.utils import str2bool
 from igsr_archive.db import DB
 from igsr_archive.api import API
-from igsr_archive.file import File
+from igsr_archive.file import set_md5_cache
+from igsr_archive.md5_cache import md5_cache_from_args
+from igsr_archive.archive_pipeline import ArchivePipeline
 
 dbpwd = args.dbpwd
 if args.dbpwd is None:
@@ -114,112 +125,23 @@ db = DB(pwd=dbpwd,
 # connection to FIRE api
 api = API(pwd=firepwd)
 
-for f in files:
-    fireObj = None
-
-    # check if path exists
-    if not os.path.isfile(f):
-        raise Exception(f"File path to be archived: {f} does not exist. Can't continue!")
-    # check if staging mount point exists in file path to be archived
-    if not settingsO.get('ftp', 'staging_mount') in f:
-        raise Exception(f"File to be archived: {f} is not placed in the staging area:"
-                        f" {settingsO.get('ftp', 'staging_mount')}.\nYou need to move it first. Can't continue!")
-    fire_path = re.sub(settingsO.get('ftp', 'staging_mount')+"/", '', f)
-    ftp_path = os.path.join(settingsO.get('ftp', 'ftp_mount'), fire_path)
-
-    # check if 'f' exists in db and fetch the file
-    f_indb_o = db.fetch_file(path=f)
-
-    # check if this file is already in the ftp
-    # by querying the FTP path to db
-    f_inftp_o = db.fetch_file(path=ftp_path)
-    
-    # check if this fire_path is already in the FTP by
-    # querying the FIRE API
-    f_in_fire_o = api.fetch_object(firePath=fire_path)
-    if f_indb_o is None and f_inftp_o is not None:
-        if str2bool(args.update_existing) is True:
-            # 'f' that is in the staging area does not exist in DB, but it does exist in the FTP
-            # This means that user wants to update a file that is already in te FTP.
-            logger.info(f"It seems that file: {f} is already archived and --update_existing is True")
-            logger.info(f"Archived file will be updated with new file")
-
-            # First, retrieve the FIRE object
-            dearch_fobj = api.fetch_object(firePath=fire_path)
-
-            assert dearch_fobj is not None, f"Object with FIRE path: {fire_path} was not retrieved"
-
-            # delete the FIRE object
-            api.delete_object(fireOid=dearch_fobj.fireOid,
-                              dry=str2bool(args.dry))
-
-            # Create File object pointing to the file placed in the staging area
-            f_in_staging = File(name=f)
-
-            # now update the metadata for f_inftp_o
-            status_code = db.update_file(attr_name='md5',
-                                         value=f_in_staging.md5,
-                                         name=ftp_path,
-                                         dry=str2bool(args.dry))
-            assert status_code == 0, "Something went wrong when updating the 'md5' field of the entry in the 'File'" \
-                                     "table of the the DB"
-
-            status_code = db.update_file(attr_name='size',
-                                         value=f_in_staging.size,
-                                         name=ftp_path,
-                                         dry=str2bool(args.dry))
-            assert status_code == 0, "Something went wrong when updating the 'size' field of the entry in the 'File'" \
-                                     "table of the the DB"
-
-            # Now, push the new file
-            # push the file to FIRE where fire_path will the path in the FIRE
-            # filesystem
-            fireObj = api.push_object(fileO=f_in_staging,
-                                      dry=str2bool(args.dry),
-                                      fire_path=fire_path)
-        elif str2bool(args.update_existing) is False:
-            logger.info(f"It seems that file: {f} is already archived and --update_existing is False")
-            logger.info(f"Archived file will not be updated with new file")
-    elif f_indb_o is not None and f_inftp_o is None:
-        # 'f' does not exist in the FTP, archive it as a new file
-        if f_in_fire_o is not None:
-            logger.info("Wrong FTP path has been added to FTP, this will be deleted")
-            api.delete_object(fireOid=f_in_fire_o.fireOid,dry=str2bool(args.dry))
-
-        # push the file to FIRE where fire_path will the path in the FIRE
-        # filesystem
-        fireObj = api.push_object(fileO=f_indb_o,
-                                  dry=str2bool(args.dry),
-                                  fire_path=fire_path)
-
-        # now, modify the file entry in the db and update its name (path)
-        ret_db_code = db.update_file(attr_name='name',
-                                     value=ftp_path,
-                                     name=f,
-                                     dry=str2bool(args.dry))
-    elif f_indb_o is None and f_inftp_o is None:
-        # 'f' does not exist neither the DB nor the FTP. Raise exception
-        raise Exception(f"File entry with path {f} does not exist in the DB. "
-                        f"You need to load it first in order to proceed")
-    else:
-        logger.info("Do not know what to do!!")
-        raise Exception("Process halted!!!")
-
-    if args.type:
-        logger.info(f"--type option provided. Its value will be used for updating"
-                    f" the file type in {args.dbname}")
-
-        status_code = db.update_file(attr_name='type',
-                                     value=args.type,
-                                     name=ftp_path,
-                                     dry=str2bool(args.dry))
-        assert status_code == 0, "Something went wrong when updating the 'type' field of the entry in the 'File'" \
-                                 "table of the the DB"
-
-    # Finally, delete the file that has been pushed
-    if str2bool(args.dry) is False:
-        if fireObj is not None:
-            logger.info(f"File successfully pushed and correctly updated in the DB")
-            logger.info(f"File {f} will be removed")
-            os.remove(f)
-
+# md5 cache used when calculating the md5sums of the files
+md5_cache = md5_cache_from_args(path=args.md5_cache, disable=args.no_md5_cache)
+set_md5_cache(md5_cache)
+
+pipeline = ArchivePipeline(db=db,
+                           api=api,
+                           workers=args.workers,
+                           limits={'push': args.max_uploads or args.workers},
+                           batch_size=args.batch_size,
+                           type=args.type,
+                           update_existing=str2bool(args.update_existing),
+                           dry=str2bool(args.dry))
+summary = pipeline.run(files)
+
+if md5_cache is not None:
+    logger.info(f"md5 cache usage: {md5_cache.stats()}")
+    md5_cache.close()
+
+if summary['failed']:
+    raise Exception(f"{len(summary['failed'])} files could not be archived: {', '.join(summary['failed'])}")
@@ -18,7 +18,8 @@ parser.add_argument('--dry', default=True,
                     help="Perform a dry-run and attempt to dearchive the file without "
                          "effectively doing it. True: Perform a dry-run")
 parser.add_argument('--md5check', default=True,
-                    help="Check if md5sum of downloaded file and FIRE object matches before dearchiving from FIRE")
+                    help="Check if md5sum of downloaded file and FIRE object matches before dearchiving from FIRE. "
+                         "The md5sum is calculated while the file is downloaded")
 parser.add_argument('-f', '--file', help="Path to file to be dearchived. It must exists in the g1k_archive_staging_track DB")
 parser.add_argument('-l', '--list_file', type=argparse.FileType('r'), help="File containing the paths of the files to"
                                                                            "be dearchived")                                                                  
@@ -30,6 +31,23 @@ parser.add_argument('--dbname', help="Database name. If not provided then it wil
                                      "the dbname from the $DBNAME env variable")
 parser.add_argument('--firepwd', help="FIRE api password. If not provided then it will try to guess"
                                       "the FIRE pwd from the $FIRE_PWD env variable")
+parser.add_argument('--workers', type=int, default=1, help="Number of files downloaded at once. Default: 1")
+parser.add_argument('--part_workers', type=int, help="Number of ranged GETs used for downloading each file. If not "
+                                                      "provided then the 'download_workers' option in the 'fire' "
+                                                      "section of the settings file will be used")
+parser.add_argument('--batch_size', type=int, default=100, help="Number of dearchived files for which the FIRE "
+                                                               "objects and DB entries are deleted at once. "
+                                                               "Default: 100")
+parser.add_argument('--min_free', type=float, default=0, help="Space (in GB) that must be left free in --directory. "
+                                                              "A file is not downloaded until there is space "
+                                                              "for it. Default: 0")
+parser.add_argument('--journal', help="JSON lines file where the progress of each file is saved. If the script is "
+                                      "run again with the same --journal, then the files that were already "
+                                      "dearchived are skipped")
+parser.add_argument('--md5_cache', help="Path to a SQLite file used for caching the md5sums of the files. If not "
+                                         "provided then the 'path' option in the 'md5_cache' section of the "
+                                         "settings file will be used (if any)")
+parser.add_argument('--no_md5_cache', action='store_true', help="Do not use the md5 cache")
 parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
 
 args = parser.parse_args()
@@ -43,7 +61,9 @@ os.environ["CONFIG_FILE"] = os.path.abspath(args.settings)
 from igsr_archive.utils import str2bool
 from igsr_archive.db import DB
 from igsr_archive.api import API
-from igsr_archive.file import File
+from igsr_archive.file import set_md5_cache
+from igsr_archive.md5_cache import md5_cache_from_args
+from igsr_archive.dearchive_pipeline import DearchivePipeline
 
 
 
@@ -93,6 +113,10 @@ db = DB(pwd=dbpwd,
 # connection to FIRE api
 api = API(pwd=firepwd)
 
+# md5 cache used when calculating the md5sums of the files
+md5_cache = md5_cache_from_args(path=args.md5_cache, disable=args.no_md5_cache)
+set_md5_cache(md5_cache)
+
 # list of tuples (origin, dest) for files to be archived
 files = []
 
@@ -105,50 +129,25 @@ elif args.list_file:
         line = line.rstrip("\n")
         files.append(line)
 
-for path in files:
-    # there is no need for it to take the abspath 
-    #abs_path = os.path.abspath(path)
-    #fire_path = re.sub(settingsO.get('ftp', 'ftp_mount') + "/", '', os.path.abspath(path))
-
-    if re.search("/", path) :
-        #adding a die if the path does not start with nfs
-        if path.startswith("/nfs") is False :
-            sys.exit()
-        dearch_f = db.fetch_file(path=path)
-    else:
-        dearch_f = db.fetch_file(basename=path)
-    
-    assert dearch_f is not None, f"File entry with path {path} does not exist in the DB. " \
-                                 f"Can't proceed"
-    
-    
-    fire_path = dearch_f.name # getting the file's name from the object dearch
-    not_path, path_file = fire_path.split("ftp/", 1) # splitting based on ftp 
-    path_file = "ftp/" + path_file
-    dearch_fobj = api.fetch_object(firePath=path_file)
-    assert dearch_fobj is not None, f"File entry with firePath {path_file} is not archived in FIRE. " \
-                            f"Can't proceed"
-    
-    # download the file
-    # construct path to store the dearchived file
-    logger.info(f"Downloading file to be dearchived: {path}")
-    basename = os.path.basename(path)
-    downloaded_path = os.path.join(args.directory, basename)
-    api.retrieve_object(firePath=path_file,
-                        outfile=downloaded_path)
-    logger.info(f"Download completed!")
-
-    if str2bool(args.md5check) is True:
-        logger.info("Checking if the md5sum of the retrieved and archived"
-                    " object matches")
-        f = File(name=downloaded_path)
-        assert f.md5 == dearch_fobj.objectMd5, "downloaded file and archived object md5sums do" \
-                                               " not match. Can't continue"
-        logger.info("md5sums match. Will continue dearchiving FIRE object")
-
-    api.delete_object(fireOid=dearch_fobj.fireOid, dry=str2bool(args.dry))
-    # finally, delete de-archived file from RESEQTRACK DB
-    db.delete_file(dearch_f, dry=str2bool(args.dry))
+pipeline = DearchivePipeline(db=db,
+                             api=api,
+                             directory=args.directory,
+                             workers=args.workers,
+                             part_workers=args.part_workers,
+                             batch_size=args.batch_size,
+                             min_free=int(args.min_free * 2**30),
+                             journal=args.journal,
+                             md5check=str2bool(args.md5check),
+                             md5_cache=md5_cache,
+                             dry=str2bool(args.dry))
+summary = pipeline.run(files)
 
 db.add_ticket_track(args.ticket, args.directory, dry=str2bool(args.dry))
+if md5_cache is not None:
+    logger.info(f"md5 cache usage: {md5_cache.stats()}")
+    md5_cache.close()
+
+if summary['failed']:
+    raise Exception(f"{len(summary['failed'])} files could not be dearchived: {', '.join(summary['failed'])}")
+
 logger.info('Running completed')
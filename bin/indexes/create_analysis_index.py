@@ -16,6 +16,19 @@ parser.add_argument('--studies', required=True,
                     help="Comma-sep string with ENA study ids. Example: ERP125611,ERP123307")
 parser.add_argument('--output', required=True,
                     help="Name of output file with index.")
+parser.add_argument('--workers', type=int,
+                    help="Number of concurrent requests to the ENA. Default: 'workers' in the [ena] section of the settings")
+parser.add_argument('--rps', type=float,
+                    help="Max number of requests per second to the ENA. 0 means no limit. "
+                         "Default: 'requests_per_second' in the [ena] section of the settings")
+parser.add_argument('--cache',
+                    help="Path to a SQLite file used to cache the ENA responses between runs. "
+                         "Default: 'cache' in the [ena] section of the settings, no cache if not defined")
+parser.add_argument('--cache_ttl', type=float,
+                    help="Seconds during which a cached ENA response is used without revalidating it. "
+                         "Default: 'cache_ttl' in the [ena] section of the settings")
+parser.add_argument('--offline', action='store_true',
+                    help="Do not send any request to the ENA, use only the responses in --cache")
 
 args = parser.parse_args()
 
@@ -26,6 +39,10 @@ if not os.path.isfile(args.settings):
 os.environ["CONFIG_FILE"] = os.path.abspath(args.settings)
 
 from igsr_archive.ena.ena_query import ENAportal, ENAbrowser
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_client import ENAclient
+from igsr_archive.ena.response_cache import ResponseCache
+from igsr_archive.ena.sample_resolver import SampleResolver
 
 # Create logger
 logger = logging.getLogger(__name__)
@@ -64,25 +81,9 @@ def generate_header():
     header = filedate+header
     return header
 
-def get_population(sample_id):
-    """
-    Function to get the population for 
-    a certain sample_id
-
-    It will return None if not defined
-    """
-    ebrowser = ENAbrowser(acc=sample_id)
-    xmld = ebrowser.query()
-    attrbs = ebrowser.fetch_attrbs('SAMPLE', xmld, alist=['population'])
-
-    if 'population' in attrbs:
-        return attrbs['population']
-    else:
-        return None
-
 def get_metadata(id):
     """
-    Get the analyis-related metadata from XML dict
+    Get the analyis-related metadata from the XML
     obtained from the ENA browser API
 
     Parameter
@@ -92,20 +93,39 @@ def get_metadata(id):
     Returns
     -------
     dict
-    """
-    ebrowser = ENAbrowser(acc=id)
-    xmld = ebrowser.query()
 
-    xrefs = ebrowser.fetch_xrefs(type='ANALYSIS', xml_dict=xmld)
+    Raises
+    ------
+    Exception
+        If there is no ENA record for 'id'.
+    """
+    ebrowser = ENAbrowser(acc=id, session=client)
+    entries = ebrowser.iter_entries(alist=[])
+    entry = next(entries, None)
+    # release the streamed response
+    entries.close()
+    if entry is None:
+        raise Exception(f"No ENA record for {id}")
 
     metadata_d = {
-        'program' : xmld['ANALYSIS_SET']['ANALYSIS']['ANALYSIS_TYPE']['GENOME_MAP']['PROGRAM'],
-        'platform' : xmld['ANALYSIS_SET']['ANALYSIS']['ANALYSIS_TYPE']['GENOME_MAP']['PLATFORM'],
-        'ena_submission' : xrefs['ENA-SUBMISSION']
+        'program' : entry['program'],
+        'platform' : entry['platform'],
+        'ena_submission' : entry['xrefs']['ENA-SUBMISSION']
     }
 
     return metadata_d
 
+# cache of the ENA responses
+cache_path = args.cache or CONFIG.get('ena', 'cache', fallback=None)
+if args.offline and not cache_path:
+    raise Exception("The --offline option needs a cache. Use the --cache option")
+cache = None
+if cache_path:
+    cache = ResponseCache(cache_path, ttl=args.cache_ttl, offline=args.offline)
+
+# client shared by all the requests to the ENA
+client = ENAclient(workers=args.workers, rps=args.rps, cache=cache)
+
 header=generate_header()
 
 ofile = open(args.output, 'w')
@@ -118,7 +138,7 @@ study_lst = args.studies.split(",")
 
 record_lst = []
 for study in study_lst:
-    eportal = ENAportal(study)
+    eportal = ENAportal(study, session=client)
 
     logger.info('Querying the ENA portal endpoint')
     record_lst_study = eportal.query(q_type='analysis', fields=",".join(attributes))
@@ -131,12 +151,19 @@ record_lst = [item for sublist in record_lst for item in sublist]
 fields = ['submitted_ftp','submitted_md5','accession','secondary_study_accession', 'study_title', 'center_name',
 'ena_submission', 'first_public', 'secondary_sample_accession', 'sample_alias', 'population', 'platform', 'program' ]
 
-for r in record_lst:
-    m_dict = get_metadata(id=r.accession)
+# fetch the analysis metadata concurrently and the population
+# of all the samples in batches
+logger.info('Querying the ENA browser endpoint')
+metadata_lst = client.map(get_metadata, [r.accession for r in record_lst])
+resolver = SampleResolver(client=client)
+resolver.resolve([r.sample_accession for r in record_lst])
+logger.info(f"Obtained the ENA metadata. Requests: {client.stats}")
+
+for r, m_dict in zip(record_lst, metadata_lst):
     r.ena_submission = m_dict['ena_submission']
     r.program = m_dict['program']
     r.platform = m_dict['platform']
-    pop = get_population(r.sample_accession)
+    pop = resolver.get_population(r.sample_accession)
     if pop is not None:
         r.population = pop
     else:
@@ -151,4 +178,7 @@ for r in record_lst:
             row += f"{getattr(obj, attrb)}\t"
         ofile.write(f"{row}\n")
 
-
+client.close()
+if cache is not None:
+    logger.info(f"ENA cache: {cache.stats}")
+    cache.close()
@@ -18,6 +18,19 @@ parser.add_argument('--analysis_group', required=True,
                     help="Analysis group used to identify groups, or sets, of data. Further information may be available with the data collection.")
 parser.add_argument('--output', required=True,
                     help="Name of output file with index.")
+parser.add_argument('--workers', type=int,
+                    help="Number of concurrent requests to the ENA. Default: 'workers' in the [ena] section of the settings")
+parser.add_argument('--rps', type=float,
+                    help="Max number of requests per second to the ENA. 0 means no limit. "
+                         "Default: 'requests_per_second' in the [ena] section of the settings")
+parser.add_argument('--cache',
+                    help="Path to a SQLite file used to cache the ENA responses between runs. "
+                         "Default: 'cache' in the [ena] section of the settings, no cache if not defined")
+parser.add_argument('--cache_ttl', type=float,
+                    help="Seconds during which a cached ENA response is used without revalidating it. "
+                         "Default: 'cache_ttl' in the [ena] section of the settings")
+parser.add_argument('--offline', action='store_true',
+                    help="Do not send any request to the ENA, use only the responses in --cache")
 
 args = parser.parse_args()
 
@@ -27,7 +40,11 @@ if not os.path.isfile(args.settings):
 # set the CONFIG_FILE env variable
 os.environ["CONFIG_FILE"] = os.path.abspath(args.settings)
 
-from igsr_archive.ena.ena_query import ENAportal, ENAbrowser
+from igsr_archive.ena.ena_query import ENAportal
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_client import ENAclient
+from igsr_archive.ena.response_cache import ResponseCache
+from igsr_archive.ena.sample_resolver import SampleResolver
 
 # Create logger
 logger = logging.getLogger(__name__)
@@ -75,6 +92,17 @@ def generate_header():
     header = filedate+header
     return header
 
+# cache of the ENA responses
+cache_path = args.cache or CONFIG.get('ena', 'cache', fallback=None)
+if args.offline and not cache_path:
+    raise Exception("The --offline option needs a cache. Use the --cache option")
+cache = None
+if cache_path:
+    cache = ResponseCache(cache_path, ttl=args.cache_ttl, offline=args.offline)
+
+# client shared by all the requests to the ENA
+client = ENAclient(workers=args.workers, rps=args.rps, cache=cache)
+
 header=generate_header()
 
 ofile = open(args.output, 'w')
@@ -90,7 +118,7 @@ study_lst = args.studies.split(",")
 
 record_lst = []
 for study in study_lst:
-    eportal = ENAportal(study)
+    eportal = ENAportal(study, session=client)
 
     logger.info('Querying the ENA portal endpoint')
 
@@ -101,21 +129,11 @@ for study in study_lst:
 
 record_lst = [item for sublist in record_lst for item in sublist]
 
-def get_population(sample_id):
-    """
-    Function to get the population for 
-    a certain sample_id
-
-    It will return None if not defined
-    """
-    ebrowser = ENAbrowser(acc=sample_id)
-    xmld = ebrowser.query()
-    attrbs = ebrowser.fetch_attrbs('SAMPLE', xmld, alist=['population'])
-
-    if 'population' in attrbs:
-        return attrbs['population']
-    else:
-        return None
+# fetch the population of all the samples in batches, as
+# many runs share the same sample
+resolver = SampleResolver(client=client)
+resolver.resolve([r.sample_accession for r in record_lst])
+logger.info(f"Obtained the metadata for the samples with {resolver.nrequests} ENA browser requests")
 
 # list of fields to print out in order
 fields = ['fastq_ftp','fastq_md5','run_accession', 'secondary_study_accession', 'study_title', 'center_name', 
@@ -125,7 +143,7 @@ fields = ['fastq_ftp','fastq_md5','run_accession', 'secondary_study_accession',
 
 for r in record_lst:
     r.analysis_group = args.analysis_group
-    pop = get_population(r.sample_accession)
+    pop = resolver.get_population(r.sample_accession)
     if pop is not None:
         r.population = pop
     else:
@@ -165,4 +183,8 @@ for r in record_lst:
         raise Exception(f"Error: {r.library_layout} is not valid! ")
 
 logger.info("Index creation. Done...")
-ofile.close()
\ No newline at end of file
+ofile.close()
+client.close()
+if cache is not None:
+    logger.info(f"ENA cache: {cache.stats}")
+    cache.close()
\ No newline at end of file
@@ -34,6 +34,14 @@ parser.add_argument('-d', '--dbname', help="Database name. If not provided then
                                            "the dbname from the $DBNAME env variable")
 parser.add_argument('-tid', '--ticket', help="The ticket number from the RT ticket created by the collaborator" )
 parser.add_argument('-dir', '--directory', help="The directory where the files in this RT ticket should go, for example HGSVC3/working/20220401_bionano_hgsvc/")
+parser.add_argument('--batch_size', type=int, default=1000, help="Number of files loaded in the DB in each "
+                                                                "batch. Default: 1000")
+parser.add_argument('--threads', type=int, default=1, help="Number of files for which the md5sum will be calculated "
+                                                             "at once. Default: 1")
+parser.add_argument('--md5_cache', help="Path to a SQLite file used for caching the md5sums of the files. If not "
+                                         "provided then the 'path' option in the 'md5_cache' section of the "
+                                         "settings file will be used (if any)")
+parser.add_argument('--no_md5_cache', action='store_true', help="Do not use the md5 cache")
 parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
 
 args = parser.parse_args()
@@ -57,7 +65,8 @@ os.environ["CONFIG_FILE"] = os.path.abspath(args.settings)
 
 from igsr_archive.utils import str2bool
 from igsr_archive.db import DB
-from igsr_archive.file import File
+from igsr_archive.file import File, hash_files, set_md5_cache
+from igsr_archive.md5_cache import md5_cache_from_args
 
 pwd = args.pwd
 if args.pwd is None:
@@ -89,6 +98,10 @@ if dir is None:
 db = DB(pwd=pwd,
         dbname=dbname)
 
+# md5 cache used when calculating the md5sums of the files
+md5_cache = md5_cache_from_args(path=args.md5_cache, disable=args.no_md5_cache)
+set_md5_cache(md5_cache)
+
 # list with paths to be loaded
 files = []
 if args.file:
@@ -97,12 +110,14 @@ if args.file:
     if args.type is not None:
         logger.debug('Type provided using -t, --type option')
         f = File(name=args.file,
-                 type=args.type)
+                 type=args.type,
+                 checksum=False)
     else:
         logger.debug('No file type provided using -t, --type option')
         logger.debug('File type will be guessed from its file extension')
         f = File(name=args.file,
-                 settingsf=args.settings)
+                 settingsf=args.settings,
+                 checksum=False)
         ftype = f.guess_type()
         f.type = ftype
     files.append(f)
@@ -120,12 +135,14 @@ elif args.list_file:
         if args.type is not None:
             logger.debug('Type provided using -t, --type option')
             f = File(name=path,
-                     type=args.type)
+                     type=args.type,
+                     checksum=False)
         else:
             logger.debug('No file type provided using -t, --type option')
             logger.debug('File type will be guessed from its file extension')
             f = File(name=path,
-                     settingsf=args.settings)
+                     settingsf=args.settings,
+                     checksum=False)
             ftype = f.guess_type()
             f.type = ftype
         files.append(f)
@@ -159,23 +176,46 @@ else:
                     "the -f, -l or --md5_file options")
     sys.exit(1)
 
+# calculate the md5sums that were not provided
+to_hash = [f for f in files if not hasattr(f, 'md5') and f.check_if_exists() is True]
+if to_hash:
+    hash_files(to_hash, workers=args.threads)
+
+# files in the DB with the same basename
+in_db = db.fetch_files(basenames=[os.path.basename(f.name) for f in files])
+
+# files that will be loaded
+to_load = []
+# files in 'to_load' by basename, a repeated basename in the
+# input is treated as if it was already in the DB
+accepted = {}
 for f in files:
     if f.check_if_exists() is False:
         print(f"There was an error when trying to load: {f.name}. Wrong file path")
         sys.exit(1)
     basename = os.path.basename(f.name)
     # get basename and check if it already exists in DB
-    rf = db.fetch_file(basename=basename)  
+    rf = in_db.get(basename, accepted.get(basename))
+    where = "in the DB" if basename in in_db else "in the list of files to load"
     if str2bool(args.unique) is True and rf is not None:
-        logger.warning(f"The following file with the same basename:'{rf.name}' already exists in the DB.\nYou need to change the name " \
+        logger.warning(f"The following file with the same basename:'{rf.name}' already exists {where}.\nYou need to change the name " \
                        f"'{basename}' so it is unique. This file will be skipped.")
         sys.exit(1)
     elif str2bool(args.unique) is False and rf is not None:
-        logger.warning(f"A file with the name '{basename}' already exists in the DB but --unique option is {args.unique}. "
+        logger.warning(f"A file with the name '{basename}' already exists {where} but --unique option is {args.unique}. "
                        "This file will be saved in the database.")
-        db.load_file(f, dry=str2bool(args.dry))
+        to_load.append(f)
     else:
-        db.load_file(f, dry=str2bool(args.dry))
+        to_load.append(f)
+    accepted.setdefault(basename, f)
+
+codes = db.load_files(to_load, batch_size=args.batch_size, dry=str2bool(args.dry))
+failed = [f.name for f, code in zip(to_load, codes) if code != 0]
+if failed:
+    logger.error(f"{len(failed)} files could not be loaded: {', '.join(failed)}")
 
 db.add_ticket_track(ticket, dir, dry=str2bool(args.dry))
+if md5_cache is not None:
+    logger.info(f"md5 cache usage: {md5_cache.stats()}")
+    md5_cache.close()
 logger.info('Running completed')
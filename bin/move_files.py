@@ -155,6 +155,8 @@ db = DB(pwd=dbpwd,
 # connection to FIRE api
 api = API(pwd=firepwd)
 
+# updates of the 'name' of the DB entries, done in batches after moving the FIRE objects
+updates = []
 for tup in files:
     # check if 'origin' exists in db and fetch the file
     origin_f = db.fetch_file(path=tup[0])
@@ -179,10 +181,12 @@ for tup in files:
                                     dry=str2bool(args.dry))
 
     # now, modify the file entry in the db and update its name (path)
-    db.update_file(attr_name='name',
-                   value=tup[1],
-                   name=tup[0],
-                   dry=str2bool(args.dry))
-    
+    updates.append((tup[0], {'name': tup[1]}))
+
+codes = db.update_files(updates, dry=str2bool(args.dry))
+failed = [origin for (origin, attrs), code in zip(updates, codes) if code != 0]
+if failed:
+    logger.error(f"The name of {len(failed)} file entries could not be updated in the DB: {', '.join(failed)}")
+
 db.add_ticket_track(args.ticket, args.tg_dir, dry=str2bool(args.dry))
 logger.info('Running completed')
\ No newline at end of file
@@ -16,6 +16,14 @@ parser.add_argument('--CHANGELOG', default='/nfs/1000g-archive/vol1/ftp/CHANGELO
 parser.add_argument('--dry', default=True, help="Perform a dry-run and attempt to run the current.tree process without "
                                                 "pushing any object to FIRE or modifying the DB."
                                                 "Default: True")
+parser.add_argument('--compact', default=False, help="Store the records of the trees in a compact in-memory representation "
+                                                     "that uses much less memory than the default one. Default: False")
+parser.add_argument('--mode', default='dict', choices=['dict', 'merge'],
+                    help="'dict': compare the trees in memory. 'merge': sort the trees on disk and compare them "
+                         "by walking both sorted files once. Use 'merge' for trees that do not fit in memory. "
+                         "Default: dict")
+parser.add_argument('--mem_budget', type=int, default=256,
+                    help="Memory (in MB) used for sorting the trees with --mode merge. Default: 256")
 
 # DB and FIRE API connection params
 parser.add_argument('--dbpwd', help="Password for MYSQL server. If not provided then it will try to guess "
@@ -114,7 +122,7 @@ if f_obj is None:
     raise Exception(f"CHANGELOG file path: {args.CHANGELOG} is not archived in FIRE. Can't continue!")
 
 chlogl_path = f"{settingsO.get('ctree', 'temp')}/{os.path.basename(args.CHANGELOG)}"
-api.retrieve_object(fireOid=f_obj.fireOid, outfile=chlogl_path)
+api.retrieve_object(firePath=changelog_fpath, outfile=chlogl_path)
 
 ctree = CurrentTree(db=db,
                     api=api,
@@ -122,7 +130,10 @@ ctree = CurrentTree(db=db,
                     prod_tree=prod_tree)
 
 pushed_dict = ctree.run(chlog_f=chlogl_path,
-                        dry=str2bool(args.dry))
+                        dry=str2bool(args.dry),
+                        compact=str2bool(args.compact),
+                        mode=args.mode,
+                        mem_budget=args.mem_budget * 2**20)
 
 if pushed_dict:
     logger.info(f"The following changelog_details_* files have geen generated and pushed to archive:")
@@ -22,6 +22,14 @@ parser.add_argument('--dbname', help="Database name. If not provided then it wil
 parser.add_argument('--firepwd', help="FIRE api password. If not provided then it will try to guess the FIRE"
                                       " pwd from the $FIRE_PWD env variable")
 parser.add_argument('--directory', help="Directory to compare staging and archive" )
+parser.add_argument('--concurrency', type=int, help="Number of FIRE objects fetched concurrently. It needs "
+                                                   "aiohttp (pip install igsr_archive[async]). If not provided "
+                                                   "or aiohttp is not installed then the objects are fetched "
+                                                   "one by one")
+parser.add_argument('--report', default='sanitycheck_report.jsonl',
+                    help="JSON lines file with the files that are missing in FIRE or whose md5 or size do not "
+                         "match the DB. The check continues from where it stopped if it is run again with the "
+                         "same --report")
 parser.add_argument('--log', default='INFO', help="Logging level. i.e. DEBUG, INFO, WARNING, ERROR, CRITICAL")
 
 
@@ -39,6 +47,8 @@ settingsO.read(args.settings)
 
 from igsr_archive.db import DB
 from igsr_archive.api import API
+from igsr_archive.async_api import AsyncAPI
+from igsr_archive.fire_checker import FireChecker
 
 # logging
 loglevel = args.log
@@ -82,47 +92,42 @@ if args.directory:
     #Files fetched in staging
     #Files fetched from archive
     basename = os.path.basename(args.directory.rstrip("/"))
-    staging_list = db.fetch_files_by_pattern(pattern=f"{staging_path}%{basename}")
-    len_staging_list = 0
-    len_archive_list = 0
-    if staging_list:
-        with open(f"{basename}_staging_files", 'w') as sf:
-            for staging_file in staging_list:
-                sf.write(f"{staging_file}\n")
-        len_staging_list = len(staging_list)
-    archive_list = db.fetch_files_by_pattern(pattern=f"{archive_path}%{basename}")
-    if archive_list:
-        with open(f"{basename}_archive_files", 'w') as af:
-            for archive_file in archive_list:
-                af.write(f"{archive_file}\n")
-        len_archive_list = len(archive_list)
-    logger.info(f"Number of files returned in staging: {len_staging_list}")
-    logger.info(f"Number of files returned in archive: {len_archive_list}")
-    if staging_list and archive_list:
+    counts = {}
+    for area, area_path in [('staging', staging_path), ('archive', archive_path)]:
+        # the names are streamed from the DB to the file
+        counts[area] = 0
+        with open(f"{basename}_{area}_files", 'w') as fh:
+            for name, in db.iter_files(pattern=f"{area_path}%{basename}%", columns=('name',), row_type='tuple'):
+                fh.write(f"{name}\n")
+                counts[area] += 1
+        if counts[area] == 0:
+            os.remove(f"{basename}_{area}_files")
+    logger.info(f"Number of files returned in staging: {counts['staging']}")
+    logger.info(f"Number of files returned in archive: {counts['archive']}")
+    if counts['staging'] and counts['archive']:
         logger.info(f"Staging files in {basename}_staging_files are not archived")
 
 elif not args.directory:
     if firepwd is None:
         sys.exit("$FIRE_PWD undefined. You need either to pass the FIRE API password using the --firepwd option"
                     " or set a $FIRE_PWD environment variable before running this script!")
-    # connection to FIRE api
-    api = API(pwd=firepwd)
     logger.info("No specific directory specified. Check all the files on ftp")
-    flist = db.fetch_files_by_pattern(pattern='/nfs/1000g-archive/vol1/ftp/')
-    logger.info(f"Number of files returned with this pattern /nfs/1000g-archive/vol1/ftp/ {len(flist)}")
-
-    tot_counter = 0
-    count = 0
-    for p in flist:
-        if count == 100:
-            logger.info(f"{tot_counter} lines processed!")
-            count = 0
-        tot_counter += 1
-        count += 1
-
-        if settingsO.get('ftp', 'ftp_mount') in p:
-            fire_path = re.sub(settingsO.get('ftp', 'ftp_mount') + "/", '', p)
-            fire_obj = None
-            fire_obj = api.fetch_object(firePath=fire_path)
-            if fire_obj is None:
-                print(f"ERROR: File witH PATH {p} is not archived in FIRE")
+    # connection to FIRE api
+    aapi = api = None
+    if args.concurrency:
+        try:
+            aapi = AsyncAPI(pwd=firepwd, concurrency=args.concurrency)
+        except Exception as err:
+            logger.warning(f"{err}. The FIRE objects will be fetched one by one")
+    if aapi is None:
+        api = API(pwd=firepwd)
+
+    checker = FireChecker(db=db, aapi=aapi, api=api, report=args.report)
+    summary = checker.run(prefix=settingsO.get('ftp', 'ftp_mount') + "/ftp/")
+    logger.info(f"Files checked: {summary['checked']}. Missing: {summary['missing']}, "
+                f"size mismatch: {summary['size_mismatch']}, md5 mismatch: {summary['md5_mismatch']} "
+                f"({summary['files_per_s']} files/s)")
+    if aapi is not None:
+        logger.info(f"FIRE API requests: {aapi.stats}")
+    if summary['missing'] or summary['size_mismatch'] or summary['md5_mismatch']:
+        print(f"ERROR: Some files are not correctly archived in FIRE. Check the report: {args.report}")
@@ -4,18 +4,25 @@ import pdb
 import sys
 import os
 import json
-from subprocess import Popen, PIPE
-import subprocess
-from igsr_archive.utils import is_tool
+import time
+import hashlib
+import collections
 
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 from igsr_archive.object import fObject
+from igsr_archive.multipart import MultipartFile
 from igsr_archive.config import CONFIG
 
 # create logger
 api_logger = logging.getLogger(__name__)
 
+# size in bytes of the chunks read from the responses when downloading
+DOWNLOAD_CHUNK_SIZE = 2**20
+
 class API(object):
     """
     Class to deal with the queries to the FIRE API for
@@ -27,6 +34,28 @@ class API(object):
           Password for API.
     user : str
            Username for API.
+    session : requests.Session
+              Session used for the requests to the FIRE API. It keeps
+              a pool of keep-alive connections that are reused across
+              requests and idempotent requests (GET, PUT and DELETE)
+              are retried after connection errors and 5xx responses.
+    upload_retries : int
+                     Number of times an upload is retried after a
+                     connection error or a 5xx response.
+    upload_backoff : float
+                     Seconds to wait before the first retry of an upload.
+                     The wait is doubled after each retry.
+    uploads : list of dict
+              Throughput metrics of each of the objects pushed with this object.
+    s3_session : requests.Session
+                 Session without authentication used for downloading
+                 the objects from the S3-compatible endpoint.
+    download_retries : int
+                       Number of times a ranged GET is retried after a
+                       connection error, a 5xx response or a truncated response.
+    download_backoff : float
+                       Seconds to wait before the first retry of a ranged GET.
+                       The wait is doubled after each retry.
     """
     def __init__(self, pwd):
         """
@@ -42,6 +71,79 @@ class API(object):
 
         self.user = CONFIG.get('fire', 'user')
         self.pwd = pwd
+        self.session = self.__create_session()
+        self.upload_retries = CONFIG.getint('fire', 'upload_retries', fallback=3)
+        self.upload_backoff = CONFIG.getfloat('fire', 'upload_backoff', fallback=2)
+        self.uploads = []
+        self.s3_session = self.__create_session(auth=False)
+        self.download_retries = CONFIG.getint('fire', 'download_retries', fallback=3)
+        self.download_backoff = CONFIG.getfloat('fire', 'download_backoff', fallback=2)
+
+    def __create_session(self, auth=True):
+        """
+        Private function to create the session used for the
+        requests to the FIRE API. The size of the pool of connections
+        and the retries are set with the 'pool_size', 'retries' and
+        'retry_backoff' options in the 'fire' section of CONFIG
+
+        Parameters
+        ----------
+        auth : bool, default=True
+               If False, the requests are not authenticated.
+
+        Returns
+        -------
+        session : requests.Session
+        """
+        pool_size = CONFIG.getint('fire', 'pool_size', fallback=10)
+        retries = Retry(total=CONFIG.getint('fire', 'retries', fallback=3),
+                        backoff_factor=CONFIG.getfloat('fire', 'retry_backoff', fallback=0.5),
+                        status_forcelist=(500, 502, 503, 504),
+                        raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retries)
+
+        session = requests.Session()
+        if auth is True:
+            session.auth = (self.user, self.pwd)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    def connection_stats(self, session=None):
+        """
+        Function to get the number of connections opened and
+        the number of requests done by a session. The difference
+        between both is the number of requests that reused a
+        keep-alive connection
+
+        Parameters
+        ----------
+        session : requests.Session, optional
+                  Default: self.session.
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'connections' : int, 'requests' : int, 'reused' : int}
+        """
+        connections = 0
+        nrequests = 0
+        session = session if session is not None else self.session
+        for adapter in set(session.adapters.values()):
+            for key in adapter.poolmanager.pools.keys():
+                pool = adapter.poolmanager.pools.get(key)
+                if pool is None:
+                    continue
+                connections += pool.num_connections
+                nrequests += pool.num_requests
+
+        return {'connections': connections,
+                'requests': nrequests,
+                'reused': nrequests - connections}
 
     def get_filename_from_cd(self, cd):
         """
@@ -65,9 +167,207 @@ class API(object):
 
         return fname[0]
 
+    def s3_url(self, firePath):
+        """
+        Function to get the URL of a FIRE object in the S3-compatible
+        endpoint. It is built from the 's3_endpoint' (i.e. s3://bucket/) and
+        's3_root_endpoint' (i.e. https://host) options in the 'fire' section of CONFIG
+
+        Parameters
+        ----------
+        firePath : str
+                   FIRE path.
+
+        Returns
+        -------
+        url : str
+        """
+        endpoint = CONFIG.get('fire', 's3_endpoint')
+        if endpoint.startswith('s3://'):
+            # path-style URL: {root_endpoint}/{bucket}/{key}
+            endpoint = f"{CONFIG.get('fire', 's3_root_endpoint').rstrip('/')}/{endpoint[len('s3://'):]}"
+        if not endpoint.endswith('/'):
+            endpoint += '/'
+
+        return f"{endpoint}{firePath.lstrip('/')}"
+
+    def __download_part(self, url, start, end):
+        """
+        Private function to download the bytes from 'start' to 'end'
+        (both included) of 'url' with a ranged GET. The request is retried
+        with an exponential backoff after connection errors and 5xx responses
+
+        Parameters
+        ----------
+        url : str
+              URL of the object.
+        start : int
+                First byte.
+        end : int
+              Last byte.
+
+        Returns
+        -------
+        bytearray : downloaded bytes
+
+        Raises
+        ------
+        HTTPError
+            If the download failed after all the retries
+        """
+        error = None
+        for attempt in range(self.download_retries + 1):
+            if attempt > 0:
+                wait = self.download_backoff * 2 ** (attempt - 1)
+                api_logger.info(f"Retrying download of bytes {start}-{end} of {url} in {wait:.0f}s "
+                                f"(attempt {attempt + 1} of {self.download_retries + 1})")
+                time.sleep(wait)
+            try:
+                with self.s3_session.get(url, headers={'Range': f"bytes={start}-{end}"}, stream=True) as res:
+                    if res.status_code >= 500:
+                        error = HTTPError(f"S3 endpoint returned {res.status_code} for {url}", response=res)
+                        continue
+                    # a server ignoring the Range header returns the whole object
+                    if res.status_code not in (200, 206) or (res.status_code == 200 and start != 0):
+                        raise HTTPError(f"S3 endpoint returned {res.status_code} for bytes {start}-{end} "
+                                        f"of {url}: {res.text}", response=res)
+                    data = bytearray()
+                    for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        data += chunk
+                        if len(data) > end - start + 1:
+                            break
+            except (requests.ConnectionError, requests.Timeout) as err:
+                api_logger.warning(f"Connection error when downloading {url}: {err}")
+                error = HTTPError(f"Connection error when downloading {url}: {err}")
+                continue
+            if len(data) < end - start + 1:
+                error = HTTPError(f"Truncated download of bytes {start}-{end} of {url}: "
+                                  f"got {len(data)} bytes")
+                continue
+
+            return data[:end - start + 1]
+
+        raise error
+
+    def download_object(self, firePath, outfile, workers=None, part_size=None,
+                        expected_md5=None, expected_size=None):
+        """
+        Function to download a FIRE object from the S3-compatible endpoint.
+        The object is downloaded with ranged GETs of 'part_size' bytes,
+        'workers' of them at the same time, over a pool of keep-alive
+        connections. The parts are written in order to 'outfile'.part and
+        the md5sum is calculated as they are written, so the file is not
+        read again. If 'outfile'.part already exists (i.e. from an interrupted
+        download) the download continues from the end of it. 'outfile'.part
+        is renamed to 'outfile' when the download completes and, if
+        'expected_md5' and 'expected_size' are provided, is verified
+
+        Parameters
+        ----------
+        firePath : str
+                   FIRE path.
+        outfile : str
+                  Output file name.
+        workers : int, optional
+                  Number of parts downloaded at the same time. If not defined,
+                  the 'download_workers' option in the 'fire' section of CONFIG is used.
+        part_size : int, optional
+                    Size in bytes of each ranged GET. If not defined, the
+                    'download_part_size' option in the 'fire' section of CONFIG is used.
+        expected_md5 : str, optional
+                       md5sum the downloaded file must have (i.e. fObject.objectMd5).
+                       If it does not match, 'outfile'.part is deleted.
+        expected_size : int, optional
+                        Size in bytes the downloaded file must have (i.e. fObject.objectSize).
+                        It is checked before downloading anything.
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'path' : str, 'md5' : str, 'size' : int, 'seconds' : float, 'mb_per_s' : float}
+
+        Raises
+        ------
+        HTTPError
+            If the object cannot be downloaded
+        Exception
+            If the downloaded file does not have 'expected_md5' or 'expected_size'
+        """
+        workers = workers or CONFIG.getint('fire', 'download_workers', fallback=4)
+        part_size = part_size or CONFIG.getint('fire', 'download_part_size', fallback=16 * 2**20)
+        url = self.s3_url(firePath)
+
+        api_logger.info(f"Downloading FIRE object {firePath} to {outfile}")
+        res = self.s3_session.head(url, allow_redirects=True)
+        if res.status_code == 404:
+            raise HTTPError(f"FIRE object with path {firePath} not found in {url}", response=res)
+        elif res.status_code != 200:
+            raise HTTPError(f"S3 endpoint returned {res.status_code} for {url}", response=res)
+        size = int(res.headers['Content-Length'])
+        if expected_size is not None and size != int(expected_size):
+            raise Exception(f"Size of {url} ({size} bytes) does not match the expected "
+                            f"size ({expected_size} bytes). Can't continue")
+
+        part_path = outfile + '.part'
+        md5 = hashlib.md5()
+        offset = 0
+        if os.path.isfile(part_path):
+            offset = os.path.getsize(part_path)
+            if offset > size:
+                api_logger.warning(f"{part_path} is larger than the FIRE object. Downloading it again")
+                offset = 0
+            else:
+                api_logger.info(f"Resuming download of {firePath} from byte {offset}")
+                # the md5sum of the bytes already downloaded
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+                        md5.update(chunk)
+
+        start = time.perf_counter()
+        ranges = [(p, min(p + part_size, size) - 1) for p in range(offset, size, part_size)]
+        with open(part_path, 'r+b' if offset else 'wb') as f, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            f.truncate(offset)
+            f.seek(offset)
+            # at most 'workers' parts are held in memory
+            pending = collections.deque()
+            for r in ranges:
+                pending.append(executor.submit(self.__download_part, url, *r))
+                if len(pending) >= workers:
+                    data = pending.popleft().result()
+                    f.write(data)
+                    md5.update(data)
+            while pending:
+                data = pending.popleft().result()
+                f.write(data)
+                md5.update(data)
+        elapsed = time.perf_counter() - start
+
+        downloaded = os.path.getsize(part_path)
+        if downloaded != size:
+            raise HTTPError(f"Truncated download of {firePath}: {downloaded} != {size} bytes")
+        if expected_md5 is not None and md5.hexdigest() != expected_md5:
+            os.remove(part_path)
+            raise Exception(f"md5sum of the downloaded {firePath} ({md5.hexdigest()}) does not match "
+                            f"the expected md5sum ({expected_md5}). Can't continue")
+        os.replace(part_path, outfile)
+
+        stats = {'path': outfile,
+                 'md5': md5.hexdigest(),
+                 'size': size,
+                 'seconds': elapsed,
+                 'mb_per_s': (size - offset) / 2**20 / elapsed if elapsed > 0 else 0.0}
+        api_logger.info(f"Downloaded {size - offset} bytes in {stats['seconds']:.2f}s "
+                        f"({stats['mb_per_s']:.1f} MB/s)")
+        api_logger.debug(f"S3 connections: {self.connection_stats(self.s3_session)}")
+
+        return stats
+
     def retrieve_object(self, fireOid=None, firePath=None, outfile=None):
         """
-        Function to retrieve (download) a particular FIRE object
+        Function to retrieve (download) a particular FIRE object.
+        See API.download_object
 
         Parameters
         ----------
@@ -83,35 +383,23 @@ class API(object):
         -------
         outfile : str
                   Downloaded file
-        
+
+        Raises
+        ------
+        Exception
+            If the object cannot be retrieved through 'fireOid'
+        HTTPError
+            If the object cannot be downloaded
         """
-        endpoint = CONFIG.get('fire', 's3_endpoint')
-        endpoint_url= CONFIG.get('fire', 's3_root_endpoint')
-        # construct url
-        if fireOid is not None:
+        if firePath is None:
+            raise Exception("Retrieving a FIRE object through its FIRE object id is no longer possible. "
+                            "You will only get the metadata of this object using FIRE object ID.")
 
-            api_logger.info('Retrieving a FIRE object through its FIRE object id is no longer possible. You will only get the metadata of this object using FIRE object ID.')
-            sys.exit()
-        elif firePath is not None:
+        api_logger.info('Retrieving a FIRE object through its FIRE path')
+        self.download_object(firePath, outfile)
+        api_logger.info("File was retrieved successfully")
 
-            api_logger.info('Retrieving a FIRE object through its FIRE path')
-            url = f"{endpoint}" \
-                  f"{firePath}"
-        
-        #before using aws, check that aws is available in the environment 
-        if  "awscli" not in str(os.environ):
-            api_logger.info("AWS is not loaded, Retrieving the object can not work without loading AWS")
-            sys.exit()
-       
-        result = subprocess.run(['aws', 's3', 'cp', url, outfile, '--no-sign-request', '--endpoint-url', endpoint_url], capture_output=True)
-    
-        if result.returncode == 0: 
-            api_logger.info("File was retrieved successfully")
-            return outfile
-        else:
-            api_logger.info("Issues copying: " + result.stderr.decode())
-            pass
-            sys.exit()
+        return outfile
 
     def fetch_object(self, fireOid=None, firePath=None):
         """
@@ -151,7 +439,8 @@ class API(object):
 
         res = None
         try:
-            res = requests.get(url, auth=(self.user, self.pwd), allow_redirects=True)
+            res = self.session.get(url, allow_redirects=True)
+            api_logger.debug(f"FIRE API connections: {self.connection_stats()}")
         except HTTPError as http_err:
             print(f'HTTP error occurred: {http_err}')
             print(f'Error message: {res.text}')
@@ -189,24 +478,15 @@ class API(object):
                   Object instantiated from json
         """
 
-        metadata_dict = {}
-        for k, v in json_res.items():
-            if k == "filesystemEntry" and v is not None:
-                for f in v.keys():
-                    metadata_dict[f] = v[f]
-            else:
-                metadata_dict[k] = v
-
-        fireObj = fObject(**metadata_dict)
-
-        return fireObj
+        return fObject.from_json(json_res)
 
     def push_object(self, fileO, dry=True, publish=True, fire_path=None):
         """
         Function to push (upload) a file.file.File object
-        to FIRE. This function currently uses 'curl'.
-        As the standard 'requests' module throws memory errors
-        when trying to upload large files
+        to FIRE. The file is streamed in chunks as a multipart
+        body, so the memory used does not depend on its size.
+        The upload is retried with an exponential backoff after
+        connection errors and 5xx responses
 
         Parameters
         ----------
@@ -233,40 +513,13 @@ class API(object):
         """
         api_logger.info(f"Pushing File with path: {fileO.name}")
 
-        if is_tool("curl") is False:
-            raise Exception("The 'curl' program was not found in this system. Can't continue!...")
-
-        url = f"curl {CONFIG.get('fire', 'root_endpoint')}/{CONFIG.get('fire', 'version')}/objects" \
-              f" -u {self.user}:{self.pwd}"
+        url = f"{CONFIG.get('fire', 'root_endpoint')}/{CONFIG.get('fire', 'version')}/objects"
 
         fire_obj = None
         if dry is False:
             # FIRE api requires atomic operations, so the POST request must be atomic
             # and also multiple atomic PUSH requests for providing fire path and publishing
-            url = url+f" -F file=@{fileO.name} -H 'x-fire-md5: {fileO.md5}' -H 'x-fire-size: {fileO.size}' "
-            p = Popen(url, stdout=PIPE, stderr=PIPE, shell=True)
-            stdout, stderr = p.communicate()
-            res = stdout.decode("utf-8")
-            fire_obj = None
-            api_logger.debug(f"API response:{res}")
-            api_logger.debug(f"API response (STDOUT):{stdout}")
-            api_logger.debug(f"API response (STDERR):{stderr}")
-            # FIRE api is down
-            if res == "Service Unavailable":
-                raise HTTPError("FIRE Service Unavailable")
-            # this bit of code is just to check that it tries more than once because we are having issues with push object because of line 262
-            max_attempts = 3  
-            attempts = 0
-            while attempts < max_attempts:
-                try:
-                    d = json.loads(stdout)
-                    break
-                except json.JSONDecodeError:
-                    attempts += 1
-                    continue
-            else:
-                api_logger.info(f"Issues with parsing JSON after multiple attempts")
-                sys.exit()
+            d = self.__upload(url, fileO)
             if "statusCode" in d.keys():
                 err = f"{d['statusMessage']}\n{d['detail']}"
                 raise HTTPError(err)
@@ -291,6 +544,73 @@ class API(object):
             api_logger.info(f"Endpoint for pushing is: {url}")
             api_logger.info(f"Use --dry False to effectively push it")
 
+    def __upload(self, url, fileO):
+        """
+        Private function to POST a file to FIRE as a streamed
+        multipart body. The request is retried with an exponential
+        backoff after connection errors and 5xx responses
+
+        Parameters
+        ----------
+        url : str
+              FIRE objects endpoint.
+        fileO : File object
+                Object to be uploaded.
+
+        Returns
+        -------
+        dict : JSON response
+
+        Raises
+        ------
+        HTTPError
+            If the upload failed after all the retries
+        """
+        body = MultipartFile(fileO.name)
+        headers = {'Content-Type': body.content_type,
+                   'x-fire-md5': f"{fileO.md5}",
+                   'x-fire-size': f"{fileO.size}"}
+
+        for attempt in range(self.upload_retries + 1):
+            if attempt > 0:
+                wait = self.upload_backoff * 2 ** (attempt - 1)
+                api_logger.info(f"Retrying upload of {fileO.name} in {wait:.0f}s "
+                                f"(attempt {attempt + 1} of {self.upload_retries + 1})")
+                time.sleep(wait)
+            start = time.perf_counter()
+            try:
+                res = self.session.post(url, data=body, headers=headers)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                api_logger.warning(f"Connection error when uploading {fileO.name}: {err}")
+                error = HTTPError(f"Connection error when uploading {fileO.name}: {err}")
+                continue
+            elapsed = time.perf_counter() - start
+            api_logger.debug(f"API response:{res.text}")
+
+            if res.status_code >= 500:
+                api_logger.warning(f"FIRE API returned {res.status_code} when uploading {fileO.name}")
+                error = HTTPError(f"FIRE API returned {res.status_code}: {res.text}", response=res)
+                continue
+
+            try:
+                d = res.json()
+            except ValueError:
+                raise HTTPError(f"FIRE API returned a response that is not JSON ({res.status_code}): {res.text}",
+                                response=res)
+
+            stats = {'path': fileO.name,
+                     'bytes': body.bytes_read,
+                     'seconds': elapsed,
+                     'mb_per_s': body.bytes_read / 2**20 / elapsed if elapsed > 0 else 0.0,
+                     'attempts': attempt + 1}
+            self.uploads.append(stats)
+            api_logger.info(f"Uploaded {stats['bytes']} bytes in {stats['seconds']:.2f}s "
+                            f"({stats['mb_per_s']:.1f} MB/s)")
+
+            return d
+
+        raise error
+
     def update_object(self, attr_name, value, dry=True, fireOid=None, firePath=None):
         """
         Function to update a certain 'attr_name' of an archived
@@ -333,25 +653,26 @@ class API(object):
         header = None
         url = f"{CONFIG.get('fire', 'root_endpoint')}/{CONFIG.get('fire', 'version')}/objects/" \
               f"{fireOid}/"
-        if attr_name is 'firePath':
+        if attr_name == 'firePath':
             api_logger.info(f"firePath will be modified")
             url = url + "firePath"
             header = {"x-fire-path": f"{value}"}
-        elif attr_name is 'publish':
+        elif attr_name == 'publish':
             api_logger.info(f"publish will be set to {value} for this FIRE object")
             url = url + "publish"
 
         if dry is False:
             try:
                 if header is not None:
-                    res = requests.put(url, auth=(self.user, self.pwd), headers=header)
+                    res = self.session.put(url, headers=header)
                 else:
                     if value is True:
                         # 'publish' will be set to True
-                        res = requests.put(url, auth=(self.user, self.pwd))
+                        res = self.session.put(url)
                     elif value is False:
                         # 'publish' will be set to False
-                        res = requests.delete(url, auth=(self.user, self.pwd))
+                        res = self.session.delete(url)
+                api_logger.debug(f"FIRE API connections: {self.connection_stats()}")
                 res.raise_for_status()
             except HTTPError as http_err:
                 print(f'HTTP error occurred: {http_err}')
@@ -401,7 +722,8 @@ class API(object):
 
         if dry is False:
             try:
-                res = requests.delete(url, auth=(self.user, self.pwd))
+                res = self.session.delete(url)
+                api_logger.debug(f"FIRE API connections: {self.connection_stats()}")
                 res.raise_for_status()
                 api_logger.info(f"FIRE object deleted")
             except HTTPError as http_err:
@@ -415,4 +737,64 @@ class API(object):
             api_logger.info(f"FIRE object was not deleted")
             api_logger.info(f"Use --dry False to deleted it")
         else:
-            raise Exception(f"dry option: {dry} not recognized")
\ No newline at end of file
+            raise Exception(f"dry option: {dry} not recognized")
+
+    def delete_objects(self, fireOids, workers=None, dry=True):
+        """
+        Function to delete several FIRE objects. The objects are
+        deleted concurrently over the pool of connections of self.session.
+        An object that does not exist anymore (404) is considered deleted,
+        so a deletion that was interrupted can be run again
+
+        Parameters
+        ----------
+        fireOids : list of str
+                   FIRE object ids.
+        workers : int, optional
+                  Number of objects deleted at the same time. If not defined, the
+                  'pool_size' option in the 'fire' section of CONFIG is used.
+        dry : bool, default=True
+              If True then it will not try to delete the FIRE objects.
+
+        Returns
+        -------
+        list of int
+            Return code for each of the 'fireOids'
+                0 : Success
+                1 : Error
+        """
+        api_logger.info(f"Deleting {len(fireOids)} FIRE objects")
+
+        if dry is True:
+            for fireOid in fireOids:
+                api_logger.info(f"FIRE object with fireOid: {fireOid} is going to be deleted")
+            api_logger.info(f"FIRE objects were not deleted")
+            api_logger.info(f"Use --dry False to deleted them")
+            return [0] * len(fireOids)
+        elif dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+
+        def delete(fireOid):
+            url = f"{CONFIG.get('fire', 'root_endpoint')}/{CONFIG.get('fire', 'version')}/objects/" \
+                  f"{fireOid}"
+            try:
+                res = self.session.delete(url)
+            except requests.RequestException as err:
+                api_logger.error(f"FIRE object with fireOid: {fireOid} could not be deleted: {err}")
+                return 1
+            if res.status_code == 404:
+                api_logger.info(f"FIRE object with fireOid: {fireOid} does not exist")
+                return 0
+            if not res.ok:
+                api_logger.error(f"FIRE object with fireOid: {fireOid} could not be deleted: "
+                                 f"{res.status_code} {res.text}")
+                return 1
+            return 0
+
+        workers = workers or CONFIG.getint('fire', 'pool_size', fallback=10)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            codes = list(executor.map(delete, fireOids))
+        api_logger.info(f"{codes.count(0)} FIRE objects deleted")
+        api_logger.debug(f"FIRE API connections: {self.connection_stats()}")
+
+        return codes
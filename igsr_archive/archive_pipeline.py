@@ -0,0 +1,406 @@
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from igsr_archive.file import File
+from igsr_archive.config import CONFIG
+
+# create logger
+ap_logger = logging.getLogger(__name__)
+
+# stages run for each file, in order
+STAGES = ('precheck', 'push', 'set_path', 'publish', 'db_update', 'delete')
+
+# stages run concurrently by the workers, each of them with its own
+# concurrency limit. 'db_update' and 'delete' run in batches in
+# the main thread
+CONCURRENT_STAGES = ('precheck', 'push', 'set_path', 'publish')
+
+class ArchiveTask(object):
+    """
+    Class to represent the archival of a single file
+
+    Attributes
+    ----------
+    path : str
+           Path of the file in the staging area.
+    fire_path : str
+                FIRE path of the archived file.
+    ftp_path : str
+               Path of the archived file in the FTP.
+    action : {'new', 'update', 'skip'}
+             What will be done with the file. 'new' if it is archived for the first time,
+             'update' if it replaces a file that is already archived and 'skip' if it
+             is already archived and it will not be replaced.
+    state : str
+            Last stage completed (see STAGES), 'pending', 'skipped' or 'failed'.
+    failed_stage : str
+                   Stage in which the archival failed.
+    error : str
+            Error message if the archival failed.
+    fileO : File object
+            File that will be pushed.
+    fire_obj : fObject
+               FIRE object created when pushing the file.
+    db_name : str
+              'name' of the DB entry that will be updated.
+    attrs : dict
+            { attr_name : value } that will be updated in the DB entry.
+    """
+    def __init__(self, path, fire_path, ftp_path):
+        self.path = path
+        self.fire_path = fire_path
+        self.ftp_path = ftp_path
+        self.action = None
+        self.state = 'pending'
+        self.failed_stage = None
+        self.error = None
+        self.fileO = None
+        self.fire_obj = None
+        self.db_name = None
+        self.attrs = {}
+
+    # object introspection
+    def __str__(self):
+        sb = []
+        for key in ['path', 'action', 'state', 'failed_stage', 'error']:
+            sb.append("{key}='{value}'".format(key=key, value=self.__dict__[key]))
+
+        return ', '.join(sb)
+
+    def __repr__(self):
+        return self.__str__()
+
+class ArchivePipeline(object):
+    """
+    Class to archive several files at once.
+
+    Each file goes through the following stages:
+    precheck -> push -> set_path -> publish -> db_update -> delete
+
+    The precheck, push, set_path and publish stages of different files
+    run concurrently in a pool of 'workers' threads and each stage has its
+    own concurrency limit. The DB entries of the files are fetched with a
+    single bulk lookup before starting and they are updated in batches of
+    'batch_size' entries. A file is deleted from the staging area only after
+    its DB entry has been updated.
+
+    Attributes
+    ----------
+    db : DB connection object.
+    api : API connection object.
+    workers : int
+              Number of files processed at once.
+    limits : dict
+             { stage : max number of files in this stage at once } for
+             the stages in CONCURRENT_STAGES.
+    batch_size : int
+                 Number of DB entries updated at once.
+    type : str
+           New file type used in the DB for the archived files.
+    update_existing : bool
+                      If True, then the files already archived in the FTP
+                      are replaced by the files in the staging area.
+    dry : bool
+          If True, then nothing will be archived.
+    tasks : list of ArchiveTask
+            Tasks of the last run.
+    """
+    def __init__(self, db, api, workers=4, limits=None, batch_size=1000, type=None,
+                 update_existing=False, dry=True):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        db : DB connection object.
+        api : API connection object.
+        workers : int, default=4
+                  Number of files processed at once.
+        limits : dict, optional
+                 { stage : max number of files in this stage at once }
+                 Only the stages in CONCURRENT_STAGES can be limited. The
+                 stages that are not in this dict are limited to 'workers' files.
+        batch_size : int, default=1000
+                     Number of DB entries updated at once.
+        type : str, optional
+               New file type used in the DB for the archived files.
+        update_existing : bool, default=False
+                          If True, then the files already archived in the FTP
+                          are replaced by the files in the staging area.
+        dry : bool, default=True
+              If True, then nothing will be archived.
+        """
+        ap_logger.debug('Creating ArchivePipeline object')
+
+        if dry is not True and dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+
+        self.db = db
+        self.api = api
+        self.workers = workers
+        self.limits = {stage: workers for stage in CONCURRENT_STAGES}
+        if limits is not None:
+            not_valid = set(limits) - set(CONCURRENT_STAGES)
+            if not_valid:
+                raise Exception(f"Stages: {', '.join(sorted(not_valid))} can not be limited. "
+                                f"Valid stages: {', '.join(CONCURRENT_STAGES)}")
+            self.limits.update(limits)
+        self.batch_size = batch_size
+        self.type = type
+        self.update_existing = update_existing
+        self.dry = dry
+        self.tasks = []
+        self._sems = {stage: threading.BoundedSemaphore(limit) for stage, limit in self.limits.items()}
+
+    def run(self, paths):
+        """
+        Function to archive the files in the staging area
+
+        Parameters
+        ----------
+        paths : list of str
+                Paths of the files in the staging area.
+
+        Returns
+        -------
+        dict : summary of the run (see `summary`)
+        """
+        ap_logger.info(f"Archiving {len(paths)} files using {self.workers} workers")
+
+        start = time.perf_counter()
+        staging_mount = CONFIG.get('ftp', 'staging_mount')
+        ftp_mount = CONFIG.get('ftp', 'ftp_mount')
+
+        self.tasks = []
+        for path in paths:
+            fire_path = path.replace(staging_mount + "/", '', 1)
+            self.tasks.append(ArchiveTask(path=path,
+                                          fire_path=fire_path,
+                                          ftp_path=os.path.join(ftp_mount, fire_path)))
+
+        # bulk lookup of the DB entries for the files in the staging area and in the FTP
+        in_db = self.db.fetch_files(paths=[t.path for t in self.tasks] + [t.ftp_path for t in self.tasks])
+
+        # tasks passed to _update_db
+        flushed = set()
+        batch = []
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._process, task, in_db) for task in self.tasks]
+                for future in as_completed(futures):
+                    task = future.result()
+                    if task.state != 'failed' and task.attrs:
+                        batch.append(task)
+                    if len(batch) >= self.batch_size:
+                        flushed.update(id(t) for t in batch)
+                        self._update_db(batch)
+                        batch = []
+        finally:
+            # the files already pushed to FIRE need their DB entries updated
+            # even if the run is interrupted, so the DB matches FIRE
+            batch = [t for t in self.tasks if id(t) not in flushed and t.attrs
+                     and t.state in ('publish', 'skipped')]
+            self._update_db(batch)
+
+        return self.summary(time.perf_counter() - start)
+
+    def _process(self, task, in_db):
+        """
+        Function to run the precheck, push, set_path and publish
+        stages for a file
+
+        Parameters
+        ----------
+        task : ArchiveTask
+        in_db : dict
+                { 'path' : File object } with the DB entries.
+
+        Returns
+        -------
+        task : ArchiveTask
+        """
+        for stage, func in [('precheck', self._precheck), ('push', self._push),
+                            ('set_path', self._set_path), ('publish', self._publish)]:
+            if task.action == 'skip':
+                break
+            try:
+                with self._sems[stage]:
+                    if stage == 'precheck':
+                        func(task, in_db)
+                    else:
+                        func(task)
+                task.state = 'skipped' if task.action == 'skip' else stage
+            except Exception as e:
+                ap_logger.error(f"Archival of {task.path} failed in stage '{stage}': {e}")
+                task.state = 'failed'
+                task.failed_stage = stage
+                task.error = str(e)
+                break
+
+        return task
+
+    def _precheck(self, task, in_db):
+        staging_mount = CONFIG.get('ftp', 'staging_mount')
+        # check if path exists
+        if not os.path.isfile(task.path):
+            raise Exception(f"File path to be archived: {task.path} does not exist")
+        # check if staging mount point exists in file path to be archived
+        if staging_mount not in task.path:
+            raise Exception(f"File to be archived: {task.path} is not placed in the staging area: "
+                            f"{staging_mount}. You need to move it first")
+
+        f_indb_o = in_db.get(task.path)
+        f_inftp_o = in_db.get(task.ftp_path)
+
+        # check if this fire_path is already in the FTP by
+        # querying the FIRE API
+        f_in_fire_o = self.api.fetch_object(firePath=task.fire_path)
+        if f_indb_o is None and f_inftp_o is not None:
+            task.db_name = task.ftp_path
+            if self.update_existing is True:
+                # 'f' that is in the staging area does not exist in DB, but it does exist in the FTP
+                # This means that user wants to update a file that is already in te FTP.
+                ap_logger.info(f"It seems that file: {task.path} is already archived and update_existing is True")
+                if f_in_fire_o is None:
+                    raise Exception(f"Object with FIRE path: {task.fire_path} was not retrieved")
+                # delete the FIRE object
+                self.api.delete_object(fireOid=f_in_fire_o.fireOid, dry=self.dry)
+                # Create File object pointing to the file placed in the staging area
+                task.fileO = File(name=task.path)
+                task.attrs['md5'] = task.fileO.md5
+                task.attrs['size'] = task.fileO.size
+                task.action = 'update'
+            else:
+                ap_logger.info(f"It seems that file: {task.path} is already archived and update_existing is False")
+                task.action = 'skip'
+        elif f_indb_o is not None and f_inftp_o is None:
+            # 'f' does not exist in the FTP, archive it as a new file
+            if f_in_fire_o is not None:
+                ap_logger.info(f"Wrong FTP path has been added to FTP for {task.path}, this will be deleted")
+                self.api.delete_object(fireOid=f_in_fire_o.fireOid, dry=self.dry)
+            task.fileO = f_indb_o
+            task.db_name = task.path
+            task.attrs['name'] = task.ftp_path
+            task.action = 'new'
+        elif f_indb_o is None and f_inftp_o is None:
+            raise Exception(f"File entry with path {task.path} does not exist in the DB. "
+                            f"You need to load it first in order to proceed")
+        else:
+            raise Exception(f"File entry with path {task.path} exists in the DB for both the staging "
+                            f"area and the FTP. Do not know what to do")
+
+        if self.type is not None:
+            task.attrs['type'] = self.type
+
+    def _push(self, task):
+        task.fire_obj = self.api.push_object(fileO=task.fileO, dry=self.dry, publish=False)
+
+    def _set_path(self, task):
+        if self.dry is True:
+            return
+        task.fire_obj = self.api.update_object(attr_name='firePath', value=task.fire_path,
+                                               fireOid=task.fire_obj.fireOid, dry=False)
+        if task.fire_obj is None:
+            raise Exception("Error adding a FIRE path to the object")
+
+    def _publish(self, task):
+        if self.dry is True:
+            return
+        task.fire_obj = self.api.update_object(attr_name='publish', value=True,
+                                               fireOid=task.fire_obj.fireOid, dry=False)
+        if task.fire_obj is None:
+            raise Exception("Error publishing the object")
+
+    def _update_db(self, batch):
+        """
+        Function to run the db_update and delete stages
+        for a batch of files
+
+        Parameters
+        ----------
+        batch : list of ArchiveTask
+        """
+        if not batch:
+            return
+        try:
+            codes = self.db.update_files([(t.db_name, t.attrs) for t in batch],
+                                         batch_size=self.batch_size,
+                                         dry=self.dry)
+        except Exception as e:
+            for task in batch:
+                task.state = 'failed'
+                task.failed_stage = 'db_update'
+                task.error = str(e)
+            raise
+        for task, code in zip(batch, codes):
+            if code != 0:
+                ap_logger.error(f"Something went wrong when updating the entry for {task.path} in the "
+                                f"'File' table of the DB")
+                task.state = 'failed'
+                task.failed_stage = 'db_update'
+                task.error = f"DB entry with name: {task.db_name} could not be updated"
+                continue
+            if task.action == 'skip':
+                continue
+            task.state = 'db_update'
+            # Finally, delete the file that has been pushed
+            if self.dry is False and task.fire_obj is not None:
+                try:
+                    ap_logger.info(f"File {task.path} successfully pushed and correctly updated in the DB. "
+                                   f"It will be removed")
+                    os.remove(task.path)
+                    task.state = 'delete'
+                except OSError as e:
+                    ap_logger.error(f"File {task.path} could not be removed: {e}")
+                    task.state = 'failed'
+                    task.failed_stage = 'delete'
+                    task.error = str(e)
+
+    def summary(self, elapsed=None):
+        """
+        Function to summarize the last run
+
+        Parameters
+        ----------
+        elapsed : float, optional
+                  Seconds taken by the run.
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'files' : number of files,
+             'archived' : number of files archived,
+             'skipped' : number of files skipped,
+             'failed' : { 'path' : (stage, error) },
+             'bytes' : number of bytes pushed,
+             'seconds' : elapsed time,
+             'files_per_s' : archived files per second,
+             'mb_per_s' : MB pushed per second}
+        """
+        pushed = [t for t in self.tasks if t.state in ('db_update', 'delete')]
+        nbytes = sum(int(t.fileO.size) for t in pushed if t.fileO is not None and t.fileO.size is not None)
+        summary = {
+            'files': len(self.tasks),
+            'archived': len(pushed),
+            'skipped': len([t for t in self.tasks if t.state == 'skipped']),
+            'failed': {t.path: (t.failed_stage, t.error) for t in self.tasks if t.state == 'failed'},
+            'bytes': nbytes,
+            'seconds': elapsed,
+        }
+        if elapsed:
+            summary['files_per_s'] = len(pushed) / elapsed
+            summary['mb_per_s'] = nbytes / 2**20 / elapsed
+
+        ap_logger.info(f"Files: {summary['files']}, archived: {summary['archived']}, "
+                       f"skipped: {summary['skipped']}, failed: {len(summary['failed'])}")
+        if elapsed:
+            ap_logger.info(f"{nbytes} bytes pushed in {elapsed:.2f}s ({summary['mb_per_s']:.1f} MB/s, "
+                           f"{summary['files_per_s']:.2f} files/s)")
+        for path, (stage, error) in summary['failed'].items():
+            ap_logger.error(f"{path} failed in stage '{stage}': {error}")
+
+        return summary
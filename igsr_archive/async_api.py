@@ -0,0 +1,242 @@
+import asyncio
+import base64
+import collections
+import logging
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from igsr_archive.object import fObject
+from igsr_archive.config import CONFIG
+from igsr_archive.utils import parse_retry_after, RETRY_STATUS
+
+# create logger
+aapi_logger = logging.getLogger(__name__)
+
+class AsyncAPI(object):
+    """
+    Class to fetch the metadata of many FIRE objects
+    concurrently using asyncio and aiohttp. It needs the
+    'async' extra: pip install igsr_archive[async]
+
+    Attributes
+    ----------
+    pwd : str
+          Password for API.
+    user : str
+           Username for API.
+    concurrency : int
+                  Max number of requests in flight.
+    retries : int
+              Number of times a request is retried after a connection
+              error, a 429 or a 5xx response.
+    retry_backoff : float
+                    Seconds to wait before the first retry of a request when the
+                    response has no 'Retry-After' header. The wait is doubled
+                    after each retry.
+    timeout : float
+              Total timeout in seconds of each request.
+    stats : dict
+            Number of 'requests' done, of 'retries' and of
+            'throttled' (429) responses received.
+    """
+    def __init__(self, pwd, concurrency=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        pwd : str
+              Password for API.
+        concurrency : int, optional
+                      Max number of requests in flight. If not defined, the
+                      'concurrency' option in the 'fire' section of CONFIG is used.
+
+        Raises
+        ------
+        Exception
+            If aiohttp is not installed.
+        """
+        aapi_logger.debug('Creating an AsyncAPI object')
+
+        if aiohttp is None:
+            raise Exception("AsyncAPI needs the 'aiohttp' package. "
+                            "Install it with: pip install igsr_archive[async]")
+
+        self.user = CONFIG.get('fire', 'user')
+        self.pwd = pwd
+        self.concurrency = concurrency or CONFIG.getint('fire', 'concurrency', fallback=50)
+        self.retries = CONFIG.getint('fire', 'retries', fallback=3)
+        self.retry_backoff = CONFIG.getfloat('fire', 'retry_backoff', fallback=0.5)
+        self.timeout = CONFIG.getfloat('fire', 'timeout', fallback=300)
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0}
+        # loop time before which no new request is sent,
+        # set after receiving a 429 response
+        self._resume_at = 0.0
+
+    def __create_session(self, concurrency):
+        """
+        Private function to create the aiohttp.ClientSession used
+        for the requests. The connector keeps up to 'concurrency'
+        keep-alive connections
+
+        Parameters
+        ----------
+        concurrency : int
+                      Max number of connections.
+
+        Returns
+        -------
+        session : aiohttp.ClientSession
+        """
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        credentials = base64.b64encode(f"{self.user}:{self.pwd}".encode()).decode()
+
+        return aiohttp.ClientSession(headers={'Authorization': f"Basic {credentials}"},
+                                     connector=connector,
+                                     timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def __wait_throttle(self):
+        """
+        Private function to wait until the time set by the last
+        429 response has passed
+        """
+        loop = asyncio.get_event_loop()
+        delay = self._resume_at - loop.time()
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self._resume_at - loop.time()
+
+    async def fetch_object(self, session, semaphore, firePath):
+        """
+        Function to fetch the metadata associated to a FIRE object.
+        Requests failing with a connection error, a 429 or a 5xx response
+        are retried. The 'Retry-After' header of the response is
+        honoured and, for 429 responses, no new request is sent
+        until that time has passed
+
+        Parameters
+        ----------
+        session : aiohttp.ClientSession
+        semaphore : asyncio.Semaphore
+                    Semaphore bounding the number of requests in flight.
+        firePath : str
+                   FIRE virtual path.
+
+        Returns
+        -------
+        fireObj : fire.object.fObject
+                  Object with metadata or None if there is no
+                  FIRE object with 'firePath'.
+
+        Raises
+        ------
+        Exception
+            If the request fails after self.retries retries.
+        """
+        url = f"{CONFIG.get('fire', 'root_endpoint')}/{CONFIG.get('fire', 'version')}/objects/path/" \
+              f"{firePath}"
+
+        attempt = 0
+        while True:
+            await self.__wait_throttle()
+            wait = None
+            async with semaphore:
+                try:
+                    async with session.get(url, allow_redirects=True) as res:
+                        self.stats['requests'] += 1
+                        if res.status == 200:
+                            json_res = await res.json(content_type=None)
+                            return fObject.from_json(json_res)
+                        elif res.status == 404:
+                            return None
+                        text = await res.text()
+                        if res.status not in RETRY_STATUS or attempt >= self.retries:
+                            raise Exception(f"Error fetching {firePath}: {res.status} {text}")
+                        wait = parse_retry_after(res.headers.get('Retry-After'))
+                        if res.status == 429:
+                            self.stats['throttled'] += 1
+                            if wait is None:
+                                wait = self.retry_backoff * 2 ** attempt
+                            loop = asyncio.get_event_loop()
+                            self._resume_at = max(self._resume_at, loop.time() + wait)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                    if attempt >= self.retries:
+                        raise
+                    aapi_logger.debug(f"Error fetching {firePath}: {err}")
+            if wait is None:
+                wait = self.retry_backoff * 2 ** attempt
+            attempt += 1
+            self.stats['retries'] += 1
+            aapi_logger.debug(f"Retrying {firePath} in {wait:.2f}s (attempt {attempt})")
+            await asyncio.sleep(wait)
+
+    async def fetch_objects(self, fire_paths, concurrency=None):
+        """
+        Asynchronous generator fetching the metadata of the
+        FIRE objects in 'fire_paths' concurrently. The results are yielded
+        in the same order as 'fire_paths', which is consumed lazily,
+        so it can be a generator of any length
+
+        Parameters
+        ----------
+        fire_paths : iterable or asynchronous iterable of str
+                     FIRE virtual paths.
+        concurrency : int, optional
+                      Max number of requests in flight. Default: self.concurrency.
+
+        Yields
+        ------
+        tuple
+            (firePath, fireObj) where fireObj is a fire.object.fObject
+            or None if there is no FIRE object with firePath.
+
+        Raises
+        ------
+        Exception
+            If one of the requests fails after self.retries retries.
+        """
+        concurrency = concurrency or self.concurrency
+        semaphore = asyncio.Semaphore(concurrency)
+        # max number of requests scheduled ahead of the
+        # first one that has not been yielded yet
+        window = 2 * concurrency
+
+        pending = collections.deque()
+        async with self.__create_session(concurrency) as session:
+            try:
+                if not hasattr(fire_paths, '__aiter__'):
+                    fire_paths = self.__aiter(fire_paths)
+                async for firePath in fire_paths:
+                    pending.append((firePath,
+                                    asyncio.ensure_future(self.fetch_object(session, semaphore, firePath))))
+                    if len(pending) >= window:
+                        firePath, task = pending.popleft()
+                        yield firePath, await task
+                while pending:
+                    firePath, task = pending.popleft()
+                    yield firePath, await task
+            finally:
+                for firePath, task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*[task for firePath, task in pending], return_exceptions=True)
+
+        aapi_logger.debug(f"FIRE API requests: {self.stats}")
+
+    @staticmethod
+    async def __aiter(items):
+        """
+        Private asynchronous generator yielding the items of an iterable
+        """
+        for item in items:
+            yield item
+
+    # object introspection
+    def __str__(self):
+        return f"AsyncAPI(user={self.user}, concurrency={self.concurrency})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -211,8 +211,8 @@ class ChangeEvents(object):
         chlog_obj.size = os.path.getsize(chlog_obj.name)
          # get the current path to CHANGELOG so it is updated in DB
         chglog_p = f"{CONFIG.get('ftp', 'ftp_mount')}{CONFIG.get('ctree', 'chlog_fpath')}"
-        db.update_file('md5', chlog_obj.md5, chglog_p, dry=dry)
-        db.update_file('size', chlog_obj.size, chglog_p, dry=dry)
+        db.update_files([(chglog_p, {'md5': chlog_obj.md5,
+                                     'size': chlog_obj.size})], dry=dry)
 
         ce_logger.info("Pushing updated CHANGELOG file to API")
         # to push the updated CHANGELOG you need to delete it from FIRE first
@@ -261,16 +261,19 @@ class ChangeEvents(object):
         
         ce_logger.info("Pushing changelog_details_* files to the archive")
 
+        fObjs = [File(name=p, type="CHANGELOG") for p in pathlist]
+        db.load_files(fObjs, dry=dry)
+
         pushed_files = []
-        for p in pathlist:
-            basename= os.path.basename(p)
-            fObj = File(name=p, type="CHANGELOG")
+        updates = []
+        for fObj in fObjs:
+            basename= os.path.basename(fObj.name)
             new_path = f"{CONFIG.get('ftp','ftp_mount')}{CONFIG.get('ctree','chlog_details_dir')}/{basename}"
-            db.load_file(fObj, dry=dry)
             api.push_object(fObj, dry=dry, publish=True,
                             fire_path=f"{CONFIG.get('ctree', 'chlog_details_dir')}/{basename}")
             pushed_files.append(f"{CONFIG.get('ctree', 'chlog_details_dir')}/{basename}")
-            db.update_file('name', new_path, fObj.name, dry=dry)
+            updates.append((fObj.name, {'name': new_path}))
+        db.update_files(updates, dry=dry)
 
         return pushed_files
 
@@ -0,0 +1,205 @@
+import logging
+import sys
+
+from array import array
+from collections.abc import Mapping, ItemsView
+
+# create logger
+cpt_logger = logging.getLogger(__name__)
+
+# size in bytes of a raw md5 digest
+MD5_SIZE = 16
+
+class CompactTree(Mapping):
+    """
+    Memory-efficient container for the { 'path' : md5 } records
+    of a current.tree file.
+
+    The directory part of each path is stored only once and the md5s
+    are stored as 16 raw bytes in a contiguous bytearray. It behaves as a
+    read-only dict (lookup, iteration, keys(), items() and the set
+    operations of the views) in which new records can be added with the
+    [] operator. Iteration follows the order in which the paths were
+    added, as in a dict.
+
+    Attributes
+    ----------
+    dirs : list of str
+           Directory prefixes (including the trailing '/'). The position of
+           each prefix in the list is its directory id.
+    """
+    def __init__(self, data=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        data : dict, optional
+               Dict in the format { 'path' : md5 } used to populate this object.
+        """
+        cpt_logger.debug('Creating CompactTree object')
+
+        self.dirs = []
+        # { 'dir_prefix' : dir_id }
+        self._dir_ix = {}
+        # one dict per dir_id: { 'basename' : slot }
+        self._lookup = []
+        # basename and dir_id of each slot, in insertion order
+        self._names = []
+        self._dir_ids = array('I')
+        # md5 of slot i is in self._md5s[i*16:(i+1)*16]
+        self._md5s = bytearray()
+        # { slot : md5 } for md5s that can not be stored as 16 raw bytes
+        # (i.e. NULL or malformed md5s)
+        self._odd = {}
+
+        if data is not None:
+            for path, md5 in data.items():
+                self[path] = md5
+
+    @staticmethod
+    def _split(path):
+        ix = path.rfind('/') + 1
+        return path[:ix], path[ix:]
+
+    @staticmethod
+    def _pack(md5):
+        """
+        Convert a md5 hexdigest into 16 raw bytes
+
+        Returns
+        -------
+        bytes or None if 'md5' is not a lowercase md5 hexdigest
+        """
+        if not isinstance(md5, str) or len(md5) != 2 * MD5_SIZE:
+            return None
+        try:
+            raw = bytes.fromhex(md5)
+        except ValueError:
+            return None
+        if raw.hex() != md5:
+            return None
+        return raw
+
+    def _slot(self, path):
+        if not isinstance(path, str):
+            return None
+        dirname, basename = self._split(path)
+        dir_id = self._dir_ix.get(dirname)
+        if dir_id is None:
+            return None
+        return self._lookup[dir_id].get(basename)
+
+    def _md5(self, slot):
+        if slot in self._odd:
+            return self._odd[slot]
+        ix = slot * MD5_SIZE
+        return self._md5s[ix:ix + MD5_SIZE].hex()
+
+    def _path(self, slot):
+        return self.dirs[self._dir_ids[slot]] + self._names[slot]
+
+    def __setitem__(self, path, md5):
+        dirname, basename = self._split(path)
+        dir_id = self._dir_ix.get(dirname)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(dirname)
+            self._dir_ix[dirname] = dir_id
+            self._lookup.append({})
+
+        raw = self._pack(md5)
+        slot = self._lookup[dir_id].get(basename)
+        if slot is None:
+            slot = len(self._names)
+            self._lookup[dir_id][basename] = slot
+            self._names.append(basename)
+            self._dir_ids.append(dir_id)
+            self._md5s += raw if raw is not None else bytes(MD5_SIZE)
+        else:
+            ix = slot * MD5_SIZE
+            self._md5s[ix:ix + MD5_SIZE] = raw if raw is not None else bytes(MD5_SIZE)
+            self._odd.pop(slot, None)
+
+        if raw is None:
+            self._odd[slot] = md5
+
+    def __getitem__(self, path):
+        slot = self._slot(path)
+        if slot is None:
+            raise KeyError(path)
+        return self._md5(slot)
+
+    def __contains__(self, path):
+        return self._slot(path) is not None
+
+    def __iter__(self):
+        dirs = self.dirs
+        for dir_id, basename in zip(self._dir_ids, self._names):
+            yield dirs[dir_id] + basename
+
+    def __len__(self):
+        return len(self._names)
+
+    def items(self):
+        return CompactTreeItemsView(self)
+
+    def memory_usage(self):
+        """
+        Function to calculate the approximate number of bytes
+        used by this object
+
+        Returns
+        -------
+        int : size in bytes
+        """
+        size = sys.getsizeof(self)
+        size += sys.getsizeof(self.dirs) + sum(sys.getsizeof(d) for d in self.dirs)
+        size += sys.getsizeof(self._dir_ix)
+        size += sys.getsizeof(self._lookup)
+        for lookup in self._lookup:
+            size += sys.getsizeof(lookup) + sum(sys.getsizeof(slot) for slot in lookup.values())
+        size += sys.getsizeof(self._names) + sum(sys.getsizeof(n) for n in self._names)
+        size += sys.getsizeof(self._dir_ids)
+        size += sys.getsizeof(self._md5s)
+        size += sys.getsizeof(self._odd) + sum(sys.getsizeof(v) for v in self._odd.values())
+
+        return size
+
+    # object introspection
+    def __str__(self):
+        return f"CompactTree(records={len(self)}, dirs={len(self.dirs)})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class CompactTreeItemsView(ItemsView):
+    """
+    ItemsView for CompactTree that does not need to look up
+    each path when iterating
+    """
+    def __iter__(self):
+        tree = self._mapping
+        for slot in range(len(tree)):
+            yield tree._path(slot), tree._md5(slot)
+
+def dict_memory_usage(data_dict):
+    """
+    Function to calculate the approximate number of bytes used
+    by a { 'path' : md5 } dict. Used for comparing with
+    CompactTree.memory_usage
+
+    Parameters
+    ----------
+    data_dict : dict
+                { 'path' : md5 }
+
+    Returns
+    -------
+    int : size in bytes
+    """
+    size = sys.getsizeof(data_dict)
+    for k, v in data_dict.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+
+    return size
@@ -0,0 +1,262 @@
+import logging
+import threading
+import time
+
+import pymysql
+
+# create logger
+cp_logger = logging.getLogger(__name__)
+
+class ConnectionPool(object):
+    """
+    Class to represent a pool of connections to a MySQL server.
+
+    Connections are created on demand (up to 'size' connections) and
+    the idle ones are reused. A connection that has been idle for more
+    than 'check_interval' seconds is pinged before being returned and
+    it is replaced by a new one if the server has dropped it.
+
+    Attributes
+    ----------
+    connect : function
+              Function without arguments returning a new Connection object.
+    size : int
+           Max number of connections opened at once.
+    check_interval : float
+                     Seconds after which an idle connection is health-checked.
+    timeout : float
+              Default max number of seconds to wait for a connection in 'get'.
+    created : int
+              Number of connections created.
+    reconnects : int
+                 Number of dropped connections that have been replaced.
+    """
+    def __init__(self, connect, size=4, check_interval=30, timeout=60):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        connect : function
+                  Function without arguments returning a new Connection object.
+        size : int, default=4
+               Max number of connections opened at once.
+        check_interval : float, default=30
+                         Seconds after which an idle connection is health-checked.
+        timeout : float, default=60
+                  Default max number of seconds to wait for a connection in 'get'.
+        """
+        cp_logger.debug('Creating ConnectionPool object')
+
+        self.connect = connect
+        self.size = size
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.created = 0
+        self.reconnects = 0
+        # list of (conn, time when it was returned to the pool)
+        self._idle = []
+        self._nconns = 0
+        self._cond = threading.Condition()
+
+    def get(self, timeout=None):
+        """
+        Function to check out a connection from the pool. It will
+        block until a connection is available if all of them are in use
+
+        Parameters
+        ----------
+        timeout : float, optional
+                  Max number of seconds to wait for a connection.
+                  If None, then self.timeout is used.
+
+        Returns
+        -------
+        conn : Connection object
+
+        Raises
+        ------
+        Exception
+            If no connection was available after 'timeout' seconds
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._idle and self._nconns >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    raise Exception(f"No DB connection available after {timeout} seconds. "
+                                    f"All the {self.size} connections of the pool are in use")
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                # reserve the slot for a new connection
+                conn, last_used = None, None
+                self._nconns += 1
+
+        try:
+            if conn is None:
+                conn = self.connect()
+                with self._cond:
+                    self.created += 1
+            elif time.monotonic() - last_used > self.check_interval:
+                conn = self.check(conn)
+        except Exception:
+            self.__release_slot()
+            raise
+
+        return conn
+
+    def check(self, conn):
+        """
+        Function to check if a connection is still alive.
+        It will be replaced by a new one if not
+
+        Parameters
+        ----------
+        conn : Connection object
+
+        Returns
+        -------
+        conn : Connection object
+               'conn' or a new connection if 'conn' was dropped.
+        """
+        try:
+            conn.ping(reconnect=False)
+        except pymysql.Error:
+            cp_logger.warning("DB connection was dropped by the server. Reconnecting")
+            self.__close(conn)
+            conn = self.connect()
+            with self._cond:
+                self.reconnects += 1
+
+        return conn
+
+    def put(self, conn):
+        """
+        Function to return a connection to the pool
+
+        Parameters
+        ----------
+        conn : Connection object
+        """
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def discard(self, conn):
+        """
+        Function to close a connection that was checked
+        out from the pool and that will not be returned
+
+        Parameters
+        ----------
+        conn : Connection object
+        """
+        self.__close(conn)
+        self.__release_slot()
+
+    def close(self):
+        """
+        Close all the idle connections in the pool
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._nconns -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self.__close(conn)
+
+    def stats(self):
+        """
+        Function to get the usage counters of this pool
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'size' : int, 'open' : int, 'idle' : int, 'created' : int, 'reconnects' : int}
+        """
+        with self._cond:
+            return {'size': self.size, 'open': self._nconns, 'idle': len(self._idle),
+                    'created': self.created, 'reconnects': self.reconnects}
+
+    def __release_slot(self):
+        with self._cond:
+            self._nconns -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def __close(conn):
+        try:
+            conn.close()
+        except pymysql.Error:
+            pass
+
+    # object introspection
+    def __str__(self):
+        return f"ConnectionPool({self.stats()})"
+
+    def __repr__(self):
+        return self.__str__()
+
+class ConnectionLease(object):
+    """
+    Class to represent a connection checked out from a ConnectionPool
+    by a thread. If the thread finishes without releasing it, the lease
+    is garbage collected with the thread's threading.local data and the
+    connection is returned to the pool, so it is not lost.
+
+    Attributes
+    ----------
+    pool : ConnectionPool
+    conn : Connection object
+           None once the connection has been released or detached.
+    """
+    def __init__(self, pool, conn):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        pool : ConnectionPool
+               Pool where 'conn' was checked out.
+        conn : Connection object
+        """
+        self.pool = pool
+        self.conn = conn
+
+    def release(self):
+        """
+        Function to return the connection to the pool, without
+        leaving any transaction open. A connection that cannot
+        be rolled back is discarded
+        """
+        conn, self.conn = self.conn, None
+        if conn is None:
+            return
+        try:
+            conn.rollback()
+        except pymysql.Error:
+            self.pool.discard(conn)
+            return
+        self.pool.put(conn)
+
+    def detach(self):
+        """
+        Function to stop tracking the connection, i.e. because
+        it has been returned to the pool or discarded by the caller
+
+        Returns
+        -------
+        conn : Connection object
+        """
+        conn, self.conn = self.conn, None
+
+        return conn
+
+    def __del__(self):
+        if self.conn is not None:
+            cp_logger.debug('Returning the DB connection of a finished thread to the pool')
+            self.release()
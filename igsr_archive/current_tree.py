@@ -2,9 +2,13 @@ import logging
 import pdb
 import os
 import datetime
+import itertools
 import re
+import tempfile
 
 from igsr_archive.change_events import ChangeEvents
+from igsr_archive.compact_tree import CompactTree
+from igsr_archive.extsort import external_sort, DEFAULT_MEM_BUDGET
 from igsr_archive.file import File
 from igsr_archive.config import CONFIG
 from datetime import datetime
@@ -12,6 +16,43 @@ from datetime import datetime
 # create logger
 ct_logger = logging.getLogger(__name__)
 
+def _path_key(line):
+    name, md5, lineno = line.rstrip("\n").split("\t")
+    return name, int(lineno)
+
+def _md5_key(line):
+    md5, lineno, name = line.rstrip("\n").split("\t", 2)
+    return md5, int(lineno)
+
+def _iter_records(sorted_tree):
+    """
+    Generator yielding a (path, md5, line_number) tuple for each path in a
+    tree generated by CurrentTree.sort_tree. As in a dict, duplicated paths
+    keep the position of their first occurrence and the md5 of the last one
+    """
+    with open(sorted_tree) as f:
+        record = None
+        for line in f:
+            name, md5, lineno = line.rstrip("\n").split("\t")
+            if record is not None and record[0] == name:
+                record = (name, md5, record[2])
+                continue
+            if record is not None:
+                yield record
+            record = (name, md5, int(lineno))
+        if record is not None:
+            yield record
+
+def _iter_md5_groups(md5_sorted):
+    """
+    Generator yielding a (md5, [path1, path2, ...]) tuple for each
+    md5 in a file generated by CurrentTree.__sort_by_md5
+    """
+    with open(md5_sorted) as f:
+        lines = (line.rstrip("\n").split("\t", 2) for line in f)
+        for md5, group in itertools.groupby(lines, key=lambda x: x[0]):
+            yield md5, [x[2] for x in group]
+
 class CurrentTree(object):
     """
     Container for all operations aimed to generate the current.tree and
@@ -57,7 +98,8 @@ class CurrentTree(object):
         self.staging_tree = staging_tree
         self.dtime = datetime.now().strftime('%Y_%m_%dT%H%M%S')
 
-    def run(self, chlog_f, dry=True, limit=None):
+    def run(self, chlog_f, dry=True, limit=None, compact=False, mode='dict',
+            mem_budget=DEFAULT_MEM_BUDGET):
         """
         Function to perform all operations involved in the comparison
         between the current.tree in the DB and the current.tree in the FTP
@@ -71,6 +113,17 @@ class CurrentTree(object):
              and database will be modified.
         limit: int, optional
                Limit the number of records to retrieve from DB.
+        compact: bool, default=False
+                 If True, then the records of both trees will be stored
+                 in CompactTree objects instead of dicts, which use
+                 much less memory. Only used with mode='dict'.
+        mode: {'dict', 'merge'}, default='dict'
+              'dict': load both trees in memory and compare them with self.cmp_dicts.
+              'merge': dump the DB tree sorted by path and compare both trees
+              on disk with self.cmp_trees. Used for trees that do not fit in memory.
+        mem_budget: int, default=DEFAULT_MEM_BUDGET
+                    Approximate number of bytes used for sorting the trees
+                    with mode='merge'.
               
         Returns
         -------
@@ -88,16 +141,27 @@ class CurrentTree(object):
 
         fields = ['name', 'size', 'updated', 'md5']
 
-        ct_logger.info(f"Dumping files from DB to {self.staging_tree}")
-        db_dict = self.db.get_ctree(fields, outfile=self.staging_tree, limit=limit)[1]
-        ct_logger.info(f"Number of records dumped: {len(db_dict.keys())}")
-
-        ct_logger.info(f"Parsing records in {self.prod_tree}")
-        file_dict = self.get_file_dict()
-        ct_logger.info(f"Number of records parsed: {len(file_dict.keys())}")
-
-        ct_logger.info(f"Looking for differences between {self.staging_tree} and {self.prod_tree}")
-        chgEvents = self.cmp_dicts(db_dict=db_dict, file_dict=file_dict)
+        if mode == 'dict':
+            ct_logger.info(f"Dumping files from DB to {self.staging_tree}")
+            db_dict = self.db.get_ctree(fields, outfile=self.staging_tree, limit=limit, compact=compact)[1]
+            ct_logger.info(f"Number of records dumped: {len(db_dict.keys())}")
+
+            ct_logger.info(f"Parsing records in {self.prod_tree}")
+            file_dict = self.get_file_dict(compact=compact)
+            ct_logger.info(f"Number of records parsed: {len(file_dict.keys())}")
+            if compact is True:
+                ct_logger.info(f"Memory used by the records: {db_dict.memory_usage() + file_dict.memory_usage()} bytes")
+
+            ct_logger.info(f"Looking for differences between {self.staging_tree} and {self.prod_tree}")
+            chgEvents = self.cmp_dicts(db_dict=db_dict, file_dict=file_dict)
+        elif mode == 'merge':
+            ct_logger.info(f"Dumping files from DB sorted by path to {self.staging_tree}")
+            self.db.get_ctree(fields, outfile=self.staging_tree, limit=limit, ret_dict=False, order_by='name')
+
+            ct_logger.info(f"Looking for differences between {self.staging_tree} and {self.prod_tree}")
+            chgEvents = self.cmp_trees(tmpdir=CONFIG.get('ctree', 'temp'), mem_budget=mem_budget)
+        else:
+            raise Exception(f"mode: {mode} not recognized")
         ct_logger.info(f"Looking for differences between {self.staging_tree} and {self.prod_tree}. DONE!")
         if chgEvents.size() == 0:
             ct_logger.info("No changes detected, nothing will be done. "
@@ -144,8 +208,8 @@ class CurrentTree(object):
         """
         # updating metadata for existing staging_tree file in the DB
         staging_fobj = File(name=self.staging_tree)
-        self.db.update_file('md5',staging_fobj.md5, self.prod_tree, dry=dry)
-        self.db.update_file('size',staging_fobj.size, self.prod_tree, dry=dry)
+        self.db.update_files([(self.prod_tree, {'md5': staging_fobj.md5,
+                                                'size': staging_fobj.size})], dry=dry)
 
         # create a backup for self.prod_tree
         basename = os.path.basename(self.prod_tree)
@@ -172,7 +236,7 @@ class CurrentTree(object):
                              dry=dry)
         return fire_path
 
-    def get_file_dict(self):
+    def get_file_dict(self, compact=False):
         """
         Function to parse each line in the file pointed by self.prod_tree
         This file must have the following columns:
@@ -183,27 +247,96 @@ class CurrentTree(object):
         to create a dict with the following information:
         { 'path' : md5 }
 
+        Parameters
+        ----------
+        compact: bool, default=False
+                 If True, then a CompactTree object will be
+                 returned instead of a dict.
+
         Returns
         -------
-        data_dict: dict of str: str
+        data_dict: dict of str: str or CompactTree
                   { 'path' : md5 }
         """
-        data_dict = {}  # dict {'path' : 'md5' }
+        data_dict = CompactTree() if compact is True else {}  # dict {'path' : 'md5' }
         with open(self.prod_tree) as f:
             for line in f:
-                line = line.rstrip("\n")
-                line = line.rstrip("\t")
-                fields = line.split("\t")
-                if fields[1] == 'directory':
-                    continue
-                if len(fields) != 5:
+                record = self.parse_line(line)
+                if record is None:
                     continue
-                name = fields[0]
-                md5 = fields[4]
+                name, md5 = record
                 data_dict[name] = md5
 
         return data_dict
 
+    def parse_line(self, line):
+        """
+        Function to parse a line of a current.tree file with the columns:
+        <path> <type(file|directory> <size> <updated> <md5>
+
+        Parameters
+        ----------
+        line : str
+               Line to be parsed.
+
+        Returns
+        -------
+        tuple (path, md5) or None if the line represents a directory
+        or does not have the expected number of columns.
+        """
+        line = line.rstrip("\n")
+        line = line.rstrip("\t")
+        fields = line.split("\t")
+        if len(fields) != 5 or fields[1] == 'directory':
+            return None
+
+        return fields[0], fields[4]
+
+    def sort_tree(self, tree, tmpdir=None, mem_budget=DEFAULT_MEM_BUDGET):
+        """
+        Function to generate a copy of a current.tree file sorted by path
+        in the format:
+        <path> <md5> <line_number>
+
+        <line_number> is the line of the first occurrence of <path> in 'tree'. If 'tree'
+        is already sorted, then the lines are not sorted again.
+
+        Parameters
+        ----------
+        tree : str
+               Path to current.tree file.
+        tmpdir : str, optional
+                 Directory used for the sorted copy and for the temporary files.
+        mem_budget : int, default=DEFAULT_MEM_BUDGET
+                     Approximate number of bytes used for sorting.
+
+        Returns
+        -------
+        sorted_tree : str
+                      Path to the sorted copy.
+        """
+        fd, sorted_tree = tempfile.mkstemp(prefix=f"{os.path.basename(tree)}.", suffix='.sorted',
+                                           dir=tmpdir)
+        is_sorted = True
+        prev = None
+        with open(tree) as f, os.fdopen(fd, 'w') as out:
+            for lineno, line in enumerate(f):
+                record = self.parse_line(line)
+                if record is None:
+                    continue
+                name, md5 = record
+                if prev is not None and name < prev:
+                    is_sorted = False
+                prev = name
+                out.write(f"{name}\t{md5}\t{lineno}\n")
+
+        if is_sorted is False:
+            ct_logger.info(f"{tree} is not sorted. Sorting it...")
+            external_sort(sorted_tree, sorted_tree, key=_path_key,
+                          mem_budget=mem_budget, tmpdir=tmpdir)
+
+        return sorted_tree
+
     def getKeysByValue(dictOfElements, valueToFind):
         """
         Get a list of keys from dictionary which has the given value
@@ -220,6 +353,32 @@ class CurrentTree(object):
                 listOfKeys.append(item[0])
         return listOfKeys
 
+    def index_by_md5(self, data_dict, md5s):
+        """
+        Function to build a reverse index for the paths in 'data_dict'
+        having one of the md5s in 'md5s'. The index is built in a single pass
+
+        Parameters
+        ----------
+        data_dict : dict
+                    Dict in the format { 'name' : 'md5sum' }.
+        md5s : set or dict
+               md5s to be indexed.
+
+        Returns
+        -------
+        md5_ix : dict of str: list
+                 { 'md5' : ['path1', 'path2', ...] }
+                 Paths sharing the same md5 are kept in the same order
+                 they were inserted in 'data_dict'.
+        """
+        md5_ix = {}
+        for path, md5 in data_dict.items():
+            if md5 in md5s:
+                md5_ix.setdefault(md5, []).append(path)
+
+        return md5_ix
+
     def cmp_dicts(self, db_dict, file_dict):
         """
         Function to compare the 'db_dict' and 'file_dict' dicts and look
@@ -227,38 +386,52 @@ class CurrentTree(object):
 
         Parameters
         ----------
-        db_dict : dict
+        db_dict : dict or CompactTree
                   Dict in the format { 'name' : 'md5sum' } generated
                   by self.db.get_ctree.
-        file_dict : dict
+        file_dict : dict or CompactTree
                     Dict in the format { 'name' : 'md5sum' } generated
                     by self.get_file_dict.
         Returns
         -------
         ChangeEvents object
+
+        Notes
+        -----
+        When several paths share the md5 of a path that is new in 'db_dict', the paths
+        in 'file_dict' and in 'db_dict' having that md5 are paired in the order they were
+        inserted in each of the dicts.
         """
-        d1_keys = set(db_dict.keys())
-        d2_keys = set(file_dict.keys())
-        shared_keys = d1_keys.intersection(d2_keys)
-        ct_logger.info(f"Number of records shared: {len(shared_keys)}")
-        new_in_db = d1_keys - d2_keys
-        new = d1_keys - d2_keys
-        withdrawn = d2_keys - d1_keys
+        # the keys of both dicts are not copied into sets, so this works in the
+        # same way with dicts and with CompactTree objects
+        new = {k for k in db_dict if k not in file_dict}
+        withdrawn = {k for k in file_dict if k not in db_dict}
+        ct_logger.info(f"Number of records shared: {len(db_dict) - len(new)}")
         moved = {} # initialise dict
-        
+
         # this regex will be used to skip the changelog_details_* files, as considering
         # them would be self-referential
         patt = f".*changelog_details_.*_.*"
         p = re.compile(patt)
-        for r in new_in_db:
+
+        # md5s of the records that are new in the DB, in the order they appear in db_dict.
+        # Only the records having one of these md5s can be involved in a move
+        new_md5s = {}
+        for r, md5 in db_dict.items():
+            if r not in new:
+                continue
             if p.match(r):
-                new.remove(r)
+                new.discard(r)
                 continue
-            md5 = db_dict[r]
-            # check if file_dict or db_dict contain different records with the same 'md5'. Which basically
-            # means that file is the same but dir or filename has changed
-            pathfdict = [key for (key, value) in file_dict.items() if value == md5]
-            pathdbdict = [key for (key, value) in db_dict.items() if value == md5]
+            new_md5s[md5] = None
+
+        # check if file_dict or db_dict contain different records with the same 'md5'. Which basically
+        # means that file is the same but dir or filename has changed
+        fdict_ix = self.index_by_md5(file_dict, new_md5s)
+        dbdict_ix = self.index_by_md5(db_dict, new_md5s)
+        for md5 in new_md5s:
+            pathfdict = fdict_ix.get(md5, [])
+            pathdbdict = dbdict_ix.get(md5, [])
             for i, j in zip(pathfdict, pathdbdict):
                 if j in new:
                     new.remove(j)
@@ -267,7 +440,10 @@ class CurrentTree(object):
                 moved[j] = i
 
         # { 'path' : tuple ('new_md5', 'old_md5')}
-        replacement = {o: (db_dict[o], file_dict[o]) for o in shared_keys if db_dict[o] != file_dict[o]}
+        replacement = {}
+        for o, md5 in db_dict.items():
+            if o in file_dict and md5 != file_dict[o]:
+                replacement[o] = (md5, file_dict[o])
         # the current.tree and CHANGELOG files will change but these ones will not be reported
         replacement.pop('ftp/CHANGELOG', None)
         replacement.pop('ftp/current.tree', None)
@@ -276,6 +452,122 @@ class CurrentTree(object):
         
         return ChangeEvents(new, withdrawn, moved, replacement)
 
+    def cmp_trees(self, tmpdir=None, mem_budget=DEFAULT_MEM_BUDGET):
+        """
+        Function to compare self.staging_tree and self.prod_tree and look for differences
+        without loading the trees in memory.
+
+        Both trees are sorted by path on disk (see self.sort_tree) and are walked once to
+        find the new, withdrawn and replaced paths. The paths involved in moves are then
+        found by sorting the records having the md5 of a new path on disk by md5.
+        The result is the same as the one obtained with self.cmp_dicts.
+
+        Parameters
+        ----------
+        tmpdir : str, optional
+                 Directory used for the temporary files.
+        mem_budget : int, default=DEFAULT_MEM_BUDGET
+                     Approximate number of bytes used for sorting.
+
+        Returns
+        -------
+        ChangeEvents object
+        """
+        # this regex will be used to skip the changelog_details_* files, as considering
+        # them would be self-referential
+        patt = f".*changelog_details_.*_.*"
+        p = re.compile(patt)
+
+        tmp_files = []
+        try:
+            db_sorted = self.sort_tree(self.staging_tree, tmpdir=tmpdir, mem_budget=mem_budget)
+            tmp_files.append(db_sorted)
+            file_sorted = self.sort_tree(self.prod_tree, tmpdir=tmpdir, mem_budget=mem_budget)
+            tmp_files.append(file_sorted)
+
+            new = {} # { 'path' : 'md5' }
+            withdrawn = set()
+            # { 'path' : tuple ('new_md5', 'old_md5')}
+            replacement = {}
+            nshared = 0
+            db_it = _iter_records(db_sorted)
+            file_it = _iter_records(file_sorted)
+            d = next(db_it, None)
+            f = next(file_it, None)
+            while d is not None or f is not None:
+                if f is None or (d is not None and d[0] < f[0]):
+                    if not p.match(d[0]):
+                        new[d[0]] = d[1]
+                    d = next(db_it, None)
+                elif d is None or f[0] < d[0]:
+                    withdrawn.add(f[0])
+                    f = next(file_it, None)
+                else:
+                    nshared += 1
+                    if d[1] != f[1]:
+                        replacement[d[0]] = (d[1], f[1])
+                    d = next(db_it, None)
+                    f = next(file_it, None)
+            ct_logger.info(f"Number of records shared: {nshared}")
+
+            moved = {} # initialise dict
+            new_md5s = set(new.values())
+            if new_md5s:
+                # check if prod_tree or staging_tree contain different records with the same 'md5'.
+                # Which basically means that file is the same but dir or filename has changed
+                db_md5 = self.__sort_by_md5(db_sorted, new_md5s, tmpdir, mem_budget)
+                tmp_files.append(db_md5)
+                file_md5 = self.__sort_by_md5(file_sorted, new_md5s, tmpdir, mem_budget)
+                tmp_files.append(file_md5)
+                db_groups = _iter_md5_groups(db_md5)
+                file_groups = _iter_md5_groups(file_md5)
+                dg = next(db_groups, None)
+                fg = next(file_groups, None)
+                while dg is not None and fg is not None:
+                    if dg[0] < fg[0]:
+                        dg = next(db_groups, None)
+                    elif fg[0] < dg[0]:
+                        fg = next(file_groups, None)
+                    else:
+                        for i, j in zip(fg[1], dg[1]):
+                            new.pop(j, None)
+                            withdrawn.discard(i)
+                            moved[j] = i
+                        dg = next(db_groups, None)
+                        fg = next(file_groups, None)
+        finally:
+            for path in tmp_files:
+                os.remove(path)
+
+        # the current.tree and CHANGELOG files will change but these ones will not be reported
+        replacement.pop('ftp/CHANGELOG', None)
+        replacement.pop('ftp/current.tree', None)
+
+        ct_logger.info(f"Number of records that are new in the DB: {len(new)}")
+
+        return ChangeEvents(set(new), withdrawn, moved, replacement)
+
+    def __sort_by_md5(self, sorted_tree, md5s, tmpdir, mem_budget):
+        """
+        Private function to write the records of a tree generated by self.sort_tree
+        that have one of the md5s in 'md5s', sorted by md5 and by line number
+        in the format:
+        <md5> <line_number> <path>
+
+        Returns
+        -------
+        str : Path to the file with the sorted records.
+        """
+        fd, md5_sorted = tempfile.mkstemp(prefix=f"{os.path.basename(sorted_tree)}.", suffix='.md5',
+                                          dir=tmpdir)
+        with os.fdopen(fd, 'w') as out:
+            for name, md5, lineno in _iter_records(sorted_tree):
+                if md5 in md5s:
+                    out.write(f"{md5}\t{lineno}\t{name}\n")
+
+        return external_sort(md5_sorted, md5_sorted, key=_md5_key,
+                             mem_budget=mem_budget, tmpdir=tmpdir)
+
     # object introspection
     def __str__(self):
         sb = []
@@ -1,11 +1,18 @@
 from igsr_archive.file import File
+from igsr_archive.file_record import FileRecord
+from igsr_archive.compact_tree import CompactTree
+from igsr_archive.connection_pool import ConnectionPool, ConnectionLease
 
 import pymysql
 import logging
+import contextlib
 import datetime
+import functools
 import os
 import sys
 import pdb
+import threading
+import time
 
 from igsr_archive.config import CONFIG
 
@@ -13,6 +20,78 @@ from igsr_archive.config import CONFIG
 # create logger
 db_logger = logging.getLogger(__name__)
 
+# MySQL errors raised when the connection is lost:
+# 2006: MySQL server has gone away
+# 2013: Lost connection to MySQL server during query
+CONN_LOST_ERRORS = (2006, 2013)
+
+def retry_read(func):
+    """
+    Decorator for the DB functions that only read from the DB.
+    If the connection is lost while running 'func', then it
+    is replaced and 'func' is run again (up to DB.read_retries times)
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        for attempt in range(self.read_retries + 1):
+            try:
+                return func(self, *args, **kwargs)
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                lost = isinstance(e, pymysql.err.InterfaceError) or e.args[0] in CONN_LOST_ERRORS
+                if not lost or attempt == self.read_retries:
+                    raise
+                db_logger.warning(f"DB connection lost in '{func.__name__}': {e}. Retrying")
+                self.discard_conn()
+    return wrapper
+
+# columns of the 'file' table that can be modified with DB.update_files
+UPDATABLE_COLUMNS = ('name', 'md5', 'type', 'size', 'host_id', 'withdrawn', 'created')
+
+# parameterized INSERT used for loading entries in the 'file' table.
+# file_id is AUTO_INCREMENT. The VALUES clause must only contain placeholders,
+# so pymysql's executemany sends a single multi-row INSERT
+INSERT_FILE_SQL = "INSERT INTO file (name, md5, type, size, host_id, withdrawn, created) " \
+                  "VALUES (%s, %s, %s, %s, %s, %s, %s)"
+
+# columns of the 'file' table
+FILE_COLUMNS = ('file_id', 'name', 'md5', 'type', 'size', 'host_id', 'withdrawn', 'created', 'updated')
+
+# types of the rows yielded by DB.iter_files
+ROW_TYPES = ('file', 'record', 'tuple', 'dict')
+
+def file_key(name, md5):
+    """
+    Function to get the key of an entry of the 'file' table, as
+    compared by its UNIQUE (name, md5) index. The comparison is
+    case-insensitive, as the collation of the table
+
+    Parameters
+    ----------
+    name : str
+    md5 : str
+
+    Returns
+    -------
+    tuple
+    """
+    return (name.lower(), md5.lower() if md5 is not None else None)
+
+def escape_like(value):
+    """
+    Function to escape the wildcard characters of
+    a value used in a 'LIKE' pattern
+
+    Parameters
+    ----------
+    value : str
+            Value to be escaped.
+
+    Returns
+    -------
+    str : escaped value
+    """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
 class DB(object):
     """
     Class to represent a Reseqtrack db
@@ -20,14 +99,19 @@ class DB(object):
     Attributes
     ----------
     conn : Connection object
-           Connection to MySQL db.
+           Connection to MySQL db used by the current thread.
+           It is checked out from 'pool' the first time it is used.
+    pool : ConnectionPool object
+           Pool with the connections to MySQL db.
     pwd : str
           Password used for MySQL server connection.
     dbname : str
             Reseqtrack db name.
+    read_retries : int
+                   Number of times a read is retried if the connection is lost.
     """
 
-    def __init__(self, pwd, dbname):
+    def __init__(self, pwd, dbname, pool_size=4, read_retries=3):
         """
         Constructor
 
@@ -37,18 +121,108 @@ class DB(object):
               Password for API.
         dbname: str
                 Reseqtrack db name.
+        pool_size : int, default=4
+                    Max number of connections opened at once. Each thread
+                    using this object uses its own connection.
+        read_retries : int, default=3
+                       Number of times a read is retried if the connection is lost.
         """
 
         db_logger.debug('Creating DB object')
 
         self.pwd = pwd
         self.dbname = dbname
-        self.conn = self.set_conn()
+        self.read_retries = read_retries
+        self.pool = ConnectionPool(self.set_conn, size=pool_size,
+                                   timeout=CONFIG.getfloat('mysql_conn', 'pool_timeout', fallback=60))
+        self._local = threading.local()
+        # check out the connection of this thread, so wrong
+        # credentials are detected when creating the object
+        self.conn
+        # False if the 'file' table does not have a 'basename' column
+        self._basename_col = True
+
+    @property
+    def conn(self):
+        """
+        Connection used by the current thread. A connection that
+        has not been used for a while is health-checked and replaced
+        if it was dropped by the server. The connection is returned to
+        the pool by 'release_conn' or when the thread finishes
+        """
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        now = time.monotonic()
+        if conn is None:
+            conn = self.pool.get()
+            local.lease = ConnectionLease(self.pool, conn)
+        elif now - local.last_used > self.pool.check_interval:
+            try:
+                conn = self.pool.check(conn)
+            except Exception:
+                local.conn = None
+                local.lease.detach()
+                self.pool.discard(conn)
+                raise
+            local.lease.conn = conn
+        local.conn = conn
+        local.last_used = now
+
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Context manager checking out a connection from the pool for
+        the current thread. It is used by worker threads, so the connection
+        is returned to the pool when the block finishes.
+
+        Yields
+        ------
+        conn : Connection object
+        """
+        owner = getattr(self._local, 'conn', None) is None
+        try:
+            yield self.conn
+        finally:
+            if owner:
+                self.release_conn()
+
+    def release_conn(self):
+        """
+        Function to return the connection of the
+        current thread to the pool
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        # do not leave any transaction open
+        self._local.lease.release()
+
+    def discard_conn(self):
+        """
+        Function to close the connection of the current thread.
+        A new one will be checked out the next time it is used
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        self._local.lease.detach()
+        self.pool.discard(conn)
+
+    def close(self):
+        """
+        Close all the connections to the MySQL server
+        """
+        self.release_conn()
+        self.pool.close()
 
     def set_conn(self):
         """
-        Function that will set the conn
-        class variable
+        Function that will open a new connection. It
+        is used by 'pool' for creating the connections
 
         Returns
         -------
@@ -123,6 +297,132 @@ class DB(object):
         else:
             raise Exception(f"dry option: {dry} not recognized")
 
+    def load_files(self, files, batch_size=1000, dry=True):
+        """
+        Function to load several entries in the table
+        'file' of self.dbname. The entries are inserted in
+        batches of 'batch_size' rows using multi-row INSERTs
+        and there is one commit per batch.
+
+        The 'file' table uses the MyISAM engine, so a failed INSERT is not
+        rolled back: the rows inserted before the failing one are kept.
+        For this reason, the entries of each batch that are already in
+        the DB (same name and md5) are rejected before inserting and, if
+        the INSERT fails, the DB is checked to find the entries that were
+        inserted. The rest of the entries are then inserted one by one so
+        the entries that can be loaded are not lost
+
+        Parameters
+        ----------
+        files : list of File objects
+                Files that will be stored in this DB.
+        batch_size : int, default=1000
+                     Number of entries inserted in each batch.
+        dry : bool, default=True
+              If True then it will not try to store the files in the DB.
+
+        Returns
+        -------
+        list of int
+            Return code for each of the files
+                0 : Success
+                1 : Error or file already in the DB
+        """
+        db_logger.info(f"Loading {len(files)} files")
+
+        if dry is not True and dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+
+        codes = []
+        start = time.perf_counter()
+        for i in range(0, len(files), batch_size):
+            batch = files[i:i + batch_size]
+            rows = [(f.name, f.md5, f.type, f.size, f.host_id, f.withdrawn, f.created) for f in batch]
+            if dry is True:
+                for row in rows:
+                    db_logger.info(f"INSERT sql: {INSERT_FILE_SQL} with values: {row}")
+                codes.extend([0] * len(rows))
+                continue
+            names = [f.name for f in batch]
+            keys = [file_key(f.name, f.md5) for f in batch]
+            batch_codes = [1] * len(batch)
+            cursor = self.conn.cursor()
+            try:
+                existing = self.__fetch_file_keys(cursor, names)
+                # entries to insert, without the ones in the DB or repeated in the batch
+                pending = []
+                seen = set()
+                for j, key in enumerate(keys):
+                    if key in existing or key in seen:
+                        db_logger.error(f"File could not be loaded: {names[j]}. "
+                                        f"An entry with the same name and md5 already exists")
+                        continue
+                    seen.add(key)
+                    pending.append(j)
+                if not pending:
+                    continue
+                try:
+                    cursor.executemany(INSERT_FILE_SQL, [rows[j] for j in pending])
+                    self.conn.commit()
+                    for j in pending:
+                        batch_codes[j] = 0
+                        db_logger.debug(f"File loaded: {names[j]}")
+                except pymysql.Error as e:
+                    db_logger.warning(f"Batch of {len(pending)} files could not be loaded. "
+                                      f"Loading them one by one", exc_info=True)
+                    # the rows before the failing one are in the DB
+                    inserted = self.__fetch_file_keys(cursor, names) - existing
+                    for j in pending:
+                        if keys[j] in inserted:
+                            batch_codes[j] = 0
+                            db_logger.debug(f"File loaded: {names[j]}")
+                            continue
+                        try:
+                            cursor.execute(INSERT_FILE_SQL, rows[j])
+                            self.conn.commit()
+                            db_logger.debug(f"File loaded: {names[j]}")
+                            batch_codes[j] = 0
+                        except pymysql.Error as e:
+                            db_logger.error(f"File could not be loaded: {names[j]}", exc_info=True)
+            except pymysql.Error as e:
+                db_logger.error(f"Could not check the entries of a batch of {len(batch)} files",
+                                exc_info=True)
+            finally:
+                cursor.close()
+                codes.extend(batch_codes)
+        elapsed = time.perf_counter() - start
+
+        if dry is True:
+            db_logger.info(f"Files were not stored in the DB.")
+            db_logger.info(f"Use --dry False to effectively store them")
+        else:
+            nloaded = codes.count(0)
+            rate = nloaded / elapsed if elapsed > 0 else 0.0
+            db_logger.info(f"{nloaded} files loaded ({codes.count(1)} errors) in "
+                           f"{elapsed:.2f}s ({rate:.0f} rows/s)")
+
+        return codes
+
+    def __fetch_file_keys(self, cursor, names):
+        """
+        Private function to get the (name, md5) keys of
+        the entries in the 'file' table with these names
+
+        Parameters
+        ----------
+        cursor : pymysql.cursors.Cursor
+        names : list of str
+
+        Returns
+        -------
+        set of tuples
+            Keys built with 'file_key'.
+        """
+        placeholders = ','.join(['%s'] * len(names))
+        cursor.execute(f"SELECT name, md5 FROM file WHERE name IN ({placeholders})", names)
+
+        return {file_key(name, md5) for name, md5 in cursor.fetchall()}
+
     def delete_file(self, f, dry=True):
         """
         Function to delete a certain entry
@@ -173,6 +473,79 @@ class DB(object):
         else:
             raise Exception(f"dry option: {dry} not recognized")
 
+    def delete_files(self, names, batch_size=1000, dry=True, missing_ok=False):
+        """
+        Function to delete several entries from the 'file' table
+        in self.dbname. Each batch of 'batch_size' entries is deleted
+        using a single DELETE statement and there is one commit per batch
+
+        Parameters
+        ----------
+        names : list of str
+                'name' (path) of the entries to be deleted.
+        batch_size : int, default=1000
+                     Number of entries deleted in each batch.
+        dry : bool, default=True
+              If dry=True then it will not delete the entries
+              from self.dbname.
+        missing_ok : bool, default=False
+                     If True, an entry that is not in the DB is considered
+                     deleted (i.e. it was deleted by a previous run).
+
+        Returns
+        -------
+        list of int
+            Return code for each of the 'names'
+                0 : Success
+                1 : Error or entry not found in the DB
+        """
+        db_logger.info(f"Deleting {len(names)} file entries")
+
+        if dry is not True and dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+
+        codes = {}
+        for i in range(0, len(names), batch_size):
+            batch = list(dict.fromkeys(names[i:i + batch_size]))
+            placeholders = ','.join(['%s'] * len(batch))
+
+            if dry is True:
+                db_logger.info(f"DELETE sql: DELETE FROM file WHERE name IN ({placeholders}) with values: {batch}")
+                codes.update((name, 0) for name in batch)
+                continue
+
+            cursor = self.conn.cursor()
+            try:
+                cursor.execute(f"SELECT name FROM file WHERE name IN ({placeholders})", batch)
+                found = {row[0] for row in cursor.fetchall()}
+                for name in batch:
+                    if name not in found and missing_ok is True:
+                        db_logger.info(f"File entry with name: {name} was already deleted")
+                        codes[name] = 0
+                    elif name not in found:
+                        db_logger.error(f"File entry with name: {name} does not exist in the DB")
+                        codes[name] = 1
+                batch = [name for name in batch if name in found]
+                if batch:
+                    cursor.execute(f"DELETE FROM file WHERE name IN ({','.join(['%s'] * len(batch))})", batch)
+                self.conn.commit()
+                codes.update((name, 0) for name in batch)
+            except pymysql.Error as e:
+                db_logger.error(f"Batch of {len(batch)} file entries could not be deleted", exc_info=True)
+                self.conn.rollback()
+                codes.update((name, 1) for name in batch)
+            finally:
+                cursor.close()
+
+        if dry is True:
+            db_logger.info(f"DB Entries were not deleted")
+            db_logger.info(f"Use --dry False to delete them")
+        else:
+            db_logger.info(f"{list(codes.values()).count(0)} file entries deleted")
+
+        return [codes[name] for name in names]
+
+    @retry_read
     def fetch_file(self, path=None, basename=None):
         """
         Function to fetch a certain entry from the table 'file' in
@@ -220,20 +593,112 @@ class DB(object):
             # Rollback in case there is any error
             self.conn.rollback()
 
+    @retry_read
+    def fetch_files(self, paths=None, basenames=None, chunk_size=1000):
+        """
+        Function to fetch several entries from the table 'file' in
+        self.dbname using a few queries of 'chunk_size' names each.
+        Basenames are looked up using the indexed 'basename' column
+        of the 'file' table. If this column does not exist, then
+        slower 'LIKE' queries will be used instead
+
+        Parameters
+        ----------
+        paths : list of str, optional
+                Paths of files to be retrieved.
+        basenames : list of str, optional
+                    Basenames of files to be retrieved.
+        chunk_size : int, default=1000
+                     Max number of names used in each query.
+
+        Returns
+        -------
+        dict
+            Dict in the format { 'path or basename' : File object }
+            with the files that were retrieved. If several entries have
+            the same basename, then only the first one is returned.
+        
+        Raises
+        ------
+        pymysql.Error
+        """
+        found = {}
+        cursor = self.conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            if paths:
+                abs_paths = list(dict.fromkeys(os.path.abspath(p) for p in paths))
+                db_logger.debug(f"Fetching {len(abs_paths)} files by path")
+                for i in range(0, len(abs_paths), chunk_size):
+                    chunk = abs_paths[i:i + chunk_size]
+                    query = f"SELECT * FROM file WHERE name IN ({','.join(['%s'] * len(chunk))})"
+                    cursor.execute(query, chunk)
+                    for row in cursor.fetchall():
+                        if row["name"] not in found:
+                            found[row["name"]] = File(**row)
+            if basenames:
+                basenames = list(dict.fromkeys(basenames))
+                db_logger.debug(f"Fetching {len(basenames)} files by basename")
+                for i in range(0, len(basenames), chunk_size):
+                    chunk = basenames[i:i + chunk_size]
+                    for row in self.__fetch_by_basenames(cursor, chunk):
+                        basename = os.path.basename(row["name"])
+                        if basename in chunk and basename not in found:
+                            found[basename] = File(**row)
+            cursor.close()
+            self.conn.commit()
+        except pymysql.Error as e:
+            db_logger.error("Exception occurred", exc_info=True)
+            # Rollback in case there is any error
+            self.conn.rollback()
+            raise
+
+        db_logger.debug(f"{len(found)} files retrieved from DB")
+
+        return found
+
+    def __fetch_by_basenames(self, cursor, basenames):
+        """
+        Function to run the query fetching the entries
+        with any of 'basenames'
+
+        Returns
+        -------
+        list of dict
+             Rows retrieved
+        """
+        if self._basename_col is True:
+            query = f"SELECT * FROM file WHERE basename IN ({','.join(['%s'] * len(basenames))})"
+            try:
+                cursor.execute(query, basenames)
+                return cursor.fetchall()
+            except pymysql.err.OperationalError as e:
+                # 1054: Unknown column
+                if e.args[0] != 1054:
+                    raise
+                db_logger.warning("The 'file' table does not have a 'basename' column. Basenames will be "
+                                  "fetched using slower 'LIKE' queries. Check table.sql for adding it")
+                self._basename_col = False
+
+        query = "SELECT * FROM file WHERE " + " OR ".join(["name LIKE %s"] * len(basenames))
+        cursor.execute(query, ['%' + escape_like(b) for b in basenames])
+        return cursor.fetchall()
+
+    @retry_read
     def fetch_files_by_pattern(self, pattern):
         """
         Function to fetch all files using a certain pattern
-        of the 'name' field: i.e. SELECT * FROM file WHERE name like '%PATTERN';
+        of the 'name' field: i.e. SELECT * FROM file WHERE name like 'PATTERN%';
 
         Parameters
         ----------
         pattern : str
-                  Pattern used to find files
+                  Pattern used to find files. It can contain the '%' and '_' wildcards.
 
         Returns
         -------
         file_list : list of str
                     List with all paths returned by the query
+                    or None if no file is found.
         
         Raises
         ------
@@ -241,32 +706,192 @@ class DB(object):
         """
         
         db_logger.debug(f"Fetching all files for pattern: {pattern}")
-        cursor = self.conn.cursor(pymysql.cursors.DictCursor)
-        query = f"SELECT * FROM file WHERE name like '{pattern}%'"
-        cursor.execute(query)
-        file_list = []
+        # the query runs on the connection of this thread, as iter_files
+        # would need a second connection of the pool
+        cursor = self.conn.cursor()
         try:
-            result_set = cursor.fetchall()
-            if not result_set:
-                db_logger.debug(f"No file retrieved from DB using using pattern:{pattern}")
-                return None
-            for row in result_set:
-                file_list.append(row["name"])
-            cursor.close()
+            cursor.execute("SELECT name FROM file WHERE name LIKE %s", [pattern + '%'])
+            file_list = [row[0] for row in cursor.fetchall()]
             self.conn.commit()
-        except pymysql.Error as e:
-            db_logger.error("Exception occurred", exc_info=True)
-            # Rollback in case there is any error
-            self.conn.rollback()
+        finally:
+            cursor.close()
+        if not file_list:
+            db_logger.debug(f"No file retrieved from DB using using pattern:{pattern}")
+            return None
 
         return file_list
 
-    def get_ctree(self, fields, outfile, limit=None):
+    def iter_files(self, prefix=None, pattern=None, columns=None, batch_size=10000, row_type='file',
+                   order_by=None):
+        """
+        Generator of the entries of the 'file' table. The entries are
+        fetched with an unbuffered server-side cursor in batches of
+        'batch_size' rows, so the memory used does not depend on the
+        number of entries. The cursor uses its own connection from
+        self.pool, so other queries can be run while iterating. Note that
+        this connection is taken in addition to the one used by the
+        thread in DB.conn, so the pool needs a free connection
+
+        Parameters
+        ----------
+        prefix : str, optional
+                 Only the entries whose 'name' starts with 'prefix' are
+                 fetched. The query uses the index on 'name'.
+        pattern : str, optional
+                  Only the entries whose 'name' is LIKE 'pattern' are fetched.
+                  The '%' and '_' wildcards are not escaped.
+        columns : list of str, optional
+                  Columns of the 'file' table fetched. Default: FILE_COLUMNS.
+        batch_size : int, default=10000
+                     Number of rows fetched from the server-side cursor each time.
+        row_type : {'file', 'record', 'tuple', 'dict'}, default='file'
+                   Type of the rows yielded: File objects, FileRecord objects,
+                   tuples with the values of 'columns' or { column : value } dicts.
+                   FileRecord objects are much cheaper to create than File objects,
+                   as they do not access the filesystem.
+        order_by : str, optional
+                   Column used for sorting the entries.
+
+        Yields
+        ------
+        File object, FileRecord object, tuple or dict
+
+        Raises
+        ------
+        Exception
+            If a column or 'row_type' is not valid
+        pymysql.Error
+        """
+        columns = tuple(columns) if columns is not None else FILE_COLUMNS
+        not_valid = set(columns) - set(FILE_COLUMNS)
+        if order_by is not None and order_by not in FILE_COLUMNS:
+            not_valid.add(order_by)
+        if not_valid:
+            raise Exception(f"Columns: {', '.join(sorted(not_valid))} are not valid")
+        if row_type not in ROW_TYPES:
+            raise Exception(f"row_type option: {row_type} not recognized")
+        if row_type == 'file' and 'name' not in columns:
+            raise Exception("The 'name' column is needed for creating File objects")
+
+        query = f"SELECT {','.join(columns)} FROM file"
+        conditions = []
+        params = []
+        if prefix is not None:
+            conditions.append("name LIKE %s")
+            params.append(escape_like(prefix) + '%')
+        if pattern is not None:
+            conditions.append("name LIKE %s")
+            params.append(pattern)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if order_by is not None:
+            query += f" ORDER BY {order_by}"
+
+        db_logger.debug(f"Iterating over the entries returned by: {query} with values: {params}")
+        nrows = 0
+        exhausted = False
+        conn = self.pool.get()
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                nrows += len(rows)
+                if row_type == 'tuple':
+                    yield from rows
+                elif row_type == 'record':
+                    if columns == FILE_COLUMNS:
+                        yield from map(FileRecord._make, rows)
+                    else:
+                        for row in rows:
+                            yield FileRecord(**dict(zip(columns, row)))
+                elif row_type == 'dict':
+                    for row in rows:
+                        yield dict(zip(columns, row))
+                else:
+                    for row in rows:
+                        yield File(**dict(zip(columns, row)))
+            exhausted = True
+        finally:
+            if exhausted:
+                cursor.close()
+                conn.commit()
+                self.pool.put(conn)
+            else:
+                # closing the cursor would read the rest of the
+                # rows, so the connection is closed instead
+                self.pool.discard(conn)
+            db_logger.debug(f"Number of rows fetched from DB: {nrows}")
+
+    @retry_read
+    def fetch_files_page(self, prefix, after=None, limit=1000, columns=('name', 'md5', 'size')):
+        """
+        Function to fetch a page of the entries whose 'name' starts with
+        'prefix', sorted by 'name' and 'file_id'. The next page is fetched
+        by passing the (name, file_id) of the last entry of the current page
+        as 'after', so the whole table can be scanned in constant memory
+        and the scan can be resumed from any entry.
+
+        'name' is not unique in the 'file' table (only 'name' and 'md5'
+        together are) and it is compared case-insensitively, so
+        'file_id' is needed to break the ties between the entries
+        with the same 'name'
+
+        Parameters
+        ----------
+        prefix : str
+                 Prefix of the 'name' of the entries.
+        after : tuple, optional
+                (name, file_id) of the last entry of the previous page.
+                Only the entries after it are fetched.
+        limit : int, default=1000
+                Max number of entries fetched.
+        columns : tuple of str, default=('name', 'md5', 'size')
+                  Columns of the 'file' table fetched. 'name' and 'file_id'
+                  are always fetched.
+
+        Returns
+        -------
+        rows : list of dict
+               List with one { column : value } dict per entry.
+
+        Raises
+        ------
+        pymysql.Error
+        """
+        columns = tuple(dict.fromkeys(('file_id', 'name') + tuple(columns)))
+        query = f"SELECT {','.join(columns)} FROM file WHERE name LIKE %s"
+        params = [escape_like(prefix) + '%']
+        if after is not None:
+            name, file_id = after
+            query += " AND (name > %s OR (name = %s AND file_id > %s))"
+            params.extend([name, name, file_id])
+        query += " ORDER BY name, file_id LIMIT %s"
+        params.append(limit)
+
+        cursor = self.conn.cursor(pymysql.cursors.DictCursor)
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+        return list(rows)
+
+    def get_ctree(self, fields, outfile, limit=None, batch_size=10000, ret_dict=True, compact=False,
+                  order_by=None):
         """
         Function to dump DB file records and generate
         a current tree file pointed by outfile.
-        This function will also parse each of the records
-        in the 'file' table and creates a dict with the following information:
+        The records are fetched using an unbuffered server-side cursor
+        in batches of 'batch_size' rows and are written to 'outfile'
+        as they arrive, so the memory used does not depend on the
+        number of records in the 'file' table.
+        Optionally, this function will also create a dict with the
+        following information for each of the dumped records:
         { 'path' : md5 }
 
         Parameter
@@ -280,56 +905,79 @@ class DB(object):
         limit: int, default = None
                Limit current.same.tree file to this int number of records
                If None then (all records will be dumped).
+        batch_size: int, default = 10000
+                    Number of rows fetched from the server-side cursor each time.
+        ret_dict: bool, default = True
+                  If False, then the { 'path' : md5 } dict will not be created.
+        compact: bool, default = False
+                 If True, then a CompactTree object will be created instead
+                 of a dict.
+        order_by: str, default = None
+                  Field from the 'file' table used for sorting the dumped records.
 
         Return
         ------
         outfile : str
                   path with current.tree.
-        data_dict : dict
+        data_dict : dict, CompactTree or None
                     Dict with md5s
                     { 'path' : md5 }
+                    None if 'ret_dict' is False.
         """
         assert isinstance(fields, list)
 
-        cursor = self.conn.cursor(pymysql.cursors.DictCursor)
         fields_str = ",".join(fields)
-        if limit is None:
-            query = f"SELECT {fields_str} FROM file"
-        else:
-            query = f"SELECT {fields_str} FROM file limit {limit}"
+        query = f"SELECT {fields_str} FROM file"
+        if order_by is not None:
+            query += f" ORDER BY {order_by}"
+        if limit is not None:
+            query += f" limit {limit}"
 
-        fields.insert(1, "type")
+        # fields written to outfile
+        out_fields = fields[:1] + ["type"] + fields[1:]
 
-        f = open(outfile, 'w')
+        ftp_prefix = CONFIG.get("ftp", "ftp_mount")+"/"
+        staging_mount = CONFIG.get("ftp", "staging_mount")
 
-        data_dict = {} # dict {'path' : 'md5' }
-        cursor.execute(query)
-        try:
-            result_set = cursor.fetchall()
-            if not result_set:
-                db_logger.debug(f"No file retrieved from DB using using query:{query}")
-                return None
-            for row in result_set:
-                row["name"] = row["name"].replace(CONFIG.get("ftp","ftp_mount")+"/","")
-                if CONFIG.get("ftp","staging_mount") in row["name"]:
-                    continue
-                # skip files that are in any dir that is not the ftp/ dir,
-                # as these files are not included in the current.tree file
-                bits = row["name"].split("/")
-                if bits[0] != "ftp":
-                    continue
-                row["type"] = "file"
-                data_dict[row["name"]] = row["md5"]
-                for k in fields:
-                    f.write(f"{row[k]}\t")
-                f.write("\n")
-            cursor.close()
-            self.conn.commit()
-        except pymysql.Error as e:
-            db_logger.error("Exception occurred", exc_info=True)
-            # Rollback in case there is any error
-            self.conn.rollback()
-        f.close
+        data_dict = None
+        if ret_dict is True:
+            data_dict = CompactTree() if compact is True else {} # dict {'path' : 'md5' }
+        nrows = 0
+        cursor = self.conn.cursor(pymysql.cursors.SSDictCursor)
+        with open(outfile, 'w') as f:
+            try:
+                cursor.execute(query)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    nrows += len(rows)
+                    lines = []
+                    for row in rows:
+                        row["name"] = row["name"].replace(ftp_prefix, "")
+                        if staging_mount in row["name"]:
+                            continue
+                        # skip files that are in any dir that is not the ftp/ dir,
+                        # as these files are not included in the current.tree file
+                        bits = row["name"].split("/")
+                        if bits[0] != "ftp":
+                            continue
+                        row["type"] = "file"
+                        if data_dict is not None:
+                            data_dict[row["name"]] = row["md5"]
+                        lines.append("".join(f"{row[k]}\t" for k in out_fields) + "\n")
+                    f.writelines(lines)
+                    db_logger.debug(f"Number of rows fetched from DB: {nrows}")
+                cursor.close()
+                self.conn.commit()
+            except pymysql.Error as e:
+                db_logger.error("Exception occurred", exc_info=True)
+                # Rollback in case there is any error
+                self.conn.rollback()
+
+        if nrows == 0:
+            db_logger.debug(f"No file retrieved from DB using using query:{query}")
+            return None
 
         return outfile, data_dict
 
@@ -391,6 +1039,192 @@ class DB(object):
         else:
             raise Exception(f"dry option: {dry} not recognized")
     
+    def update_files(self, updates, batch_size=1000, dry=True):
+        """
+        Update several attributes of several entries from the 'file'
+        table in self.dbname. Each batch of 'batch_size' entries is updated
+        using a single UPDATE statement and there is one commit per batch.
+
+        The 'file' table uses the MyISAM engine, so the batches are not
+        atomic: if the UPDATE fails, the rows changed before the error keep
+        their new values. In that case the entries of the batch are read
+        again, the ones that were already updated are counted as updated
+        and the rest are updated one by one
+
+        Parameters
+        ----------
+        updates : list of tuples
+                  List with tuples in the format:
+                  ('name' (path) of entry that will be updated, { attr_name : value })
+                  The 'name' attribute can also be updated.
+        batch_size : int, default=1000
+                     Number of entries updated in each batch.
+        dry : bool, default=True
+              If dry=True then it will not update the entries
+              in self.dbname.
+
+        Returns
+        -------
+        list of int
+            Return code for each of the tuples in 'updates'
+                0 : Success
+                1 : Error or entry not found in the DB
+
+        Raises
+        ------
+        Exception
+            If an attribute can not be updated
+        """
+        db_logger.info(f"Updating {len(updates)} file entries")
+
+        if dry is not True and dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+
+        for name, attrs in updates:
+            not_valid = set(attrs) - set(UPDATABLE_COLUMNS)
+            if not_valid:
+                raise Exception(f"Attributes: {', '.join(sorted(not_valid))} can not be updated")
+
+        now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        codes = {}
+        start = time.perf_counter()
+        for i in range(0, len(updates), batch_size):
+            # merge the updates of the same entry
+            batch = {}
+            for name, attrs in updates[i:i + batch_size]:
+                batch.setdefault(name, {}).update(attrs)
+
+            if dry is True:
+                update_sql, params = self.__build_update(batch, now_str)
+                db_logger.info(f"UPDATE sql: {update_sql} with values: {params}")
+                codes.update((name, 0) for name in batch)
+                continue
+
+            cursor = self.conn.cursor()
+            try:
+                names = list(batch)
+                cursor.execute(f"SELECT name FROM file WHERE name IN ({','.join(['%s'] * len(names))})", names)
+                found = {row[0] for row in cursor.fetchall()}
+                for name in names:
+                    if name not in found:
+                        db_logger.error(f"File entry with name: {name} does not exist in the DB")
+                        codes[name] = 1
+                batch = {name: attrs for name, attrs in batch.items() if name in found}
+                if batch:
+                    cursor.execute(*self.__build_update(batch, now_str))
+                self.conn.commit()
+                codes.update((name, 0) for name in batch)
+            except pymysql.Error as e:
+                db_logger.warning(f"Batch of {len(batch)} file entries could not be updated. "
+                                  f"Updating them one by one", exc_info=True)
+                try:
+                    applied = self.__fetch_applied(cursor, batch, now_str)
+                except pymysql.Error as e:
+                    db_logger.error(f"Could not check the entries of the batch", exc_info=True)
+                    codes.update((name, 1) for name in batch)
+                    continue
+                for name, attrs in batch.items():
+                    if name in applied:
+                        codes[name] = 0
+                        continue
+                    try:
+                        cursor.execute(*self.__build_update({name: attrs}, now_str))
+                        self.conn.commit()
+                        codes[name] = 0
+                    except pymysql.Error as e:
+                        db_logger.error(f"File entry with name: {name} could not be updated", exc_info=True)
+                        codes[name] = 1
+            finally:
+                cursor.close()
+        elapsed = time.perf_counter() - start
+
+        if dry is True:
+            db_logger.info(f"DB Entries were not updated")
+            db_logger.info(f"Use --dry False to update them")
+        else:
+            nupdated = list(codes.values()).count(0)
+            rate = nupdated / elapsed if elapsed > 0 else 0.0
+            db_logger.info(f"{nupdated} file entries updated ({len(codes) - nupdated} errors) in "
+                           f"{elapsed:.2f}s ({rate:.0f} rows/s)")
+
+        return [codes[name] for name, attrs in updates]
+
+    @staticmethod
+    def __fetch_applied(cursor, batch, now_str):
+        """
+        Function to find the entries of a batch whose UPDATE
+        was already applied, reading them again from the DB
+
+        Parameters
+        ----------
+        cursor : pymysql.cursors.Cursor
+        batch : dict
+                { 'name' : { attr_name : value } }
+        now_str : str
+                  Value of the 'updated' field set by the UPDATE.
+
+        Returns
+        -------
+        set of str
+            'name' of the entries already updated.
+        """
+        cols = sorted({a for attrs in batch.values() for a in attrs} - {'name'})
+        # an entry is looked up by its new name if it is renamed
+        targets = {name: attrs.get('name', name) for name, attrs in batch.items()}
+        placeholders = ','.join(['%s'] * len(targets))
+        cursor.execute(f"SELECT {', '.join(['name', 'updated'] + cols)} FROM file "
+                       f"WHERE name IN ({placeholders})", list(targets.values()))
+        rows = {row[0].lower(): row for row in cursor.fetchall()}
+
+        applied = set()
+        for name, attrs in batch.items():
+            row = rows.get(targets[name].lower())
+            if row is None or row[1] is None or row[1].strftime('%Y-%m-%d %H:%M:%S') != now_str:
+                continue
+            if all(str(row[2 + i]) == str(attrs[col]) for i, col in enumerate(cols) if col in attrs):
+                applied.add(name)
+
+        return applied
+
+    @staticmethod
+    def __build_update(batch, now_str):
+        """
+        Function to build a parameterized UPDATE statement for
+        several entries of the 'file' table
+
+        Parameters
+        ----------
+        batch : dict
+                { 'name' : { attr_name : value } }
+        now_str : str
+                  Value for the 'updated' field.
+
+        Returns
+        -------
+        tuple (update_sql, params)
+        """
+        names = list(batch)
+        assignments = []
+        params = []
+        # 'name' is set the last as MySQL uses the already updated values
+        # in the assignments that come after it
+        for col in sorted({a for attrs in batch.values() for a in attrs},
+                          key=lambda c: (c == 'name', c)):
+            whens = [(name, attrs[col]) for name, attrs in batch.items() if col in attrs]
+            assignments.append(f"{col} = CASE name {' '.join(['WHEN %s THEN %s'] * len(whens))} "
+                               f"ELSE {col} END")
+            for name, value in whens:
+                params.extend([name, value])
+        assignments.insert(0, "updated = %s")
+        params.insert(0, now_str)
+
+        update_sql = f"UPDATE file SET {', '.join(assignments)} " \
+                     f"WHERE name IN ({','.join(['%s'] * len(names))})"
+        params.extend(names)
+
+        return update_sql, params
+
     def add_ticket_track(self, ticket_id, directory, dry=True):
         db_logger.info(f"Adding the {ticket_id} associated with {directory} to the ticket_track table in the database")
 
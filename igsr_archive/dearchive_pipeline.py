@@ -0,0 +1,484 @@
+import json
+import logging
+import os
+import shutil
+import time
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# create logger
+dp_logger = logging.getLogger(__name__)
+
+# stages run for each file, in order
+STAGES = ('lookup', 'download', 'verify', 'delete_fire', 'delete_db')
+
+class DearchiveTask(object):
+    """
+    Class to represent the dearchival of a single file
+
+    Attributes
+    ----------
+    path : str
+           Path or basename of the file, as provided by the user.
+    db_name : str
+              'name' of the DB entry of the file.
+    fire_path : str
+                FIRE path of the archived file.
+    fireOid : str
+              FIRE object id.
+    size : int
+           Size in bytes of the FIRE object.
+    md5 : str
+          md5sum of the FIRE object.
+    outfile : str
+              Path of the downloaded file.
+    state : str
+            Last stage completed (see STAGES), 'pending' or 'failed'.
+    failed_stage : str
+                   Stage in which the dearchival failed.
+    error : str
+            Error message if the dearchival failed.
+    download : dict
+               Value returned by API.download_object.
+    resumed : bool
+              True if the task was resumed from the journal of a previous run.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db_name = None
+        self.fire_path = None
+        self.fireOid = None
+        self.size = None
+        self.md5 = None
+        self.outfile = None
+        self.state = 'pending'
+        self.failed_stage = None
+        self.error = None
+        self.download = None
+        self.resumed = False
+
+    def fail(self, stage, error):
+        dp_logger.error(f"Dearchival of {self.path} failed in stage '{stage}': {error}")
+        self.state = 'failed'
+        self.failed_stage = stage
+        self.error = str(error)
+
+    # object introspection
+    def __str__(self):
+        sb = []
+        for key in ['path', 'state', 'failed_stage', 'error']:
+            sb.append("{key}='{value}'".format(key=key, value=self.__dict__[key]))
+
+        return ', '.join(sb)
+
+    def __repr__(self):
+        return self.__str__()
+
+class DearchivePipeline(object):
+    """
+    Class to dearchive several files at once.
+
+    Each file goes through the following stages:
+    lookup -> download -> verify -> delete_fire -> delete_db
+
+    The DB entries of the files are fetched with a single bulk lookup and
+    their FIRE objects are looked up concurrently. Up to 'workers' files are
+    downloaded at the same time, and a download only starts if the free space
+    in 'directory' minus the size of the downloads in progress leaves at least
+    'min_free' bytes. The md5sum is calculated while downloading, so the
+    verification does not read the files again. The FIRE objects and the
+    DB entries of the verified files are deleted in batches of 'batch_size'
+    files, always the FIRE object first.
+
+    If a 'journal' is provided, the progress of each file is appended to it
+    as a JSON line and the files that were already dearchived in a previous
+    run with the same journal are skipped, so an interrupted run can be resumed.
+
+    Attributes
+    ----------
+    db : DB connection object.
+    api : API connection object.
+    directory : str
+                Directory used for storing the dearchived files.
+    workers : int
+              Number of files downloaded at once.
+    part_workers : int
+                   Number of ranged GETs used for downloading each file.
+    batch_size : int
+                 Number of files deleted at once.
+    min_free : int
+               Bytes that must be left free in 'directory'.
+    journal : str
+              Path to the JSON lines journal.
+    md5check : bool
+               If False, then the md5sum of the downloaded files is not checked.
+    md5_cache : MD5Cache object
+                If defined, it is seeded with the md5sum of the downloaded files.
+    dry : bool
+          If True, then nothing will be deleted.
+    tasks : list of DearchiveTask
+            Tasks of the last run.
+    """
+    def __init__(self, db, api, directory, workers=4, part_workers=1, batch_size=100, min_free=0,
+                 journal=None, md5check=True, md5_cache=None, dry=True):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        db : DB connection object.
+        api : API connection object.
+        directory : str
+                    Directory used for storing the dearchived files.
+        workers : int, default=4
+                  Number of files downloaded at once.
+        part_workers : int, default=1
+                       Number of ranged GETs used for downloading each file.
+        batch_size : int, default=100
+                     Number of files deleted at once.
+        min_free : int, default=0
+                   Bytes that must be left free in 'directory'.
+        journal : str, optional
+                  Path to the JSON lines journal.
+        md5check : bool, default=True
+                   If False, then the md5sum of the downloaded files is not checked.
+        md5_cache : MD5Cache object, optional
+                    If defined, it is seeded with the md5sum of the downloaded files.
+        dry : bool, default=True
+              If True, then nothing will be deleted.
+        """
+        dp_logger.debug('Creating DearchivePipeline object')
+
+        if dry is not True and dry is not False:
+            raise Exception(f"dry option: {dry} not recognized")
+        if not os.path.isdir(directory):
+            raise Exception(f"{directory} does not exist. Can't continue!")
+
+        self.db = db
+        self.api = api
+        self.directory = directory
+        self.workers = workers
+        self.part_workers = part_workers
+        self.batch_size = batch_size
+        self.min_free = min_free
+        self.journal = journal
+        self.md5check = md5check
+        self.md5_cache = md5_cache
+        self.dry = dry
+        self.tasks = []
+        self._reserved = 0
+
+    def __load_journal(self):
+        """
+        Private function to load the last entry of each
+        file in the journal
+
+        Returns
+        -------
+        dict
+            { 'path' : journal entry }
+        """
+        entries = {}
+        if self.journal is None or not os.path.isfile(self.journal):
+            return entries
+        with open(self.journal) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # last line of an interrupted run
+                    dp_logger.warning(f"Skipping malformed line in {self.journal}: {line}")
+                    continue
+                entries[entry['path']] = entry
+        # terminate the line of an interrupted run, so
+        # the next entries are not appended to it
+        with open(self.journal, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+
+        return entries
+
+    def __log(self, task):
+        """
+        Private function to append the state of
+        a task to the journal
+        """
+        if self.journal is None or self.dry is True:
+            return
+        with open(self.journal, 'a') as f:
+            f.write(json.dumps({'path': task.path, 'state': task.state, 'db_name': task.db_name,
+                                'fireOid': task.fireOid, 'outfile': task.outfile, 'size': task.size,
+                                'failed_stage': task.failed_stage, 'error': task.error}) + "\n")
+
+    def run(self, paths):
+        """
+        Function to dearchive several files
+
+        Parameters
+        ----------
+        paths : list of str
+                Paths or basenames of the files.
+
+        Returns
+        -------
+        dict : summary of the run (see `summary`)
+        """
+        dp_logger.info(f"Dearchiving {len(paths)} files using {self.workers} workers")
+
+        start = time.perf_counter()
+        journal = self.__load_journal()
+
+        self.tasks = []
+        to_lookup = []
+        to_delete = []
+        for path in paths:
+            task = DearchiveTask(path)
+            self.tasks.append(task)
+            entry = journal.get(path)
+            resumed = entry is not None and entry['state'] in ('verify', 'delete_fire', 'delete_db')
+            if resumed and entry['state'] == 'verify' and not self.__is_downloaded(entry):
+                # the FIRE object is still there, so the file can be downloaded again
+                dp_logger.warning(f"{entry['outfile']} is missing or incomplete. "
+                                  f"{path} will be downloaded again")
+                resumed = False
+            if resumed:
+                dp_logger.info(f"{path} was already dearchived up to stage '{entry['state']}'")
+                task.state = entry['state']
+                task.db_name = entry['db_name']
+                task.fireOid = entry['fireOid']
+                task.outfile = entry['outfile']
+                task.size = entry.get('size')
+                task.resumed = True
+                if task.state != 'delete_db':
+                    to_delete.append(task)
+            else:
+                to_lookup.append(task)
+
+        # bulk lookup of the DB entries
+        in_db = self.db.fetch_files(paths=[t.path for t in to_lookup if "/" in t.path],
+                                    basenames=[t.path for t in to_lookup if "/" not in t.path])
+
+        with ThreadPoolExecutor(max_workers=self.workers) as lookups, \
+                ThreadPoolExecutor(max_workers=self.workers) as downloads:
+            pending = {}
+            for task in lookups.map(lambda t: self._lookup(t, in_db), to_lookup):
+                if task.state == 'failed':
+                    self.__log(task)
+                    continue
+                # wait until there is enough space for the file
+                while pending and task.size > self.__free_space():
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    to_delete.extend(self.__collect(pending, done))
+                if task.size > self.__free_space():
+                    task.fail('download', f"Not enough space in {self.directory} for {task.size} bytes")
+                    self.__log(task)
+                    continue
+                self._reserved += task.size
+                pending[downloads.submit(self._download, task)] = task
+
+                done = [f for f in pending if f.done()]
+                to_delete.extend(self.__collect(pending, done))
+                while len(to_delete) >= self.batch_size:
+                    self._delete(to_delete[:self.batch_size])
+                    to_delete = to_delete[self.batch_size:]
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                to_delete.extend(self.__collect(pending, done))
+        for i in range(0, len(to_delete), self.batch_size):
+            self._delete(to_delete[i:i + self.batch_size])
+
+        return self.summary(time.perf_counter() - start)
+
+    @staticmethod
+    def __is_downloaded(entry):
+        """
+        Private function to check that the file of a journal
+        entry is still in place with the size of the FIRE object
+
+        Parameters
+        ----------
+        entry : dict
+                Journal entry.
+
+        Returns
+        -------
+        bool
+        """
+        outfile, size = entry.get('outfile'), entry.get('size')
+        if outfile is None or size is None or not os.path.isfile(outfile):
+            return False
+
+        return os.path.getsize(outfile) == size
+
+    def __free_space(self):
+        """
+        Private function to get the bytes that can be used for
+        new downloads in self.directory
+        """
+        return shutil.disk_usage(self.directory).free - self._reserved - self.min_free
+
+    def __collect(self, pending, done):
+        """
+        Private function to verify the downloads that have finished
+
+        Parameters
+        ----------
+        pending : dict
+                  { Future : DearchiveTask } with the downloads in progress.
+        done : list of Future
+               Downloads that have finished.
+
+        Returns
+        -------
+        list of DearchiveTask
+            Tasks that have been verified.
+        """
+        verified = []
+        for future in done:
+            task = pending.pop(future)
+            self._reserved -= task.size
+            if task.state == 'failed':
+                self.__log(task)
+                continue
+            try:
+                self._verify(task)
+                task.state = 'verify'
+                verified.append(task)
+            except Exception as e:
+                task.fail('verify', e)
+            self.__log(task)
+
+        return verified
+
+    def _lookup(self, task, in_db):
+        try:
+            if "/" in task.path and not task.path.startswith("/nfs"):
+                raise Exception(f"Path {task.path} does not start with /nfs")
+            key = os.path.abspath(task.path) if "/" in task.path else task.path
+            f = in_db.get(key)
+            if f is None:
+                raise Exception(f"File entry with path {task.path} does not exist in the DB")
+            task.db_name = f.name
+            if "ftp/" not in f.name:
+                raise Exception(f"File entry with path {f.name} is not in the FTP")
+            task.fire_path = "ftp/" + f.name.split("ftp/", 1)[1]
+            fire_obj = self.api.fetch_object(firePath=task.fire_path)
+            if fire_obj is None:
+                raise Exception(f"File entry with firePath {task.fire_path} is not archived in FIRE")
+            task.fireOid = fire_obj.fireOid
+            task.size = int(fire_obj.objectSize)
+            task.md5 = fire_obj.objectMd5
+            task.outfile = os.path.join(self.directory, os.path.basename(f.name))
+            task.state = 'lookup'
+        except Exception as e:
+            task.fail('lookup', e)
+
+        return task
+
+    def _download(self, task):
+        try:
+            task.download = self.api.download_object(firePath=task.fire_path,
+                                                     outfile=task.outfile,
+                                                     workers=self.part_workers,
+                                                     expected_size=task.size)
+            task.state = 'download'
+        except Exception as e:
+            task.fail('download', e)
+
+        return task
+
+    def _verify(self, task):
+        if task.download['size'] != task.size or os.path.getsize(task.outfile) != task.size:
+            raise Exception(f"Size of {task.outfile} does not match the size of the FIRE object")
+        if self.md5check is True and task.download['md5'] != task.md5:
+            os.remove(task.outfile)
+            raise Exception(f"md5sum of {task.outfile} ({task.download['md5']}) does not match "
+                            f"the md5sum of the FIRE object ({task.md5})")
+        if self.md5_cache is not None:
+            self.md5_cache.put(task.outfile, task.download['md5'])
+
+    def _delete(self, batch):
+        """
+        Function to run the delete_fire and delete_db
+        stages for a batch of files
+
+        Parameters
+        ----------
+        batch : list of DearchiveTask
+        """
+        if not batch:
+            return
+        in_fire = [t for t in batch if t.state == 'verify']
+        codes = self.api.delete_objects([t.fireOid for t in in_fire], dry=self.dry)
+        for task, code in zip(in_fire, codes):
+            if code != 0:
+                task.fail('delete_fire', f"FIRE object with fireOid: {task.fireOid} could not be deleted")
+            else:
+                task.state = 'delete_fire'
+            self.__log(task)
+
+        in_db = [t for t in batch if t.state == 'delete_fire']
+        # the DB entry of a resumed task may have been deleted by
+        # the previous run after its last journal line was written
+        for resumed in (False, True):
+            tasks = [t for t in in_db if t.resumed is resumed]
+            if not tasks:
+                continue
+            codes = self.db.delete_files([t.db_name for t in tasks], batch_size=self.batch_size,
+                                         dry=self.dry, missing_ok=resumed)
+            for task, code in zip(tasks, codes):
+                if code != 0:
+                    task.fail('delete_db', f"DB entry with name: {task.db_name} could not be deleted")
+                else:
+                    task.state = 'delete_db'
+                self.__log(task)
+
+    def summary(self, elapsed=None):
+        """
+        Function to summarize the last run
+
+        Parameters
+        ----------
+        elapsed : float, optional
+                  Seconds taken by the run.
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'files' : number of files,
+             'dearchived' : number of files dearchived,
+             'failed' : { 'path' : (stage, error) },
+             'bytes' : number of bytes downloaded,
+             'seconds' : elapsed time,
+             'files_per_s' : dearchived files per second,
+             'mb_per_s' : MB downloaded per second}
+        """
+        dearchived = [t for t in self.tasks if t.state == 'delete_db']
+        nbytes = sum(t.download['size'] for t in self.tasks if t.download is not None)
+        summary = {
+            'files': len(self.tasks),
+            'dearchived': len(dearchived),
+            'failed': {t.path: (t.failed_stage, t.error) for t in self.tasks if t.state == 'failed'},
+            'bytes': nbytes,
+            'seconds': elapsed,
+        }
+        if elapsed:
+            summary['files_per_s'] = len(dearchived) / elapsed
+            summary['mb_per_s'] = nbytes / 2**20 / elapsed
+
+        dp_logger.info(f"Files: {summary['files']}, dearchived: {summary['dearchived']}, "
+                       f"failed: {len(summary['failed'])}")
+        if elapsed:
+            dp_logger.info(f"{nbytes} bytes downloaded in {elapsed:.2f}s ({summary['mb_per_s']:.1f} MB/s, "
+                           f"{summary['files_per_s']:.2f} files/s)")
+        for path, (stage, error) in summary['failed'].items():
+            dp_logger.error(f"{path} failed in stage '{stage}': {error}")
+
+        return summary
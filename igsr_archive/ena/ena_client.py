@@ -0,0 +1,260 @@
+import logging
+import threading
+import time
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from igsr_archive.config import CONFIG
+from igsr_archive.utils import parse_retry_after, RETRY_STATUS
+
+# create logger
+ec_logger = logging.getLogger(__name__)
+
+class TokenBucket(object):
+    """
+    Class implementing a thread-safe token bucket, used to
+    limit the number of requests per second sent to the ENA
+
+    Attributes
+    ----------
+    rate : float
+           Number of tokens added per second.
+    capacity : float
+               Max number of tokens in the bucket, i.e. the max
+               number of requests sent in a burst.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        rate : float
+               Number of tokens added per second.
+        capacity : float, optional
+                   Max number of tokens in the bucket. Default: max(1, rate).
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __refill(self):
+        """
+        Private function to add the tokens generated since the
+        last call. It must be called with the lock acquired
+        """
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self):
+        """
+        Function to take a token from the bucket, waiting
+        until one is available
+        """
+        while True:
+            with self._lock:
+                self.__refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Function to stop handing out tokens during 'seconds',
+        i.e. after receiving a 429 response
+
+        Parameters
+        ----------
+        seconds : float
+        """
+        with self._lock:
+            self.__refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+class ENAclient(object):
+    """
+    Class to send many requests to the ENA APIs concurrently, using
+    a pool of threads that share a requests.Session and a limit of
+    requests per second.
+
+    An ENAclient can be passed as the 'session' of the ENA, ENAbrowser
+    and ENAportal objects, so their requests are rate limited and
+    retried on 429 and 5xx responses.
+
+    Attributes
+    ----------
+    workers : int
+              Number of threads.
+    rps : float
+          Max number of requests per second. 0 means no limit.
+    retries : int
+              Number of times a request is retried after a connection
+              error, a 429 or a 5xx response.
+    backoff : float
+              Seconds to wait before the first retry of a request when the
+              response has no 'Retry-After' header. The wait is doubled
+              after each retry.
+    timeout : float
+              Timeout in seconds of each request.
+    session : requests.Session
+    cache : ResponseCache
+            If defined, the responses are read from and
+            stored in this cache.
+    stats : dict
+            Number of 'requests' done, of 'retries' and of
+            'throttled' (429) responses received.
+    """
+    def __init__(self, workers=None, rps=None, cache=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        workers : int, optional
+                  Number of threads. If not defined, the 'workers' option
+                  in the 'ena' section of CONFIG is used.
+        rps : float, optional
+              Max number of requests per second. If not defined, the
+              'requests_per_second' option in the 'ena' section of CONFIG is used.
+        cache : ResponseCache, optional
+                Cache of the responses. The responses found in the cache
+                do not count for the rate limit.
+        """
+        ec_logger.debug('Creating an ENAclient object')
+
+        self.workers = workers or CONFIG.getint('ena', 'workers', fallback=8)
+        self.rps = rps if rps is not None else CONFIG.getfloat('ena', 'requests_per_second', fallback=10)
+        self.retries = CONFIG.getint('ena', 'retries', fallback=5)
+        self.backoff = CONFIG.getfloat('ena', 'backoff', fallback=1)
+        self.timeout = CONFIG.getfloat('ena', 'timeout', fallback=300)
+        self.cache = cache
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0}
+        self._bucket = TokenBucket(self.rps) if self.rps > 0 else None
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def __count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, url, **kwargs):
+        """
+        Function to send a GET request, with the same signature
+        as requests.get. The request waits for the rate limit and
+        it is retried on connection errors and on 429/5xx responses.
+        If there is a cache, the request is only sent if the response
+        is not in the cache or needs to be revalidated
+
+        Parameters
+        ----------
+        url : str
+        **kwargs
+            Arguments passed to requests.Session.get.
+
+        Returns
+        -------
+        res : requests.models.Response
+              Last response received. It can be an error response
+              if all the retries have failed.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+            If the last try failed with a connection error.
+        """
+        if self.cache is not None:
+            return self.cache.get(url, fetch=self.__send, **kwargs)
+
+        return self.__send(url, **kwargs)
+
+    def __send(self, url, **kwargs):
+        """
+        Private function to send a GET request with the
+        rate limit and the retries. See 'get'
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if self._bucket is not None:
+                self._bucket.acquire()
+            self.__count('requests')
+            try:
+                res = self.session.get(url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                if attempt == self.retries:
+                    raise
+                ec_logger.debug(f"Error in the request to {url}: {err}. Retrying in {delay}s")
+                wait = delay
+            else:
+                if res.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return res
+                wait = parse_retry_after(res.headers.get('Retry-After'))
+                if wait is None:
+                    wait = delay
+                if res.status_code == 429:
+                    self.__count('throttled')
+                    if self._bucket is not None:
+                        # slow down all the threads, not only this one
+                        self._bucket.pause(wait)
+                ec_logger.debug(f"Got a {res.status_code} response from {url}. Retrying in {wait}s")
+                res.close()
+            self.__count('retries')
+            time.sleep(wait)
+            delay *= 2
+
+    def map(self, func, items):
+        """
+        Function to call 'func' on each of the items using the pool
+        of threads. 'func' is expected to use this ENAclient as the
+        session of its requests
+
+        Parameters
+        ----------
+        func : function
+               Function taking a single item.
+        items : iterable
+
+        Returns
+        -------
+        list
+            Results of 'func', in the same order as 'items'.
+
+        Raises
+        ------
+        Exception
+            The first exception raised by 'func'.
+        """
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items))) as executor:
+            return list(executor.map(func, items))
+
+    def close(self):
+        """
+        Function to close the connections of the session
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # object introspection
+    def __str__(self):
+        return f"ENAclient(workers={self.workers}, rps={self.rps}, stats={self.stats})"
+
+    def __repr__(self):
+        return self.__str__()
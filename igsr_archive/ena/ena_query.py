@@ -1,3 +1,4 @@
+import csv
 import logging
 import requests
 import pdb
@@ -5,6 +6,7 @@ import xmltodict
 
 from igsr_archive.config import CONFIG
 from igsr_archive.ena.ena_record import ENArecord
+from igsr_archive.ena.xml_extractor import iter_entries
 from requests.exceptions import HTTPError
 
 # create logger
@@ -17,20 +19,33 @@ class ENA(object):
     ---------------
     url : string 
           URL used for the query
+    session : requests.Session or ENAclient
+              Object used to send the requests. If None,
+              requests.get is used
     """
-    def __init__(self, url):
+    def __init__(self, url, session=None):
         """
         Constructor
         -----------
         url : string 
               URL used in the query function
+        session : requests.Session or ENAclient, optional
+                  Object used to send the requests. Pass an ENAclient
+                  to share its connections, rate limit and retries
         """
         ena_logger.debug('Creating an ENAquery object')
         self.url = url
+        self.session = session
 
-    def query(self):
+    def query(self, stream=False):
         """
         Function to query the ENA api
+
+        Parameters
+        ----------
+        stream : bool, default=False
+                 If True, the body of the response is not downloaded
+                 until it is read (i.e. with res.iter_lines())
         
         Returns
         -------
@@ -38,7 +53,11 @@ class ENA(object):
         """
         res=None
         try:
-            res = requests.get(self.url)
+            session = self.session if self.session is not None else requests
+            if stream:
+                res = session.get(self.url, stream=True)
+            else:
+                res = session.get(self.url)
         except HTTPError as http_err:
             print(f'HTTP error occurred: {http_err}')
             print(f'Error message: {res.text}')
@@ -48,6 +67,8 @@ class ENA(object):
         else:
             if res.status_code == 404:
                 ena_logger.info('No ENA record found')
+                # release the connection of a streamed response
+                res.close()
             elif res.status_code != 200:
                 ena_logger.info('There was an issue in the ENA API request')
                 raise Exception(f"Error: {res.text}")
@@ -61,18 +82,20 @@ class ENAbrowser(ENA):
     the European Nucleotide Archive (https://www.ebi.ac.uk/ena/browser/home)
     using its REST API
     """
-    def __init__(self, acc):
+    def __init__(self, acc, session=None):
         """
         Constructor
         -----------
         acc: string
               accession to query the API
+        session : requests.Session or ENAclient, optional
+                  Object used to send the requests
         """
         ena_logger.debug('Creating an ENAbrowser object')
         
         url = f"{CONFIG.get('ena', 'endpoint_browser')}/{acc}"
 
-        ENA.__init__(self, url)
+        ENA.__init__(self, url, session=session)
     
     def query(self):
         """
@@ -81,10 +104,39 @@ class ENAbrowser(ENA):
         Returns
         ------
         dict : containing the result of converting the XML response
-               to dict
+               to dict. None if no ENA record was found
         """
         res = ENA.query(self)
+        if res is None:
+            return None
         return xmltodict.parse(res.content)
+
+    def iter_entries(self, alist=None):
+        """
+        Generator parsing the XML response while it is downloaded. It is
+        faster and uses less memory than 'query', as only the identifiers,
+        attributes, xrefs, PROGRAM/PLATFORM and files of each record are
+        extracted (see igsr_archive.ena.xml_extractor.iter_entries)
+
+        Parameters
+        ----------
+        alist : list, optional
+                Extract only the attributes with these tags.
+                Default: all the attributes.
+
+        Yields
+        ------
+        dict : one for each record in the response. Nothing is
+               yielded if no ENA record was found
+        """
+        res = ENA.query(self, stream=True)
+        if res is None:
+            return
+
+        try:
+            yield from iter_entries(res.iter_content(chunk_size=65536), alist=alist)
+        finally:
+            res.close()
     
     def get_record(self, xmld):
         """
@@ -246,18 +298,21 @@ class ENAportal(ENA):
           the url used to connect the ENA:
           {CONFIG.get('ena', 'endpoint_portal')}
     """
-    def __init__(self, acc):
+    def __init__(self, acc, session=None):
         """
         Constructor
         -----------
         acc: string
              accession to query the API
+        session : requests.Session or ENAclient, optional
+                  Object used to send the requests
         """
 
         ena_logger.debug('Creating an ENAportal object')
         url = f"{CONFIG.get('ena', 'endpoint_portal')}{acc}"
 
-        ENA.__init__(self, url)
+        ENA.__init__(self, url, session=session)
+        self.base_url = url
 
     def query(self, q_type='read_run', fields=None):
         """
@@ -276,36 +331,61 @@ class ENAportal(ENA):
         -------
         list : List with ENArecord objects
         """
+        return list(self.iter_records(q_type=q_type, fields=fields))
+
+    def iter_records(self, q_type='read_run', fields=None):
+        """
+        Generator parsing the filereport while it is downloaded,
+        so the records are available before the download finishes
+        and the whole report is never kept in memory
+
+        Parameters
+        ----------
+        q_type : str
+               Report type: 'read_run', 'analysis'
+               Default: 'read_run'
+        fields : str
+                 comma-sep string with fields to fetch
+                 in this filereport. Default : none
+
+        Yields
+        ------
+        ENArecord object
+        """
         if q_type != 'read_run' and q_type != 'analysis':
             raise TypeError(f"Non valid 'q_type' parameter:{q_type}")
 
         if fields is None:
-            self.url = f"{self.url}&result={q_type}"
+            self.url = f"{self.base_url}&result={q_type}"
         else :
-            self.url = f"{self.url}&result={q_type}&fields={fields}"
-        res = ENA.query(self)
+            self.url = f"{self.base_url}&result={q_type}&fields={fields}"
+        res = ENA.query(self, stream=True)
+        if res is None:
+            return
 
-        text_res = res.content.decode("utf-8")
-        data = [x.split('\t') for x in text_res.split('\n') if len(x.split('\t'))>1]
-        fields = data[0]
-        # getting the 'type' of this file record
-        type = None
-        if q_type == 'read_run':
-            type = fields[0].replace('_accession','').upper()
-        else:
-            type = 'ANALYSIS'
-        
-        data = data[1::]
-
-        records = []
-        for rec in data:
-            record = {}
-            if len(rec) != len(fields):
-                raise Exception("Different number of data columns and fields")
-            record = dict(zip(fields, rec))
-            if q_type == 'read_run':
-                records.append(ENArecord(type, record['run_accession'], **record))
-            elif q_type == "analysis":
-                records.append(ENArecord(type, record['analysis_accession'], **record))
-
-        return records
\ No newline at end of file
+        try:
+            lines = (line.decode("utf-8") for line in res.iter_lines())
+            # the values are not quoted in the filereports
+            reader = csv.reader(lines, delimiter='\t', quoting=csv.QUOTE_NONE)
+            fields = None
+            type = None
+            for rec in reader:
+                if len(rec) <= 1:
+                    continue
+                if fields is None:
+                    fields = rec
+                    # getting the 'type' of this file record
+                    if q_type == 'read_run':
+                        type = fields[0].replace('_accession','').upper()
+                    else:
+                        type = 'ANALYSIS'
+                    continue
+                if len(rec) != len(fields):
+                    raise Exception("Different number of data columns and fields")
+                record = dict(zip(fields, rec))
+                if q_type == 'read_run':
+                    yield ENArecord(type, record['run_accession'], **record)
+                elif q_type == "analysis":
+                    yield ENArecord(type, record['analysis_accession'], **record)
+        finally:
+            res.close()
@@ -0,0 +1,314 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import requests
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from requests.structures import CaseInsensitiveDict
+from igsr_archive.config import CONFIG
+
+# create logger
+rc_logger = logging.getLogger(__name__)
+
+# status codes of the responses that are stored. A 404 is
+# a valid answer from the ENA APIs (the record does not exist)
+CACHED_STATUS = (200, 404)
+
+# headers that are not stored, as the cached body is already decoded
+SKIP_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection')
+
+def cache_key(url):
+    """
+    Function to get the key used for a URL in the cache. The query
+    parameters are sorted, so the same query (i.e. 'accession', 'result'
+    and 'fields' of a filereport) always gets the same key
+
+    Parameters
+    ----------
+    url : str
+
+    Returns
+    -------
+    str
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)), safe=',/')
+
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, query, ''))
+
+class ResponseCache(object):
+    """
+    Class representing a persistent cache of the responses
+    of the ENA APIs, stored in a SQLite database
+
+    A cached response is used without any request while it is younger
+    than 'ttl'. After that, it is revalidated with a conditional request
+    if the ENA sent an ETag or Last-Modified header, and fetched again
+    otherwise. When the size of the stored bodies exceeds 'max_size', the
+    least recently used responses are evicted.
+
+    In offline mode no request is sent: all the stored responses are
+    used regardless of their age and the missing ones get a 504
+    response (as HTTP caches do for 'only-if-cached' requests).
+
+    Attributes
+    ----------
+    path : str
+           Path to the SQLite database.
+    ttl : float
+          Seconds during which a response is used without revalidation.
+    max_size : int
+               Max size in bytes of the stored bodies. 0 means no limit.
+    offline : bool
+              If True, no requests are sent.
+    stats : dict
+            Number of 'hits', 'misses', 'revalidated' (304) responses,
+            'stored' responses and 'evicted' responses.
+    """
+    def __init__(self, path, ttl=None, max_size=None, offline=False):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : str
+               Path to the SQLite database. It is created if it does not exist.
+        ttl : float, optional
+              Seconds during which a response is used without revalidation.
+              Default: 'cache_ttl' in the 'ena' section of CONFIG or 7 days.
+        max_size : int, optional
+                   Max size in bytes of the stored bodies.
+                   Default: 'cache_max_size' in the 'ena' section of CONFIG or 1GB.
+        offline : bool, default=False
+                  If True, no requests are sent.
+        """
+        rc_logger.debug('Creating a ResponseCache object')
+
+        self.path = path
+        self.ttl = ttl if ttl is not None else CONFIG.getfloat('ena', 'cache_ttl', fallback=604800)
+        self.max_size = max_size if max_size is not None else \
+            CONFIG.getint('ena', 'cache_max_size', fallback=1073741824)
+        self.offline = offline
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stored': 0, 'evicted': 0}
+
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS response ("
+                          "key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, "
+                          "etag TEXT, last_modified TEXT, fetched REAL, accessed REAL, size INTEGER)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS response_accessed ON response (accessed)")
+        self._size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM response").fetchone()[0]
+
+    def get(self, url, fetch=None, **kwargs):
+        """
+        Function to get the response for a URL, from the cache if possible.
+        It has the same signature as requests.get, so a ResponseCache can be
+        used as the 'session' of the ENA objects
+
+        Parameters
+        ----------
+        url : str
+        fetch : function, optional
+                Function used to send the request, with the signature of
+                requests.get. Default: requests.get.
+        **kwargs
+            Arguments passed to 'fetch'.
+
+        Returns
+        -------
+        res : requests.models.Response
+              The responses from the cache have the 'from_cache' attribute
+              set to True.
+        """
+        key = cache_key(url)
+        entry = self.__lookup(key)
+        now = time.time()
+
+        if entry is not None and (self.offline or now - entry['fetched'] < self.ttl):
+            self.__count('hits')
+            self.__touch(key, now)
+            return self.__to_response(url, entry)
+
+        if self.offline:
+            self.__count('misses')
+            rc_logger.info(f"{url} is not in the ENA cache and offline mode is on")
+            return self.__to_response(url, {'status': 504, 'headers': {}, 'body':
+                                            f"{url} is not in the ENA cache (offline mode)".encode()},
+                                      from_cache=False)
+
+        fetch = fetch if fetch is not None else requests.get
+        if entry is not None:
+            # conditional request to revalidate the stored response
+            headers = dict(kwargs.pop('headers', None) or {})
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+            kwargs['headers'] = headers
+        else:
+            self.__count('misses')
+
+        res = fetch(url, **kwargs)
+        if res.status_code == 304 and entry is not None:
+            self.__count('revalidated')
+            with self._lock:
+                self.conn.execute("UPDATE response SET fetched=?, accessed=? WHERE key=?", (now, now, key))
+            return self.__to_response(url, entry)
+        if res.status_code in CACHED_STATUS:
+            if kwargs.get('stream') and res.status_code == 200:
+                self.__tee(url, res)
+            else:
+                self.store(url, res)
+
+        return res
+
+    def store(self, url, res):
+        """
+        Function to store a response in the cache, evicting the least
+        recently used responses if 'max_size' is exceeded
+
+        Parameters
+        ----------
+        url : str
+        res : requests.models.Response
+        """
+        key = cache_key(url)
+        body = res.content
+        headers = {k: v for k, v in res.headers.items() if k.lower() not in SKIP_HEADERS}
+        now = time.time()
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM response WHERE key=?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                              (key, res.status_code, json.dumps(headers), body, res.headers.get('ETag'),
+                               res.headers.get('Last-Modified'), now, now, len(body)))
+            self._size += len(body) - (old[0] if old else 0)
+            self.stats['stored'] += 1
+            if self.max_size and self._size > self.max_size:
+                self.__evict()
+
+    def __tee(self, url, res):
+        """
+        Private function to store a streamed response once its body
+        has been completely read. The caller still gets the body in
+        chunks as it is downloaded, but the chunks are also kept in
+        memory until the response is stored, so a cached response uses
+        as much memory as its body. A body bigger than 'max_size' would be
+        evicted right away, so it is neither kept nor stored. The response
+        is not stored if the body is not read until the end
+
+        Parameters
+        ----------
+        url : str
+        res : requests.models.Response
+              Response of a request sent with stream=True.
+        """
+        iter_content = res.iter_content
+
+        def tee(chunk_size=1, decode_unicode=False):
+            chunks = []
+            size = 0
+            for chunk in iter_content(chunk_size=chunk_size):
+                if chunks is not None:
+                    size += len(chunk)
+                    if self.max_size and size > self.max_size:
+                        rc_logger.debug(f"{url} is bigger than the ENA cache, it will not be stored")
+                        chunks = None
+                    else:
+                        chunks.append(chunk)
+                yield chunk
+            if chunks is not None:
+                res._content = b''.join(chunks)
+                self.store(url, res)
+
+        def iter_tee(chunk_size=1, decode_unicode=False):
+            if decode_unicode:
+                return requests.utils.stream_decode_response_unicode(tee(chunk_size), res)
+            return tee(chunk_size)
+
+        res.iter_content = iter_tee
+
+    def __evict(self):
+        """
+        Private function to delete the least recently used responses until
+        the size is below 'max_size'. It must be called with the lock acquired
+        """
+        rows = self.conn.execute("SELECT key, size FROM response ORDER BY accessed").fetchall()
+        evicted = []
+        for key, size in rows:
+            if self._size <= self.max_size:
+                break
+            evicted.append((key,))
+            self._size -= size
+        self.conn.executemany("DELETE FROM response WHERE key=?", evicted)
+        self.stats['evicted'] += len(evicted)
+        rc_logger.debug(f"Evicted {len(evicted)} responses from the ENA cache")
+
+    def __lookup(self, key):
+        """
+        Private function to get the stored response for a key
+
+        Returns
+        -------
+        dict or None if not stored
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT status, headers, body, etag, last_modified, fetched "
+                                    "FROM response WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        return {'status': row[0], 'headers': json.loads(row[1]), 'body': row[2],
+                'etag': row[3], 'last_modified': row[4], 'fetched': row[5]}
+
+    def __touch(self, key, now):
+        with self._lock:
+            self.conn.execute("UPDATE response SET accessed=? WHERE key=?", (now, key))
+
+    def __count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def __to_response(url, entry, from_cache=True):
+        """
+        Private function to build a requests.models.Response
+        from a stored response
+        """
+        res = requests.models.Response()
+        res.url = url
+        res.status_code = entry['status']
+        res.headers = CaseInsensitiveDict(entry['headers'])
+        res._content = bytes(entry['body'])
+        res._content_consumed = True
+        res.encoding = requests.utils.get_encoding_from_headers(res.headers) or 'utf-8'
+        res.from_cache = from_cache
+
+        return res
+
+    def clear(self):
+        """
+        Function to delete all the stored responses
+        """
+        with self._lock:
+            self.conn.execute("DELETE FROM response")
+            self._size = 0
+
+    def close(self):
+        """
+        Function to close the connection to the SQLite database
+        """
+        self.conn.close()
+
+    # object introspection
+    def __str__(self):
+        return f"ResponseCache(path={self.path}, ttl={self.ttl}, max_size={self.max_size}, " \
+               f"offline={self.offline}, size={self._size}, stats={self.stats})"
+
+    def __repr__(self):
+        return self.__str__()
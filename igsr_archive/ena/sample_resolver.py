@@ -0,0 +1,141 @@
+import logging
+
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_query import ENAbrowser
+
+# create logger
+sr_logger = logging.getLogger(__name__)
+
+class SampleResolver(object):
+    """
+    Class to fetch the attributes of several ENA samples
+    using a few requests to the ENA browser API.
+
+    The accessions are deduplicated and fetched in batches of
+    'batch_size' accessions per request (the ENA browser API accepts a
+    comma-separated list of accessions). The results are memoized, so an
+    accession is fetched only once during the life of the object.
+
+    Attributes
+    ----------
+    batch_size : int
+                 Max number of accessions fetched in each request.
+    alist : list of str
+            Sample attributes fetched (i.e. ['population']).
+    client : ENAclient
+             If defined, the batches are fetched concurrently
+             using this client.
+    nrequests : int
+                Number of requests done to the ENA browser API.
+    """
+    def __init__(self, batch_size=None, alist=None, client=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        batch_size : int, optional
+                     Max number of accessions fetched in each request.
+                     Default: 'sample_batch_size' in the [ena] section of the
+                     settings or 100 if not defined.
+        alist : list of str, optional
+                Sample attributes fetched. Default: ['population'].
+        client : ENAclient, optional
+                 Client used to fetch the batches concurrently.
+        """
+        sr_logger.debug('Creating a SampleResolver object')
+
+        if batch_size is None:
+            batch_size = CONFIG.getint('ena', 'sample_batch_size', fallback=100)
+        self.batch_size = batch_size
+        self.alist = alist if alist is not None else ['population']
+        self.client = client
+        self.nrequests = 0
+        self._memo = {}
+
+    def resolve(self, accessions):
+        """
+        Function to fetch the attributes of several samples
+
+        Parameters
+        ----------
+        accessions : list of str
+                     Sample accessions. They can be BioSample (SAMEA*, SAMN*, ...)
+                     or ENA (ERS*, SRS*, ...) accessions.
+
+        Returns
+        -------
+        dict
+            Dict in the format { accession : {'TAG' : 'VALUE'} } with
+            the attributes in self.alist that are defined for each sample.
+            The dict is empty if the sample was not found.
+        """
+        missing = [acc for acc in dict.fromkeys(accessions) if acc not in self._memo]
+        if missing:
+            sr_logger.info(f"Fetching {len(missing)} samples from the ENA browser API")
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        if self.client is not None:
+            results = self.client.map(self.fetch_batch, batches)
+        else:
+            results = [self.fetch_batch(batch) for batch in batches]
+        self.nrequests += len(batches)
+
+        for batch, found in zip(batches, results):
+            for acc in batch:
+                if acc not in found:
+                    sr_logger.debug(f"No ENA record found for sample {acc}")
+                self._memo[acc] = found.get(acc, {})
+
+        return {acc: self._memo[acc] for acc in accessions}
+
+    def fetch_batch(self, accessions):
+        """
+        Function to fetch a batch of samples with a single request
+
+        Parameters
+        ----------
+        accessions : list of str
+                     Sample accessions.
+
+        Returns
+        -------
+        dict
+            Dict in the format { accession : {'TAG' : 'VALUE'} } with the
+            samples that were found.
+        """
+        ebrowser = ENAbrowser(acc=",".join(accessions), session=self.client)
+
+        wanted = set(accessions)
+        found = {}
+        for entry in ebrowser.iter_entries(alist=self.alist):
+            if entry['type'] != 'SAMPLE':
+                continue
+            # a sample can be requested by any of its accessions
+            ids = entry['ids'] | {entry['accession']}
+            for acc in ids & wanted:
+                found[acc] = entry['attrbs']
+
+        return found
+
+    def get_population(self, accession):
+        """
+        Function to get the population of a sample
+
+        Parameters
+        ----------
+        accession : str
+                    Sample accession.
+
+        Returns
+        -------
+        str : population or None if not defined
+        """
+        return self.resolve([accession])[accession].get('population')
+
+    # object introspection
+    def __str__(self):
+        return f"SampleResolver(batch_size={self.batch_size}, resolved={len(self._memo)}, " \
+               f"requests={self.nrequests})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,108 @@
+import logging
+
+from xml.etree.ElementTree import XMLPullParser
+
+# create logger
+xe_logger = logging.getLogger(__name__)
+
+# tags of the identifiers of a record
+ID_TAGS = ('PRIMARY_ID', 'SECONDARY_ID', 'EXTERNAL_ID', 'SUBMITTER_ID')
+
+def new_entry(type, accession):
+    """
+    Function to create the dict with the information
+    extracted from a record
+
+    Parameters
+    ----------
+    type : str
+           Record type: i.e. RUN, SAMPLE, ANALYSIS, ...
+    accession : str
+                Value of the 'accession' attribute of the record.
+
+    Returns
+    -------
+    dict
+    """
+    return {'type': type, 'accession': accession, 'primary_id': None, 'ids': set(),
+            'attrbs': {}, 'xrefs': {}, 'program': None, 'platform': None, 'files': []}
+
+def iter_entries(chunks, alist=None):
+    """
+    Generator parsing an XML document from the ENA browser API while it is
+    read, without building the whole document in memory. For each record
+    (each child of the <{type}_SET> element) only the identifiers, the
+    attributes, the xrefs, the PROGRAM/PLATFORM of an analysis and the
+    <FILE> elements are extracted, and the elements are discarded once
+    they have been handled
+
+    Parameters
+    ----------
+    chunks : iterable of bytes
+             The XML document, i.e. res.iter_content(65536).
+    alist : list, optional
+            Extract only the attributes with these tags.
+            Default: all the attributes.
+
+    Yields
+    ------
+    dict
+        Dict with the keys:
+            'type' : record type, i.e. RUN, SAMPLE, ANALYSIS
+            'accession' : value of the 'accession' attribute
+            'primary_id' : <PRIMARY_ID>
+            'ids' : set with all the identifiers of the record
+            'attrbs' : {'TAG' : 'VALUE'} with the <{type}_ATTRIBUTE> elements
+            'xrefs' : {'DB' : 'ID'} with the <XREF_LINK> elements
+            'program' : <PROGRAM> of an analysis
+            'platform' : <PLATFORM> of an analysis
+            'files' : list of dicts with the attributes of the <FILE> elements
+                      (i.e. filename, filetype, checksum)
+    """
+    wanted = set(alist) if alist is not None else None
+    parser = XMLPullParser(events=('start', 'end'))
+    # tags of the open elements
+    stack = []
+    root = None
+    entry = None
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem.tag)
+                if root is None:
+                    root = elem
+                elif len(stack) == 2:
+                    entry = new_entry(elem.tag, elem.get('accession'))
+                continue
+
+            stack.pop()
+            if entry is None:
+                continue
+            tag = elem.tag
+            if len(stack) == 1:
+                # end of the record
+                yield entry
+                entry = None
+                root.clear()
+            elif tag in ID_TAGS and len(stack) > 1 and stack[-1] == 'IDENTIFIERS':
+                if elem.text:
+                    entry['ids'].add(elem.text.strip())
+                    if tag == 'PRIMARY_ID':
+                        entry['primary_id'] = elem.text.strip()
+            elif tag == f"{entry['type']}_ATTRIBUTE":
+                name = elem.findtext('TAG')
+                if wanted is None or name in wanted:
+                    entry['attrbs'][name] = elem.findtext('VALUE')
+                elem.clear()
+            elif tag == 'XREF_LINK':
+                entry['xrefs'][elem.findtext('DB')] = elem.findtext('ID')
+                elem.clear()
+            elif tag in ('PROGRAM', 'PLATFORM') and 'ANALYSIS_TYPE' in stack:
+                entry[tag.lower()] = elem.text
+            elif tag == 'FILE':
+                entry['files'].append(dict(elem.attrib))
+                elem.clear()
+
+    parser.close()
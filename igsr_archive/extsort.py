@@ -0,0 +1,129 @@
+import heapq
+import logging
+import os
+import sys
+import tempfile
+
+# create logger
+es_logger = logging.getLogger(__name__)
+
+# default memory budget (in bytes) for sorting in memory
+DEFAULT_MEM_BUDGET = 256 * 2**20
+# max number of sorted runs merged at once
+MAX_FANIN = 64
+
+def is_sorted(infile, key=None):
+    """
+    Function to check if the lines of a file are sorted
+
+    Parameters
+    ----------
+    infile : str
+             Path to file.
+    key : function, optional
+          Function used to extract a comparison key from each line.
+
+    Returns
+    -------
+    bool : True if the lines are sorted
+    """
+    prev = None
+    with open(infile) as f:
+        for line in f:
+            k = key(line) if key is not None else line
+            if prev is not None and k < prev:
+                return False
+            prev = k
+
+    return True
+
+def _write_run(lines, tmpdir):
+    fd, path = tempfile.mkstemp(prefix='extsort_', suffix='.run', dir=tmpdir)
+    with os.fdopen(fd, 'w') as f:
+        f.writelines(lines)
+    return path
+
+def _merge_runs(runs, outfile, key):
+    files = [open(r) for r in runs]
+    try:
+        with open(outfile, 'w') as out:
+            out.writelines(heapq.merge(*files, key=key))
+    finally:
+        for f in files:
+            f.close()
+
+def external_sort(infile, outfile, key=None, mem_budget=DEFAULT_MEM_BUDGET, tmpdir=None):
+    """
+    Function to sort the lines of a file using a bounded amount
+    of memory. Chunks of lines that fit in 'mem_budget' are sorted
+    in memory and written to temporary files (runs) that are then
+    merged. The sort is stable. Each line in 'infile' must end with a newline.
+
+    Parameters
+    ----------
+    infile : str
+             Path to file to be sorted.
+    outfile : str
+              Path to sorted file. It can be the same as 'infile'.
+    key : function, optional
+          Function used to extract a comparison key from each line.
+    mem_budget : int, default=DEFAULT_MEM_BUDGET
+                 Approximate number of bytes used for the lines sorted in memory.
+    tmpdir : str, optional
+             Directory for the temporary files. If None, then
+             the default temporary directory will be used.
+
+    Returns
+    -------
+    outfile : str
+              Path to sorted file.
+    """
+    es_logger.debug(f"Sorting {infile} with a memory budget of {mem_budget} bytes")
+
+    runs = []
+    chunk = []
+    size = 0
+    with open(infile) as f:
+        for line in f:
+            chunk.append(line)
+            size += sys.getsizeof(line)
+            if size >= mem_budget:
+                chunk.sort(key=key)
+                runs.append(_write_run(chunk, tmpdir))
+                chunk = []
+                size = 0
+
+    if not runs:
+        # everything fits in memory
+        chunk.sort(key=key)
+        with open(outfile, 'w') as out:
+            out.writelines(chunk)
+        return outfile
+
+    if chunk:
+        chunk.sort(key=key)
+        runs.append(_write_run(chunk, tmpdir))
+    del chunk
+
+    es_logger.debug(f"Merging {len(runs)} sorted runs")
+    try:
+        # merge in several passes if there are too many runs to be opened at once.
+        # Consecutive runs are merged so the sort is stable
+        while len(runs) > MAX_FANIN:
+            merged = []
+            for i in range(0, len(runs), MAX_FANIN):
+                group = runs[i:i + MAX_FANIN]
+                fd, path = tempfile.mkstemp(prefix='extsort_', suffix='.run', dir=tmpdir)
+                os.close(fd)
+                _merge_runs(group, path, key)
+                for r in group:
+                    os.remove(r)
+                merged.append(path)
+            runs = merged
+        _merge_runs(runs, outfile, key)
+    finally:
+        for r in runs:
+            if os.path.exists(r):
+                os.remove(r)
+
+    return outfile
@@ -1,14 +1,142 @@
-import subprocess
 import os
 import pdb
 import datetime
+import hashlib
 import logging
-from igsr_archive.utils import is_tool
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from igsr_archive.config import CONFIG
 
 # create logger
 file_logger = logging.getLogger(__name__)
 
+# size in bytes of the blocks read when calculating the md5sum.
+# It is a multiple of the page size
+DEFAULT_BLOCK_SIZE = 8 * 2**20
+
+# MD5Cache object consulted before calculating a md5sum.
+# None if no cache is used
+md5_cache = None
+
+def set_md5_cache(cache):
+    """
+    Function to set the MD5Cache object used by `File.calc_md5`
+    and `hash_files`
+
+    Parameters
+    ----------
+    cache : MD5Cache object
+            None to stop using a cache.
+    """
+    global md5_cache
+    md5_cache = cache
+
+def md5sum(path, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Function to calculate the md5sum and the size of a file.
+    The file is read in blocks of 'block_size' bytes that are
+    passed to hashlib, which releases the GIL while hashing
+    them, so several files can be hashed at once using threads.
+
+    Parameters
+    ----------
+    path : str
+           File path.
+    block_size : int, default=DEFAULT_BLOCK_SIZE
+                 Size in bytes of the blocks read from the file.
+
+    Returns
+    -------
+    tuple (md5sum, size)
+    """
+    md5 = hashlib.md5()
+    size = 0
+    buf = bytearray(block_size)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            md5.update(view[:n])
+            size += n
+
+    return md5.hexdigest(), size
+
+def hash_files(files, workers=4, processes=False, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Function to calculate the md5sum and the size of several File
+    objects at once. The 'md5' and 'size' attributes of each
+    File object are set with the calculated values. Files
+    found in the md5 cache (if any) are not hashed again
+
+    Parameters
+    ----------
+    files : list of File objects
+            Files to be hashed.
+    workers : int, default=4
+              Number of files hashed at once.
+    processes : bool, default=False
+                If True, then a pool of processes will be used
+                instead of a pool of threads.
+    block_size : int, default=DEFAULT_BLOCK_SIZE
+                 Size in bytes of the blocks read from each file.
+
+    Returns
+    -------
+    dict
+        Dict with the following format:
+        {'files' : number of files hashed,
+         'cached' : number of md5sums taken from the md5 cache,
+         'bytes' : number of bytes hashed,
+         'seconds' : elapsed time,
+         'mb_per_s' : throughput in MB/s}
+    """
+    cache = md5_cache
+    to_hash = []
+    stat_results = []
+    cached = 0
+    for f in files:
+        st = os.stat(f.name)
+        md5 = cache.get(f.name, st=st) if cache is not None else None
+        if md5 is not None:
+            f.md5 = md5
+            f.size = st.st_size
+            cached += 1
+        else:
+            to_hash.append(f)
+            stat_results.append(st)
+
+    file_logger.info(f"Calculating md5 checksum for {len(to_hash)} files using {workers} workers")
+
+    Executor = ProcessPoolExecutor if processes is True else ThreadPoolExecutor
+    start = time.perf_counter()
+    total = 0
+    with Executor(max_workers=workers) as executor:
+        names = [f.name for f in to_hash]
+        for f, st, (md5, size) in zip(to_hash, stat_results,
+                                      executor.map(md5sum, names, [block_size] * len(names))):
+            f.md5 = md5
+            f.size = size
+            total += size
+            if cache is not None:
+                cache.put(f.name, md5, st=st)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        'files': len(to_hash),
+        'cached': cached,
+        'bytes': total,
+        'seconds': elapsed,
+        'mb_per_s': total / 2**20 / elapsed if elapsed > 0 else 0.0
+    }
+    file_logger.info(f"Done. {stats['files']} files ({stats['bytes']} bytes) hashed in "
+                     f"{stats['seconds']:.2f}s ({stats['mb_per_s']:.1f} MB/s)")
+
+    return stats
+
 class File(object):
     """
     Class to represent a File
@@ -41,7 +169,7 @@ class File(object):
     """
 
     def __init__(self, name, host_id=1, type=None,
-                 withdrawn=0, **kwargs):
+                 withdrawn=0, checksum=True, **kwargs):
         """
         Constructor
 
@@ -57,6 +185,10 @@ class File(object):
         withdrawn : int, default=0
                     1 if self is withdrawn.
                     0 otherwise.
+        checksum : bool, default=True
+                   If False, then the md5sum will not be calculated
+                   when it is not defined. Used when several
+                   files are hashed at once with `hash_files`.
         **kwargs : dict, optional
                    Extra arguments to `File`: refer to each File documentation for a
                    list of all possible arguments.
@@ -82,7 +214,7 @@ class File(object):
             self.name =os.path.abspath(name)
             # path exists, so check if md5sum, size, and created
             # are defined.
-            if not hasattr(self, 'md5'):
+            if not hasattr(self, 'md5') and checksum is True:
                 self.md5 = self.calc_md5()
 
             if not hasattr(self, 'size'):
@@ -91,9 +223,15 @@ class File(object):
             if not hasattr(self, 'created'):
                 self.created = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    def calc_md5(self):
+    def calc_md5(self, block_size=DEFAULT_BLOCK_SIZE):
         """
-        Calculate the md5sum of a file
+        Calculate the md5sum of a file. The md5 cache (if any)
+        is consulted first and updated with the calculated md5sum
+
+        Parameters
+        ----------
+        block_size : int, default=DEFAULT_BLOCK_SIZE
+                     Size in bytes of the blocks read from the file.
 
         Returns
         -------
@@ -102,37 +240,29 @@ class File(object):
         
         Raises
         ------
-        Exception
+        OSError
+            If the file can not be read
         """
-        file_logger.info(f"Calculating md5 checksum with file: {self.name}")
+        st = os.stat(self.name)
+        if md5_cache is not None:
+            md5 = md5_cache.get(self.name, st=st)
+            if md5 is not None:
+                return md5
 
-        # check if either md5 or md5sum are installed
-        # and adjust md5 the command
-        command = None
-        if is_tool('md5'):
-            command = "md5 -r %s" % self.name
-        elif is_tool('md5sum'):
-            command = f"md5sum {self.name}"
-
-        if command is None:
-            raise Exception("No executable for calculating the md5 checksum was found. Do you have md5 or md5sum"
-                            "on your PATH?")
-
-        p = subprocess.Popen(command,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             shell=True)
+        file_logger.info(f"Calculating md5 checksum with file: {self.name}")
 
-        stdout, stderr = p.communicate()
-        md5sum = stdout.decode("utf-8").split(' ')[0].replace('\n', '')
-        stderr = stderr.decode("utf-8")
+        start = time.perf_counter()
+        md5, size = md5sum(self.name, block_size=block_size)
+        elapsed = time.perf_counter() - start
 
-        if stderr:
-            print(stderr)
+        if md5_cache is not None:
+            md5_cache.put(self.name, md5, st=st)
 
+        if elapsed > 0:
+            file_logger.debug(f"{size} bytes hashed in {elapsed:.2f}s ({size / 2**20 / elapsed:.1f} MB/s)")
         file_logger.info(f"Done")
 
-        return md5sum
+        return md5
 
     def guess_type(self):
         """
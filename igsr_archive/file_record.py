@@ -0,0 +1,67 @@
+import logging
+
+from typing import NamedTuple
+from igsr_archive.file import File
+
+# create logger
+fr_logger = logging.getLogger(__name__)
+
+class FileRecord(NamedTuple):
+    """
+    Read-only record with the values of an entry of the 'file' table.
+
+    Unlike File, creating a FileRecord does not touch the filesystem
+    (no stat or md5sum) and it has no per-instance __dict__, so it is
+    much cheaper to create and to keep in memory when iterating over many
+    DB entries (see DB.iter_files and benchmarks/bench_file_record.py).
+    The columns that were not fetched are None.
+
+    Attributes
+    ----------
+    file_id : int
+              Internal DB id.
+    name : str
+           File path.
+    md5 : str
+          md5sum.
+    type : str
+           Type of the file. i.e. FASTQ, BAM, CRAM.
+    size : int
+           Size in bytes.
+    host_id : int
+              Host id.
+    withdrawn : int
+                1 if the file is withdrawn. 0 otherwise.
+    created : datetime
+              Creation date.
+    updated : datetime
+              Last update date.
+    """
+    file_id: int = None
+    name: str = None
+    md5: str = None
+    type: str = None
+    size: int = None
+    host_id: int = None
+    withdrawn: int = None
+    created: object = None
+    updated: object = None
+
+    def to_file(self):
+        """
+        Function to convert this record to a File object. The File
+        constructor is not called, so the filesystem is not accessed
+        and the md5sum and size are the ones stored in the DB
+
+        Returns
+        -------
+        f : File object
+        """
+        f = File.__new__(File)
+        f.__dict__.update((k, v) for k, v in zip(self._fields, self) if v is not None)
+        # defaults of the File constructor
+        f.__dict__.setdefault('host_id', 1)
+        f.__dict__.setdefault('type', None)
+        f.__dict__.setdefault('withdrawn', 0)
+
+        return f
@@ -0,0 +1,365 @@
+import asyncio
+import collections
+import functools
+import json
+import logging
+import os
+import time
+
+from igsr_archive.config import CONFIG
+
+# create logger
+fc_logger = logging.getLogger(__name__)
+
+# types of the issues written to the report
+ISSUES = ('missing', 'size_mismatch', 'md5_mismatch')
+
+class FireChecker(object):
+    """
+    Class to check that the files in the DB are archived in FIRE
+    with the same md5 and size. The DB entries are fetched in pages
+    sorted by 'name' and 'file_id' and their FIRE objects are fetched
+    concurrently with an AsyncAPI object or, if there is no AsyncAPI
+    object (i.e. aiohttp is not installed), one by one with an API object.
+
+    Each issue found is written to 'report' as a JSON line:
+    {"name": ..., "fire_path": ..., "issue": "missing" | "size_mismatch" | "md5_mismatch",
+    "db": ..., "fire": ...}
+
+    The progress is saved to 'checkpoint' every 'checkpoint_every'
+    files, so a check that is interrupted continues from the last
+    checkpoint when run again. The checkpoint is deleted when the check finishes.
+
+    Attributes
+    ----------
+    db : DB object
+    aapi : AsyncAPI object
+    api : API object
+          Used if 'aapi' is None.
+    report : str
+             Path to the JSON lines report.
+    checkpoint : str
+                 Path to the checkpoint file.
+    concurrency : int
+                  Max number of FIRE objects fetched at the same time.
+    page_size : int
+                Number of DB entries fetched each time.
+    checkpoint_every : int
+                       Number of files checked between checkpoints.
+    counts : dict
+             Number of files 'checked', 'ok' and of each of the ISSUES.
+    """
+    def __init__(self, db, aapi, report, checkpoint=None, concurrency=None,
+                 page_size=1000, checkpoint_every=1000, api=None):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        db : DB object
+        aapi : AsyncAPI object
+               If None, the FIRE objects are fetched one by one with 'api'.
+        report : str
+                 Path to the JSON lines report.
+        checkpoint : str, optional
+                     Path to the checkpoint file. Default: 'report' + '.ckpt'.
+        concurrency : int, optional
+                      Max number of FIRE objects fetched at the same time.
+                      Default: aapi.concurrency.
+        page_size : int, default=1000
+                    Number of DB entries fetched each time.
+        checkpoint_every : int, default=1000
+                           Number of files checked between checkpoints.
+        api : API object, optional
+              Used to fetch the FIRE objects if 'aapi' is None.
+
+        Raises
+        ------
+        Exception
+            If both 'aapi' and 'api' are None.
+        """
+        fc_logger.debug('Creating a FireChecker object')
+
+        if aapi is None and api is None:
+            raise Exception("Either an AsyncAPI or an API object is needed")
+
+        self.db = db
+        self.aapi = aapi
+        self.api = api
+        self.report = report
+        self.checkpoint = checkpoint if checkpoint is not None else report + '.ckpt'
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.checkpoint_every = checkpoint_every
+        self.counts = dict.fromkeys(('checked', 'ok') + ISSUES, 0)
+
+    def __load_checkpoint(self):
+        """
+        Private function to load the checkpoint file
+
+        Returns
+        -------
+        dict
+            Checkpoint with the following format:
+            {'last': (name, file_id), 'offset': int, 'counts': dict}
+            or None if there is no checkpoint.
+        """
+        if not os.path.isfile(self.checkpoint):
+            return None
+        with open(self.checkpoint) as f:
+            ckpt = json.load(f)
+        ckpt['last'] = tuple(ckpt['last'])
+
+        return ckpt
+
+    def __save_checkpoint(self, last, report_fh):
+        """
+        Private function to write the checkpoint file. The report is
+        flushed first and its size is saved, so the lines written after
+        the checkpoint can be discarded when resuming
+
+        Parameters
+        ----------
+        last : tuple
+               (name, file_id) of the last DB entry checked.
+        report_fh : file object
+                    Report opened for writing.
+        """
+        report_fh.flush()
+        os.fsync(report_fh.fileno())
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'last': list(last),
+                       'offset': report_fh.tell(),
+                       'counts': self.counts}, f)
+        os.replace(tmp, self.checkpoint)
+
+    def iter_rows(self, prefix, after=None):
+        """
+        Generator of the DB entries whose 'name' starts with 'prefix'
+
+        Parameters
+        ----------
+        prefix : str
+                 Prefix of the 'name' of the entries.
+        after : tuple, optional
+                (name, file_id) of an entry. Only the entries
+                after it are yielded.
+
+        Yields
+        ------
+        dict
+            {'file_id': int, 'name': str, 'md5': str, 'size': int}
+        """
+        while True:
+            rows = self.db.fetch_files_page(prefix, after=after, limit=self.page_size)
+            yield from rows
+            if len(rows) < self.page_size:
+                break
+            after = (rows[-1]['name'], rows[-1]['file_id'])
+
+    async def aiter_rows(self, prefix, after=None):
+        """
+        Asynchronous generator of the DB entries whose 'name' starts
+        with 'prefix'. It is the same as 'iter_rows', but the pages are
+        fetched in a thread, so the event loop is not blocked by the
+        queries, and the next page is fetched while the current one is consumed
+
+        Parameters
+        ----------
+        prefix : str
+                 Prefix of the 'name' of the entries.
+        after : tuple, optional
+                (name, file_id) of an entry. Only the entries
+                after it are yielded.
+
+        Yields
+        ------
+        dict
+            {'file_id': int, 'name': str, 'md5': str, 'size': int}
+        """
+        loop = asyncio.get_event_loop()
+
+        def fetch_page(after):
+            return loop.run_in_executor(None, functools.partial(self.db.fetch_files_page, prefix,
+                                                                after=after, limit=self.page_size))
+
+        page = fetch_page(after)
+        try:
+            while page is not None:
+                rows = await page
+                page = None
+                if len(rows) == self.page_size:
+                    page = fetch_page((rows[-1]['name'], rows[-1]['file_id']))
+                for row in rows:
+                    yield row
+        finally:
+            if page is not None:
+                page.cancel()
+
+    def compare(self, row, fire_obj):
+        """
+        Function to compare a DB entry with its FIRE object
+
+        Parameters
+        ----------
+        row : dict
+              {'name': str, 'md5': str, 'size': int}
+        fire_obj : fObject
+                   FIRE object or None if the file is not archived.
+
+        Returns
+        -------
+        list of str
+            Issues (see ISSUES) found. Empty if the FIRE object matches the DB entry.
+        """
+        if fire_obj is None:
+            return ['missing']
+
+        issues = []
+        fire_size = getattr(fire_obj, 'objectSize', None)
+        if fire_size is None or int(fire_size) != int(row['size']):
+            issues.append('size_mismatch')
+        if getattr(fire_obj, 'objectMd5', None) != row['md5']:
+            issues.append('md5_mismatch')
+
+        return issues
+
+    def __record(self, row, fire_path, fire_obj, report_fh):
+        """
+        Private function to compare a DB entry with its FIRE object,
+        write the issues to the report and save a checkpoint every
+        'checkpoint_every' files
+
+        Returns
+        -------
+        tuple
+            (name, file_id) of the entry.
+        """
+        issues = self.compare(row, fire_obj)
+        for issue in issues:
+            self.counts[issue] += 1
+            report_fh.write(json.dumps({
+                'name': row['name'],
+                'fire_path': fire_path,
+                'issue': issue,
+                'db': {'md5': row['md5'], 'size': row['size']},
+                'fire': None if fire_obj is None else {'md5': getattr(fire_obj, 'objectMd5', None),
+                                                       'size': getattr(fire_obj, 'objectSize', None)}
+            }) + "\n")
+        if not issues:
+            self.counts['ok'] += 1
+        self.counts['checked'] += 1
+        last = (row['name'], row['file_id'])
+        if self.counts['checked'] % self.checkpoint_every == 0:
+            self.__save_checkpoint(last, report_fh)
+            fc_logger.info(f"{self.counts['checked']} files checked: {self.counts}")
+
+        return last
+
+    def __check_sync(self, prefix, after, report_fh):
+        """
+        Private function checking the DB entries after 'after',
+        fetching their FIRE objects one by one with self.api
+        """
+        ftp_mount = CONFIG.get('ftp', 'ftp_mount') + "/"
+
+        last = after
+        try:
+            for row in self.iter_rows(prefix, after=after):
+                if not row['name'].startswith(ftp_mount):
+                    continue
+                fire_path = row['name'][len(ftp_mount):]
+                fire_obj = self.api.fetch_object(firePath=fire_path)
+                last = self.__record(row, fire_path, fire_obj, report_fh)
+        finally:
+            if last is not None:
+                self.__save_checkpoint(last, report_fh)
+
+    async def __check(self, prefix, after, report_fh):
+        """
+        Private coroutine checking the DB entries after 'after'
+        """
+        ftp_mount = CONFIG.get('ftp', 'ftp_mount') + "/"
+        rows = collections.deque()
+
+        async def fire_paths():
+            async for row in self.aiter_rows(prefix, after=after):
+                if not row['name'].startswith(ftp_mount):
+                    continue
+                rows.append(row)
+                yield row['name'][len(ftp_mount):]
+
+        last = after
+        try:
+            # AsyncAPI.fetch_objects preserves the order of
+            # 'fire_paths', so each result matches the first pending row
+            async for fire_path, fire_obj in self.aapi.fetch_objects(fire_paths(),
+                                                                     concurrency=self.concurrency):
+                last = self.__record(rows.popleft(), fire_path, fire_obj, report_fh)
+        finally:
+            if last is not None:
+                self.__save_checkpoint(last, report_fh)
+
+    def run(self, prefix=None):
+        """
+        Function to check all the DB entries whose 'name' starts
+        with 'prefix'. If there is a checkpoint, the check continues
+        from it and the issues are appended to the report
+
+        Parameters
+        ----------
+        prefix : str, optional
+                 Prefix of the 'name' of the entries. Default: the 'ftp/'
+                 dir in the 'ftp_mount' option of the 'ftp' section of CONFIG.
+
+        Returns
+        -------
+        dict
+            Summary with the following format:
+            {'checked': int, 'ok': int, 'missing': int, 'size_mismatch': int,
+            'md5_mismatch': int, 'seconds': float, 'files_per_s': float}
+        """
+        if prefix is None:
+            prefix = CONFIG.get('ftp', 'ftp_mount') + "/ftp/"
+
+        after = None
+        ckpt = self.__load_checkpoint()
+        if ckpt is not None:
+            after = ckpt['last']
+            self.counts.update(ckpt['counts'])
+            fc_logger.info(f"Resuming check after {after}: {self.counts}")
+            # discard the issues written after the checkpoint
+            with open(self.report, 'a') as report_fh:
+                report_fh.truncate(ckpt['offset'])
+
+        start = time.time()
+        checked = self.counts['checked']
+        with open(self.report, 'a' if ckpt is not None else 'w') as report_fh:
+            if self.aapi is not None:
+                # asyncio.run needs python 3.7
+                loop = asyncio.new_event_loop()
+                try:
+                    loop.run_until_complete(self.__check(prefix, after, report_fh))
+                finally:
+                    loop.run_until_complete(loop.shutdown_asyncgens())
+                    loop.close()
+            else:
+                self.__check_sync(prefix, after, report_fh)
+        if os.path.isfile(self.checkpoint):
+            os.remove(self.checkpoint)
+
+        elapsed = time.time() - start
+        summary = dict(self.counts)
+        summary['seconds'] = round(elapsed, 2)
+        summary['files_per_s'] = round((self.counts['checked'] - checked) / elapsed, 2) if elapsed else 0.0
+        fc_logger.info(f"Check finished: {summary}")
+
+        return summary
+
+    # object introspection
+    def __str__(self):
+        return f"FireChecker(report={self.report}, checkpoint={self.checkpoint})"
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,212 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from igsr_archive.config import CONFIG
+
+# create logger
+mc_logger = logging.getLogger(__name__)
+
+class MD5Cache(object):
+    """
+    Persistent cache of md5sums stored in a local SQLite file.
+
+    Each entry is keyed by the device and inode of the file and it is
+    only valid while the size and the modification time (in ns) of the
+    file do not change. Stale entries are evicted when they are found.
+
+    Attributes
+    ----------
+    path : str
+           Path to the SQLite file.
+    hits : int
+           Number of lookups that returned a cached md5sum.
+    misses : int
+             Number of lookups that did not return a cached md5sum.
+    evictions : int
+                Number of stale entries that have been removed.
+    """
+    def __init__(self, path):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : str
+               Path to the SQLite file. It will be created if it does not exist.
+        """
+        mc_logger.debug(f"Opening md5 cache: {path}")
+
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS md5_cache ("
+                               "dev INTEGER NOT NULL, "
+                               "ino INTEGER NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "mtime_ns INTEGER NOT NULL, "
+                               "path TEXT NOT NULL, "
+                               "md5 TEXT NOT NULL, "
+                               "PRIMARY KEY (dev, ino))")
+
+    def get(self, path, st=None):
+        """
+        Function to get the cached md5sum of a file
+
+        Parameters
+        ----------
+        path : str
+               File path.
+        st : os.stat_result, optional
+             Result of os.stat(path). It will be obtained if not provided.
+
+        Returns
+        -------
+        md5sum : str
+                 None if the file is not in the cache or if
+                 the cached entry is stale.
+        """
+        if st is None:
+            st = os.stat(path)
+
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, md5 FROM md5_cache "
+                                     "WHERE dev = ? AND ino = ?",
+                                     (st.st_dev, st.st_ino)).fetchone()
+            if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+                self.hits += 1
+                mc_logger.debug(f"md5 cache hit for: {path}")
+                return row[2]
+
+            self.misses += 1
+            if row is not None:
+                mc_logger.debug(f"Evicting stale md5 cache entry for: {path}")
+                with self._conn:
+                    self._conn.execute("DELETE FROM md5_cache WHERE dev = ? AND ino = ?",
+                                       (st.st_dev, st.st_ino))
+                self.evictions += 1
+
+        return None
+
+    def put(self, path, md5, st=None):
+        """
+        Function to store the md5sum of a file
+
+        Parameters
+        ----------
+        path : str
+               File path.
+        md5 : str
+              md5sum of the file.
+        st : os.stat_result, optional
+             Result of os.stat(path) obtained before calculating the md5sum. If
+             the file was modified while being hashed, the entry will be stale.
+             It will be obtained if not provided.
+        """
+        if st is None:
+            st = os.stat(path)
+
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO md5_cache "
+                               "(dev, ino, size, mtime_ns, path, md5) VALUES (?, ?, ?, ?, ?, ?)",
+                               (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                                os.path.abspath(path), md5))
+
+    def purge(self):
+        """
+        Function to remove the entries of the files that do not exist
+        anymore or that have been modified since they were cached
+
+        Returns
+        -------
+        int : number of entries removed
+        """
+        mc_logger.info(f"Purging stale entries from md5 cache: {self.path}")
+
+        stale = []
+        with self._lock:
+            for dev, ino, size, mtime_ns, path in self._conn.execute(
+                    "SELECT dev, ino, size, mtime_ns, path FROM md5_cache"):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    stale.append((dev, ino))
+                    continue
+                if (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) != (dev, ino, size, mtime_ns):
+                    stale.append((dev, ino))
+            with self._conn:
+                self._conn.executemany("DELETE FROM md5_cache WHERE dev = ? AND ino = ?", stale)
+            self.evictions += len(stale)
+
+        mc_logger.info(f"Done. {len(stale)} entries removed")
+
+        return len(stale)
+
+    def stats(self):
+        """
+        Function to get the usage counters of this cache
+
+        Returns
+        -------
+        dict
+            Dict with the following format:
+            {'hits' : int, 'misses' : int, 'evictions' : int, 'entries' : int}
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM md5_cache").fetchone()[0]
+
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': entries}
+
+    def close(self):
+        """
+        Close the connection to the SQLite file
+        """
+        with self._lock:
+            self._conn.close()
+
+    # object introspection
+    def __str__(self):
+        sb = []
+        for key in ['path', 'hits', 'misses', 'evictions']:
+            sb.append("{key}='{value}'".format(key=key, value=self.__dict__[key]))
+
+        return ', '.join(sb)
+
+    def __repr__(self):
+        return self.__str__()
+
+def md5_cache_from_args(path=None, disable=False):
+    """
+    Function to create the MD5Cache used by the bin/ scripts
+
+    Parameters
+    ----------
+    path : str, optional
+           Path to the SQLite file. If not provided, then the 'path'
+           option in the 'md5_cache' section of CONFIG will be used.
+    disable : bool, default=False
+              If True, then the cache will not be used.
+
+    Returns
+    -------
+    MD5Cache object or None if the cache is not used
+    """
+    if disable is True:
+        mc_logger.info("md5 cache disabled")
+        return None
+
+    if path is None:
+        path = CONFIG.get('md5_cache', 'path', fallback=None)
+    if path is None:
+        return None
+
+    mc_logger.info(f"Using md5 cache: {path}")
+
+    return MD5Cache(path)
@@ -0,0 +1,92 @@
+import logging
+import os
+import uuid
+
+# create logger
+mp_logger = logging.getLogger(__name__)
+
+# size in bytes of the chunks of the file sent each time
+DEFAULT_CHUNK_SIZE = 4 * 2**20
+
+class MultipartFile(object):
+    """
+    Streaming 'multipart/form-data' body with a single file field.
+
+    The file is read in chunks of 'chunk_size' bytes each time the
+    object is iterated, so the memory used does not depend on the size
+    of the file and the body can be sent again (i.e. when retrying
+    a request). len() returns the total size of the body, so 'requests'
+    sends it with a Content-Length header instead of using chunked
+    transfer encoding.
+
+    Attributes
+    ----------
+    path : str
+           Path to the file.
+    field : str
+            Name of the form field.
+    boundary : str
+               Multipart boundary.
+    chunk_size : int
+                 Size in bytes of the chunks of the file.
+    bytes_read : int
+                 Number of bytes of the file read in the last iteration.
+    """
+    def __init__(self, path, field='file', chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Constructor
+
+        Parameters
+        ----------
+        path : str
+               Path to the file.
+        field : str, default='file'
+                Name of the form field.
+        chunk_size : int, default=DEFAULT_CHUNK_SIZE
+                     Size in bytes of the chunks of the file.
+        """
+        mp_logger.debug('Creating MultipartFile object')
+
+        self.path = path
+        self.field = field
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.bytes_read = 0
+        self._size = os.path.getsize(path)
+        self._head = (f"--{self.boundary}\r\n"
+                      f"Content-Disposition: form-data; name=\"{field}\"; "
+                      f"filename=\"{os.path.basename(path)}\"\r\n"
+                      f"Content-Type: application/octet-stream\r\n\r\n").encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+
+    @property
+    def content_type(self):
+        """
+        Value for the Content-Type header of the request
+        """
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def __iter__(self):
+        self.bytes_read = 0
+        yield self._head
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                yield chunk
+        if self.bytes_read != self._size:
+            raise Exception(f"Size of {self.path} changed while being uploaded: "
+                            f"{self._size} != {self.bytes_read} bytes")
+        yield self._tail
+
+    # object introspection
+    def __str__(self):
+        return f"MultipartFile(path={self.path}, size={len(self)})"
+
+    def __repr__(self):
+        return self.__str__()
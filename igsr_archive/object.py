@@ -46,6 +46,32 @@ class fObject(object):
 
         self.__dict__.update((k, v) for k, v in kwargs.items() if k in allowed_keys)
 
+    @classmethod
+    def from_json(cls, json_res):
+        """
+        Function to instantiate a fObject from the
+        decoded JSON response of the FIRE API
+
+        Parameters
+        ----------
+        json_res : dict
+                   Decoded JSON response.
+
+        Returns
+        -------
+        fireObj : fire.object.fObject
+                  Object instantiated from json
+        """
+        metadata_dict = {}
+        for k, v in json_res.items():
+            if k == "filesystemEntry" and v is not None:
+                for f in v.keys():
+                    metadata_dict[f] = v[f]
+            else:
+                metadata_dict[k] = v
+
+        return cls(**metadata_dict)
+
     # object introspection
     def __str__(self):
         sb = []
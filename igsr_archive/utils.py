@@ -1,3 +1,40 @@
+import email.utils
+import time
+
+# HTTP status codes of the responses that are retried
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+def parse_retry_after(value):
+    """
+    Function to parse the value of a 'Retry-After' header
+
+    Parameters
+    ----------
+    value : str
+            Value of the header. It can be either a number of
+            seconds or a HTTP date.
+
+    Returns
+    -------
+    float
+        Seconds to wait before retrying or None if
+        'value' is not defined or cannot be parsed.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+
+    return max(0.0, date.timestamp() - time.time())
+
 def str2bool(v):
     """
     Function to parse a string representing a bool
@@ -29,6 +29,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'async': ['aiohttp'],
 }
 
 # The rest you shouldn't have to touch too much :)
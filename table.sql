@@ -8,13 +8,19 @@ CREATE TABLE file(
        withdrawn tinyint(1) NOT NULL DEFAULT '0',
        created   datetime NOT NULL,
        updated   datetime,    
+       basename  VARCHAR(968) AS (SUBSTRING_INDEX(name, '/', -1)) STORED,
 
        PRIMARY KEY (file_id),
        KEY file_path_idx (name),
+       KEY file_basename_idx (basename),
        UNIQUE (name, md5)
   
 ) ENGINE=MYISAM;
 
+-- For adding the 'basename' column to an existing 'file' table:
+-- ALTER TABLE file ADD COLUMN basename VARCHAR(968) AS (SUBSTRING_INDEX(name, '/', -1)) STORED,
+--                  ADD KEY file_basename_idx (basename);
+
 CREATE TABLE host(
        host_id int(10) unsigned NOT NULL AUTO_INCREMENT,
        name  VARCHAR(255),
@@ -140,3 +140,39 @@ def test_w_md5_file(rand_filelst_md5, delete_file):
     os.remove(rand_filelst_md5)
     print('Load a single file using --md5_file and --dry False options. DONE...')
 
+
+def test_file_list_same_basename(db_obj):
+
+    print('Load a list of files with the same basename using -l and --unique True options')
+
+    dirname = os.getenv("DATADIR")
+    os.makedirs(f"{dirname}/dup", exist_ok=True)
+    f_lst = [f"{dirname}/test_dup.txt", f"{dirname}/dup/test_dup.txt"]
+    for p in f_lst:
+        with open(p, 'w') as f:
+            f.write(p)
+    list_f = f"{dirname}/file_lst_dup.txt"
+    with open(list_f, 'w') as f:
+        f.write("\n".join(f_lst) + "\n")
+
+    settings_f = os.getenv("DATADIR") + "/settings.ini"
+
+    cmd = f"{os.getenv('SCRIPTSDIR')}/load_files.py -l {list_f} --unique True --dry False --settings {settings_f}" \
+          f" --dbname {os.getenv('DBNAME')} --pwd {os.getenv('DBPWD')}"
+
+    ret = subprocess.Popen(cmd,
+                           shell=True,
+                           stdout=subprocess.PIPE,
+                           stderr=subprocess.PIPE)
+    stdout, stderr = ret.communicate()
+
+    loaded = [p for p in f_lst if db_obj.fetch_file(path=p) is not None]
+    for p in loaded:
+        db_obj.delete_file(db_obj.fetch_file(path=p), dry=False)
+    for p in f_lst + [list_f]:
+        os.remove(p)
+    os.rmdir(f"{dirname}/dup")
+
+    print('Load a list of files with the same basename using -l and --unique True options. DONE...')
+    assert ret.returncode == 1
+    assert loaded == []
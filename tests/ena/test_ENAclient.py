@@ -0,0 +1,87 @@
+import pytest
+import logging
+import time
+import responses
+
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_client import ENAclient, TokenBucket
+from igsr_archive.ena.ena_query import ENAbrowser
+
+logging.basicConfig(level=logging.DEBUG)
+
+def run_xml(acc):
+    return f"<?xml version='1.0' encoding='UTF-8'?><RUN_SET><RUN accession=\"{acc}\">" \
+           f"<IDENTIFIERS><PRIMARY_ID>{acc}</PRIMARY_ID></IDENTIFIERS></RUN></RUN_SET>"
+
+@pytest.fixture
+def browser_url():
+    return f"{CONFIG.get('ena', 'endpoint_browser')}/"
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setitem(CONFIG['ena'], 'backoff', '0')
+
+def test_token_bucket():
+    log = logging.getLogger('test_token_bucket')
+
+    log.debug('Test that the token bucket limits the rate')
+
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+
+    assert time.monotonic() - start >= 0.19
+
+@responses.activate
+def test_get_retry(browser_url, no_backoff):
+    log = logging.getLogger('test_get_retry')
+
+    log.debug('Retry a request after 429 and 5xx responses')
+
+    url = f"{browser_url}ERR001386"
+    responses.add(responses.GET, url, status=429, headers={'Retry-After': '0'})
+    responses.add(responses.GET, url, status=503)
+    responses.add(responses.GET, url, body=run_xml('ERR001386'), status=200)
+
+    client = ENAclient(workers=2, rps=0)
+    res = client.get(url)
+
+    assert res.status_code == 200
+    assert client.stats == {'requests': 3, 'retries': 2, 'throttled': 1}
+
+@responses.activate
+def test_get_retries_exhausted(browser_url, no_backoff, monkeypatch):
+    log = logging.getLogger('test_get_retries_exhausted')
+
+    log.debug('Get the last error response when all the retries fail')
+
+    monkeypatch.setitem(CONFIG['ena'], 'retries', '2')
+    url = f"{browser_url}ERR001386"
+    responses.add(responses.GET, url, status=500)
+
+    client = ENAclient(workers=2, rps=0)
+    with pytest.raises(Exception):
+        ENAbrowser(acc='ERR001386', session=client).query()
+
+    assert client.stats['requests'] == 3
+
+@responses.activate
+def test_map(browser_url):
+    log = logging.getLogger('test_map')
+
+    log.debug('Fetch several records concurrently, keeping the order')
+
+    accs = [f"ERR00{i:04d}" for i in range(20)]
+    for acc in accs:
+        responses.add(responses.GET, f"{browser_url}{acc}", body=run_xml(acc), status=200)
+
+    def fetch(acc):
+        ebrowser = ENAbrowser(acc=acc, session=client)
+        return ebrowser.fetch_primary_id('RUN', ebrowser.query())
+
+    with ENAclient(workers=4, rps=100) as client:
+        ids = client.map(fetch, accs)
+
+    assert ids == accs
+    assert client.stats['requests'] == 20
@@ -1,7 +1,10 @@
 import pytest
 import logging
+import responses
 
+from igsr_archive.config import CONFIG
 from igsr_archive.ena.ena_query import ENAportal
+from igsr_archive.ena.response_cache import ResponseCache
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -37,3 +40,46 @@ def test_ENAportal_query_fields():
     record_lst = eportal.query(fields='run_accession,fastq_ftp,fastq_md5')
 
     assert sorted(list(record_lst[0].__dict__.keys())) == ['accession', 'fastq_ftp', 'fastq_md5', 'type']
+
+READ_RUN_TSV = "run_accession\tfastq_ftp\tfastq_md5\n" + \
+               "".join(f"ERR{i:06d}\tftp.sra.ebi.ac.uk/ERR{i:06d}_1.fastq.gz;ftp.sra.ebi.ac.uk/ERR{i:06d}_2.fastq.gz\t"
+                       f"md5a{i};md5b{i}\n" for i in range(1000))
+
+@pytest.fixture
+def read_run_url():
+    return f"{CONFIG.get('ena', 'endpoint_portal')}ERP000001&result=read_run&fields=run_accession,fastq_ftp,fastq_md5"
+
+@responses.activate
+def test_ENAportal_iter_records(read_run_url):
+    log = logging.getLogger('test_ENAportal_iter_records')
+
+    log.debug('Test that the filereport records are parsed as a stream')
+
+    responses.add(responses.GET, read_run_url, body=READ_RUN_TSV, status=200)
+
+    eportal = ENAportal(acc="ERP000001")
+    records = eportal.iter_records(fields='run_accession,fastq_ftp,fastq_md5')
+
+    first = next(records)
+    assert first.accession == "ERR000000"
+    assert first.fastq_md5 == "md5a0;md5b0"
+    assert len(list(records)) == 999
+
+    # the same object can be queried again
+    assert len(eportal.query(fields='run_accession,fastq_ftp,fastq_md5')) == 1000
+
+@responses.activate
+def test_ENAportal_iter_records_cache(tmp_path, read_run_url):
+    log = logging.getLogger('test_ENAportal_iter_records_cache')
+
+    log.debug('Test that a streamed filereport is stored in the cache once it has been read')
+
+    responses.add(responses.GET, read_run_url, body=READ_RUN_TSV, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600)
+    records = ENAportal(acc="ERP000001", session=cache).query(fields='run_accession,fastq_ftp,fastq_md5')
+    cached = ENAportal(acc="ERP000001", session=cache).query(fields='run_accession,fastq_ftp,fastq_md5')
+
+    assert [r.__dict__ for r in cached] == [r.__dict__ for r in records]
+    assert len(responses.calls) == 1
+    assert cache.stats['hits'] == 1
@@ -0,0 +1,172 @@
+import pytest
+import logging
+import time
+import responses
+import requests
+
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_client import ENAclient
+from igsr_archive.ena.ena_query import ENAbrowser, ENAportal
+from igsr_archive.ena.response_cache import ResponseCache, cache_key
+
+logging.basicConfig(level=logging.DEBUG)
+
+RUN_XML = "<?xml version='1.0' encoding='UTF-8'?><RUN_SET><RUN accession=\"ERR001386\">" \
+          "<IDENTIFIERS><PRIMARY_ID>ERR001386</PRIMARY_ID></IDENTIFIERS></RUN></RUN_SET>"
+
+@pytest.fixture
+def run_url():
+    return f"{CONFIG.get('ena', 'endpoint_browser')}/ERR001386"
+
+def test_cache_key():
+    log = logging.getLogger('test_cache_key')
+
+    log.debug('Test that the key does not depend on the order of the query parameters')
+
+    assert cache_key('https://www.ebi.ac.uk/ena/portal/api/filereport?accession=ERP1&result=read_run&fields=a,b') == \
+           cache_key('https://WWW.ebi.ac.uk/ena/portal/api/filereport?fields=a,b&result=read_run&accession=ERP1')
+    assert cache_key('https://www.ebi.ac.uk/ena/portal/api/filereport?accession=ERP1&fields=a,b') != \
+           cache_key('https://www.ebi.ac.uk/ena/portal/api/filereport?accession=ERP1&fields=b,a')
+
+@responses.activate
+def test_get_cached(tmp_path, run_url):
+    log = logging.getLogger('test_get_cached')
+
+    log.debug('Fetch a response once and read it from the cache afterwards')
+
+    responses.add(responses.GET, run_url, body=RUN_XML, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600)
+    xmld = ENAbrowser(acc='ERR001386', session=cache).query()
+    assert list(xmld.keys())[0] == 'RUN_SET'
+    cache.close()
+
+    # a new cache object uses the same file
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600)
+    xmld = ENAbrowser(acc='ERR001386', session=cache).query()
+    assert list(xmld.keys())[0] == 'RUN_SET'
+
+    assert len(responses.calls) == 1
+    assert cache.stats['hits'] == 1
+
+@responses.activate
+def test_get_revalidate(tmp_path, run_url):
+    log = logging.getLogger('test_get_revalidate')
+
+    log.debug('Revalidate an expired response using its ETag')
+
+    responses.add(responses.GET, run_url, body=RUN_XML, status=200, headers={'ETag': '"v1"'})
+    responses.add(responses.GET, run_url, status=304)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=0)
+    res1 = cache.get(run_url)
+    res2 = cache.get(run_url)
+
+    assert res2.from_cache is True
+    assert res2.content == res1.content
+    assert responses.calls[1].request.headers['If-None-Match'] == '"v1"'
+    assert cache.stats['revalidated'] == 1
+
+@responses.activate
+def test_offline(tmp_path, run_url):
+    log = logging.getLogger('test_offline')
+
+    log.debug('Use only the cached responses in offline mode')
+
+    responses.add(responses.GET, run_url, body=RUN_XML, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=0)
+    cache.get(run_url)
+
+    cache.offline = True
+    client = ENAclient(workers=2, rps=0, cache=cache)
+    xmld = ENAbrowser(acc='ERR001386', session=client).query()
+    assert list(xmld.keys())[0] == 'RUN_SET'
+
+    with pytest.raises(Exception):
+        ENAportal('ERP000001', session=client).query()
+
+    assert len(responses.calls) == 1
+    assert client.stats['requests'] == 0
+
+@responses.activate
+def test_evict(tmp_path):
+    log = logging.getLogger('test_evict')
+
+    log.debug('Evict the least recently used responses when the cache is full')
+
+    urls = [f"https://www.ebi.ac.uk/ena/browser/api/xml/ERR00000{i}" for i in range(3)]
+    for url in urls:
+        responses.add(responses.GET, url, body="x" * 100, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600, max_size=250)
+    cache.get(urls[0])
+    time.sleep(0.01)
+    cache.get(urls[1])
+    time.sleep(0.01)
+    # urls[0] becomes the most recently used
+    cache.get(urls[0])
+    time.sleep(0.01)
+    cache.get(urls[2])
+
+    assert cache.stats['evicted'] == 1
+    cache.get(urls[0])
+    cache.get(urls[1])
+    assert len(responses.calls) == 4
+
+@responses.activate
+def test_stream_cached(tmp_path):
+    log = logging.getLogger('test_stream_cached')
+
+    log.debug('A streamed response read until the end is stored')
+
+    url = "https://www.ebi.ac.uk/ena/browser/api/xml/ERR000001"
+    responses.add(responses.GET, url, body="x" * 200, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600, max_size=250)
+    res = cache.get(url, stream=True)
+    assert b''.join(res.iter_content(100)) == b"x" * 200
+    assert cache.stats['stored'] == 1
+
+    res = cache.get(url, stream=True)
+    assert res.from_cache is True
+    assert b''.join(res.iter_content(100)) == b"x" * 200
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_stream_too_big(tmp_path):
+    log = logging.getLogger('test_stream_too_big')
+
+    log.debug('A streamed response bigger than the cache is read but not stored')
+
+    url = "https://www.ebi.ac.uk/ena/browser/api/xml/ERR000001"
+    responses.add(responses.GET, url, body="x" * 300, status=200)
+
+    cache = ResponseCache(str(tmp_path / "ena.sqlite"), ttl=3600, max_size=250)
+    res = cache.get(url, stream=True)
+    assert b''.join(res.iter_content(100)) == b"x" * 300
+    assert cache.stats['stored'] == 0
+
+@responses.activate
+def test_stream_not_found():
+    log = logging.getLogger('test_stream_not_found')
+
+    log.debug('The connection of a streamed 404 response is released')
+
+    url = f"{CONFIG.get('ena', 'endpoint_browser')}/ERR000000"
+    responses.add(responses.GET, url, status=404)
+
+    class Session(object):
+        """
+        Session recording the responses that are closed
+        """
+        closed = []
+
+        def get(self, url, **kwargs):
+            res = requests.get(url, **kwargs)
+            res.close = lambda: self.closed.append(url)
+            return res
+
+    session = Session()
+    assert list(ENAbrowser(acc='ERR000000', session=session).iter_entries()) == []
+    assert session.closed == [url]
@@ -0,0 +1,85 @@
+import pytest
+import logging
+import responses
+
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.sample_resolver import SampleResolver
+
+logging.basicConfig(level=logging.DEBUG)
+
+def sample_xml(accession, biosample, population=None):
+    attrbs = "<SAMPLE_ATTRIBUTE><TAG>sex</TAG><VALUE>female</VALUE></SAMPLE_ATTRIBUTE>"
+    if population is not None:
+        attrbs += f"<SAMPLE_ATTRIBUTE><TAG>population</TAG><VALUE>{population}</VALUE></SAMPLE_ATTRIBUTE>"
+    return f"""<SAMPLE accession="{accession}" alias="{accession}_alias">
+    <IDENTIFIERS>
+        <PRIMARY_ID>{accession}</PRIMARY_ID>
+        <EXTERNAL_ID namespace="BioSample">{biosample}</EXTERNAL_ID>
+    </IDENTIFIERS>
+    <SAMPLE_ATTRIBUTES>{attrbs}</SAMPLE_ATTRIBUTES>
+</SAMPLE>"""
+
+def sample_set(*samples):
+    return f"<?xml version='1.0' encoding='UTF-8'?><SAMPLE_SET>{''.join(samples)}</SAMPLE_SET>"
+
+@pytest.fixture
+def browser_url():
+    return f"{CONFIG.get('ena', 'endpoint_browser')}/"
+
+@responses.activate
+def test_resolve(browser_url):
+    log = logging.getLogger('test_resolve')
+
+    log.debug('Resolve several samples with a single request')
+
+    responses.add(responses.GET, f"{browser_url}SAMEA1,SAMEA2,ERS3",
+                  body=sample_set(sample_xml('ERS1', 'SAMEA1', 'GBR'),
+                                  sample_xml('ERS2', 'SAMEA2', 'YRI'),
+                                  sample_xml('ERS3', 'SAMEA3')),
+                  status=200)
+
+    resolver = SampleResolver()
+    res = resolver.resolve(['SAMEA1', 'SAMEA2', 'SAMEA1', 'ERS3'])
+
+    assert res == {'SAMEA1': {'population': 'GBR'},
+                   'SAMEA2': {'population': 'YRI'},
+                   'ERS3': {}}
+    assert resolver.nrequests == 1
+    assert len(responses.calls) == 1
+
+@responses.activate
+def test_resolve_batches(browser_url):
+    log = logging.getLogger('test_resolve_batches')
+
+    log.debug('Resolve samples in batches and memoize the results')
+
+    responses.add(responses.GET, f"{browser_url}SAMEA1,SAMEA2",
+                  body=sample_set(sample_xml('ERS1', 'SAMEA1', 'GBR'),
+                                  sample_xml('ERS2', 'SAMEA2', 'YRI')),
+                  status=200)
+    responses.add(responses.GET, f"{browser_url}SAMEA3",
+                  body=sample_set(sample_xml('ERS3', 'SAMEA3', 'CEU')),
+                  status=200)
+
+    resolver = SampleResolver(batch_size=2)
+    resolver.resolve(['SAMEA1', 'SAMEA2', 'SAMEA3'])
+    assert resolver.nrequests == 2
+
+    # already resolved, no new requests
+    assert resolver.get_population('SAMEA3') == 'CEU'
+    assert resolver.get_population('SAMEA1') == 'GBR'
+    assert len(responses.calls) == 2
+
+@responses.activate
+def test_resolve_not_found(browser_url):
+    log = logging.getLogger('test_resolve_not_found')
+
+    log.debug('Resolve a sample that does not exist')
+
+    responses.add(responses.GET, f"{browser_url}SAMEA0",
+                  body="", status=404)
+
+    resolver = SampleResolver()
+    assert resolver.get_population('SAMEA0') is None
+    assert resolver.get_population('SAMEA0') is None
+    assert len(responses.calls) == 1
@@ -0,0 +1,137 @@
+import pytest
+import logging
+import responses
+
+from igsr_archive.config import CONFIG
+from igsr_archive.ena.ena_query import ENAbrowser
+from igsr_archive.ena.xml_extractor import iter_entries
+
+logging.basicConfig(level=logging.DEBUG)
+
+SAMPLE_SET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<SAMPLE_SET>
+<SAMPLE accession="ERS000001" alias="NA12878">
+    <IDENTIFIERS>
+        <PRIMARY_ID>ERS000001</PRIMARY_ID>
+        <EXTERNAL_ID namespace="BioSample">SAMEA000001</EXTERNAL_ID>
+    </IDENTIFIERS>
+    <SAMPLE_LINKS>
+        <SAMPLE_LINK><XREF_LINK><DB>ENA-SUBMISSION</DB><ID>ERA000001</ID></XREF_LINK></SAMPLE_LINK>
+    </SAMPLE_LINKS>
+    <SAMPLE_ATTRIBUTES>
+        <SAMPLE_ATTRIBUTE><TAG>population</TAG><VALUE>CEU</VALUE></SAMPLE_ATTRIBUTE>
+        <SAMPLE_ATTRIBUTE><TAG>sex</TAG><VALUE>female</VALUE></SAMPLE_ATTRIBUTE>
+        <SAMPLE_ATTRIBUTE><TAG>ENA-CHECKLIST</TAG></SAMPLE_ATTRIBUTE>
+    </SAMPLE_ATTRIBUTES>
+</SAMPLE>
+<SAMPLE accession="ERS000002" alias="NA19240">
+    <IDENTIFIERS>
+        <PRIMARY_ID>ERS000002</PRIMARY_ID>
+        <EXTERNAL_ID namespace="BioSample">SAMEA000002</EXTERNAL_ID>
+    </IDENTIFIERS>
+    <SAMPLE_ATTRIBUTES>
+        <SAMPLE_ATTRIBUTE><TAG>population</TAG><VALUE>YRI</VALUE></SAMPLE_ATTRIBUTE>
+    </SAMPLE_ATTRIBUTES>
+</SAMPLE>
+</SAMPLE_SET>"""
+
+ANALYSIS_SET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ANALYSIS_SET>
+<ANALYSIS accession="ERZ000001">
+    <IDENTIFIERS><PRIMARY_ID>ERZ000001</PRIMARY_ID></IDENTIFIERS>
+    <ANALYSIS_TYPE>
+        <GENOME_MAP>
+            <PROGRAM>Bionano Solve 3.4</PROGRAM>
+            <PLATFORM>Saphyr</PLATFORM>
+        </GENOME_MAP>
+    </ANALYSIS_TYPE>
+    <FILES>
+        <FILE filename="ERZ000001/NA12878.cmap" filetype="other" checksum_method="MD5" checksum="abc"/>
+    </FILES>
+    <ANALYSIS_LINKS>
+        <ANALYSIS_LINK><XREF_LINK><DB>ENA-SUBMISSION</DB><ID>ERA000002</ID></XREF_LINK></ANALYSIS_LINK>
+        <ANALYSIS_LINK><XREF_LINK><DB>ENA-SAMPLE</DB><ID>ERS000001</ID></XREF_LINK></ANALYSIS_LINK>
+    </ANALYSIS_LINKS>
+</ANALYSIS>
+</ANALYSIS_SET>"""
+
+RUN_SET = b"""<?xml version="1.0" encoding="UTF-8"?>
+<RUN_SET>
+<RUN accession="ERR000001">
+    <IDENTIFIERS><PRIMARY_ID>ERR000001</PRIMARY_ID></IDENTIFIERS>
+    <PLATFORM><ILLUMINA><INSTRUMENT_MODEL>HiSeq 2000</INSTRUMENT_MODEL></ILLUMINA></PLATFORM>
+    <DATA_BLOCK>
+        <FILES>
+            <FILE filename="ERR000001_1.fastq.gz" filetype="fastq" checksum="md5a"/>
+            <FILE filename="ERR000001_2.fastq.gz" filetype="fastq" checksum="md5b"/>
+        </FILES>
+    </DATA_BLOCK>
+</RUN>
+</RUN_SET>"""
+
+def chunked(data, size=17):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+def test_iter_entries_samples():
+    log = logging.getLogger('test_iter_entries_samples')
+
+    log.debug('Extract the identifiers, attributes and xrefs of several samples')
+
+    entries = list(iter_entries(chunked(SAMPLE_SET)))
+
+    assert len(entries) == 2
+    assert entries[0]['type'] == 'SAMPLE'
+    assert entries[0]['primary_id'] == 'ERS000001'
+    assert entries[0]['ids'] == {'ERS000001', 'SAMEA000001'}
+    assert entries[0]['attrbs'] == {'population': 'CEU', 'sex': 'female', 'ENA-CHECKLIST': None}
+    assert entries[0]['xrefs'] == {'ENA-SUBMISSION': 'ERA000001'}
+    assert entries[1]['attrbs'] == {'population': 'YRI'}
+
+def test_iter_entries_alist():
+    log = logging.getLogger('test_iter_entries_alist')
+
+    log.debug('Extract only the requested attributes')
+
+    entries = list(iter_entries(chunked(SAMPLE_SET), alist=['population']))
+
+    assert [e['attrbs'] for e in entries] == [{'population': 'CEU'}, {'population': 'YRI'}]
+
+def test_iter_entries_analysis():
+    log = logging.getLogger('test_iter_entries_analysis')
+
+    log.debug('Extract the PROGRAM, PLATFORM and files of an analysis')
+
+    entry = next(iter_entries(chunked(ANALYSIS_SET)))
+
+    assert entry['program'] == 'Bionano Solve 3.4'
+    assert entry['platform'] == 'Saphyr'
+    assert entry['xrefs']['ENA-SUBMISSION'] == 'ERA000002'
+    assert entry['files'][0]['filename'] == 'ERZ000001/NA12878.cmap'
+
+def test_iter_entries_run():
+    log = logging.getLogger('test_iter_entries_run')
+
+    log.debug('Extract the DATA_BLOCK files of a run')
+
+    entry = next(iter_entries(chunked(RUN_SET)))
+
+    assert entry['platform'] is None
+    assert [f['checksum'] for f in entry['files']] == ['md5a', 'md5b']
+
+@responses.activate
+def test_ENAbrowser_iter_entries():
+    log = logging.getLogger('test_ENAbrowser_iter_entries')
+
+    log.debug('Extract the records from an ENA browser response')
+
+    url = f"{CONFIG.get('ena', 'endpoint_browser')}/SAMEA000001,SAMEA000002"
+    responses.add(responses.GET, url, body=SAMPLE_SET, status=200)
+
+    ebrowser = ENAbrowser(acc="SAMEA000001,SAMEA000002")
+    entries = list(ebrowser.iter_entries(alist=['population']))
+
+    # same values as with the xmltodict path
+    xmld = ebrowser.query()
+    assert entries[0]['attrbs'] == ebrowser.fetch_attrbs('SAMPLE', {'SAMPLE_SET': {'SAMPLE': xmld['SAMPLE_SET']['SAMPLE'][0]}},
+                                                         alist=['population'])
+    assert [e['accession'] for e in entries] == ['ERS000001', 'ERS000002']
@@ -3,11 +3,14 @@ import logging
 import os
 import glob
 import pdb
+import json
+import hashlib
 import responses
 
 from igsr_archive.object import fObject
 from igsr_archive.api import API
 from igsr_archive.file import File
+from igsr_archive.config import CONFIG
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -172,6 +175,18 @@ def test_delete_object_by_foi(mock_fireobj):
     # now, you can delete it by its fireOid
     api.delete_object(fireOid=mock_fireobj.fireOid, dry=False)
 
+def test_session():
+    log = logging.getLogger('test_session')
+    log.debug('Testing the pooled session used for the FIRE API requests')
+
+    # the module-level 'api' is used by the other tests
+    new_api = API(pwd=pwd)
+    adapter = new_api.session.get_adapter('https://hx.fire.sdo.ebi.ac.uk/fire')
+
+    assert adapter.max_retries.total == 3
+    assert 'POST' not in adapter.max_retries.allowed_methods
+    assert new_api.connection_stats() == {'connections': 0, 'requests': 0, 'reused': 0}
+
 def test_push_object(del_obj):
     """
     This test will fail if an Exception is raised
@@ -191,6 +206,49 @@ def test_push_object(del_obj):
 
     del_obj.append(fobj.fireOid)
 
+@responses.activate
+def test_push_object_w_retry(monkeypatch):
+    """
+    The upload is retried after a 5xx response and
+    the file is sent as a streamed multipart body
+    """
+    log = logging.getLogger('test_push_object_w_retry')
+
+    log.debug('Pushing (upload) a file.file.File object to FIRE after a 5xx response')
+
+    monkeypatch.setattr(api, 'upload_backoff', 0)
+
+    bodies = []
+    def request_callback(request):
+        bodies.append(b"".join(request.body))
+        if len(bodies) == 1:
+            return (503, {}, "Service Unavailable")
+        return (200, {}, json.dumps({'objectId': 61903465,
+                                     'fireOid': '06cb664f1b844809b09a93cb18fcfc6b',
+                                     'objectMd5': '0b1578b3dbfca89caa03a88949d68fa4',
+                                     'objectSize': 8,
+                                     'createTime': '2021-02-02 11:53:01',
+                                     'metadata': [],
+                                     'filesystemEntry': None}))
+
+    responses.add_callback(responses.POST, 'https://hx.fire.sdo.ebi.ac.uk/fire/v1.1/objects',
+                           callback=request_callback)
+
+    f = File(
+        name=os.getenv('DATADIR')+"/test.txt",
+        type="TEST_F")
+
+    fobj = api.push_object(fileO=f, dry=False, publish=False)
+
+    assert fobj.fireOid == '06cb664f1b844809b09a93cb18fcfc6b'
+    assert len(bodies) == 2
+    assert bodies[0] == bodies[1]
+    with open(f.name, 'rb') as fh:
+        assert fh.read() in bodies[1]
+    assert responses.calls[1].request.headers['x-fire-md5'] == f.md5
+    assert api.uploads[-1]['attempts'] == 2
+    assert api.uploads[-1]['bytes'] == f.size
+
 def test_push_object_w_fpath(del_obj):
     """
     This test will fail if an Exception is raised
@@ -358,4 +416,87 @@ def test_update_object_publish2(mock_fireobj):
                                     dry=False)
 
     # check that FIRE path has been modified
-    assert updated_obj.published is False
\ No newline at end of file
+    assert updated_obj.published is False
+@pytest.fixture
+def s3_object(monkeypatch):
+    """
+    Mock S3 endpoint serving an object with ranged GETs.
+    The second ranged GET gets a truncated response
+    """
+    monkeypatch.setitem(CONFIG['fire'], 's3_endpoint', 's3://g1k-public/')
+    monkeypatch.setitem(CONFIG['fire'], 's3_root_endpoint', 'https://s3.example.org')
+    monkeypatch.setattr(api, 'download_backoff', 0)
+
+    data = os.urandom(1000)
+    url = 'https://s3.example.org/g1k-public/ftp/test.bin'
+    ranges = []
+    def range_callback(request):
+        start, end = map(int, request.headers['Range'].replace('bytes=', '').split('-'))
+        ranges.append((start, end))
+        if len(ranges) == 2:
+            return (206, {}, data[start:end])
+        return (206, {}, data[start:end + 1])
+
+    responses.add(responses.HEAD, url, headers={'Content-Length': str(len(data))})
+    responses.add_callback(responses.GET, url, callback=range_callback)
+
+    return data, ranges
+
+@responses.activate
+def test_download_object(s3_object, tmp_path):
+    log = logging.getLogger('test_download_object')
+    log.debug('Downloading a FIRE object with ranged GETs')
+
+    data, ranges = s3_object
+    outfile = str(tmp_path / "test.bin")
+
+    stats = api.download_object(firePath="ftp/test.bin", outfile=outfile, workers=2, part_size=300)
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == data
+    assert stats['md5'] == hashlib.md5(data).hexdigest()
+    assert stats['size'] == len(data)
+    # 4 parts + the retry of the truncated one
+    assert sorted(set(ranges)) == [(0, 299), (300, 599), (600, 899), (900, 999)]
+    assert len(ranges) == 5
+    assert os.path.exists(outfile + '.part') is False
+
+@responses.activate
+def test_download_object_resume(s3_object, tmp_path):
+    log = logging.getLogger('test_download_object_resume')
+    log.debug('Resuming the download of a FIRE object')
+
+    data, ranges = s3_object
+    outfile = str(tmp_path / "test.bin")
+    with open(outfile + '.part', 'wb') as f:
+        f.write(data[:400])
+
+    stats = api.download_object(firePath="ftp/test.bin", outfile=outfile, workers=1, part_size=300)
+
+    with open(outfile, 'rb') as f:
+        assert f.read() == data
+    assert stats['md5'] == hashlib.md5(data).hexdigest()
+    assert ranges[0] == (400, 699)
+
+@responses.activate
+def test_download_object_verify(s3_object, tmp_path):
+    log = logging.getLogger('test_download_object_verify')
+    log.debug('Verifying the md5sum and size of a downloaded FIRE object')
+
+    data, ranges = s3_object
+    outfile = str(tmp_path / "test.bin")
+
+    # the size is checked before downloading anything
+    with pytest.raises(Exception):
+        api.download_object(firePath="ftp/test.bin", outfile=outfile, expected_size=len(data) + 1)
+    assert ranges == []
+
+    with pytest.raises(Exception):
+        api.download_object(firePath="ftp/test.bin", outfile=outfile, part_size=300,
+                            expected_md5='0' * 32, expected_size=len(data))
+    assert os.path.exists(outfile) is False
+    assert os.path.exists(outfile + '.part') is False
+
+    stats = api.download_object(firePath="ftp/test.bin", outfile=outfile, part_size=300,
+                                expected_md5=hashlib.md5(data).hexdigest(), expected_size=len(data))
+    assert stats['size'] == len(data)
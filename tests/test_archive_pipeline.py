@@ -0,0 +1,131 @@
+import pytest
+import logging
+import os
+import threading
+
+from igsr_archive.archive_pipeline import ArchivePipeline
+from igsr_archive.config import CONFIG
+from igsr_archive.file import File
+from igsr_archive.object import fObject
+
+logging.basicConfig(level=logging.DEBUG)
+
+class MockDB(object):
+    """
+    DB with the entries of the files loaded in the staging area
+    """
+    def __init__(self, files):
+        self.files = {f.name: f for f in files}
+        self.updates = []
+
+    def fetch_files(self, paths=None, basenames=None):
+        return {p: self.files[p] for p in paths if p in self.files}
+
+    def update_files(self, updates, batch_size=1000, dry=True):
+        self.updates.extend(updates)
+        return [0 if name in self.files else 1 for name, attrs in updates]
+
+class MockAPI(object):
+    """
+    FIRE API without any archived object
+    """
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch_object(self, firePath=None):
+        return None
+
+    def push_object(self, fileO, dry=True, publish=True, fire_path=None):
+        with self.lock:
+            self.calls.append(('push', fileO.name))
+        return fObject(fireOid=os.path.basename(fileO.name), size=fileO.size)
+
+    def update_object(self, attr_name, value, dry=True, fireOid=None):
+        with self.lock:
+            self.calls.append((attr_name, fireOid))
+        return fObject(fireOid=fireOid)
+
+@pytest.fixture
+def staged_files(tmp_path, monkeypatch):
+    staging = tmp_path / "staging"
+    (staging / "dir").mkdir(parents=True)
+    monkeypatch.setitem(CONFIG['ftp'], 'staging_mount', str(staging))
+    monkeypatch.setitem(CONFIG['ftp'], 'ftp_mount', str(tmp_path / "ftp"))
+
+    paths = []
+    for i in range(5):
+        path = staging / "dir" / f"file_{i}.txt"
+        path.write_text(f"file {i}\n")
+        paths.append(str(path))
+
+    return paths
+
+def test_run(staged_files):
+    log = logging.getLogger('test_run')
+    log.debug('Testing the archival of several files at once')
+
+    # the last file is not loaded in the DB
+    db = MockDB([File(name=p, type="TXT") for p in staged_files[:-1]])
+    api = MockAPI()
+
+    pipeline = ArchivePipeline(db=db, api=api, workers=3, limits={'push': 2},
+                               batch_size=2, type="TEST_F", dry=False)
+    summary = pipeline.run(staged_files)
+
+    assert summary['archived'] == 4
+    assert list(summary['failed']) == [staged_files[-1]]
+    assert summary['failed'][staged_files[-1]][0] == 'precheck'
+    for path in staged_files[:-1]:
+        assert os.path.exists(path) is False
+        fireOid = os.path.basename(path)
+        assert ('push', path) in api.calls
+        assert api.calls.index(('firePath', fireOid)) < api.calls.index(('publish', fireOid))
+    assert os.path.exists(staged_files[-1]) is True
+    ftp_mount = CONFIG.get('ftp', 'ftp_mount')
+    assert sorted(db.updates) == sorted((p, {'name': p.replace(CONFIG.get('ftp', 'staging_mount'), ftp_mount),
+                                             'type': "TEST_F"}) for p in staged_files[:-1])
+
+def test_run_dry(staged_files):
+    log = logging.getLogger('test_run_dry')
+    log.debug('Testing that nothing is archived if dry is True')
+
+    db = MockDB([File(name=p, type="TXT") for p in staged_files])
+    api = MockAPI()
+
+    pipeline = ArchivePipeline(db=db, api=api, workers=2, dry=True)
+    summary = pipeline.run(staged_files)
+
+    assert summary['failed'] == {}
+    assert all(os.path.exists(p) for p in staged_files)
+    assert [c for c in api.calls if c[0] != 'push'] == []
+
+def test_run_interrupted(staged_files):
+    log = logging.getLogger('test_run_interrupted')
+    log.debug('Testing that the DB entries of the pushed files are updated if the run is interrupted')
+
+    class FailingDB(MockDB):
+        def update_files(self, updates, batch_size=1000, dry=True):
+            if not self.updates:
+                self.updates.append(None)
+                raise Exception("Lost connection to MySQL server")
+            return MockDB.update_files(self, updates, batch_size=batch_size, dry=dry)
+
+    db = FailingDB([File(name=p, type="TXT") for p in staged_files])
+    api = MockAPI()
+
+    pipeline = ArchivePipeline(db=db, api=api, workers=1, batch_size=1, dry=False)
+    with pytest.raises(Exception):
+        pipeline.run(staged_files)
+
+    # the first batch failed, all the other pushed files were updated
+    assert len([u for u in db.updates if u is not None]) == len(staged_files) - 1
+    assert len([t for t in pipeline.tasks if t.state == 'delete']) == len(staged_files) - 1
+    assert [t.failed_stage for t in pipeline.tasks if t.state == 'failed'] == ['db_update']
+
+def test_limits_not_valid():
+    log = logging.getLogger('test_limits_not_valid')
+    log.debug('Testing that only the concurrent stages can be limited')
+
+    with pytest.raises(Exception):
+        ArchivePipeline(db=MockDB([]), api=MockAPI(), limits={'db_update': 1})
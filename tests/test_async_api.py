@@ -0,0 +1,116 @@
+import pytest
+import logging
+import asyncio
+import random
+
+aiohttp = pytest.importorskip('aiohttp')
+from aiohttp import web
+
+from igsr_archive.async_api import AsyncAPI
+from igsr_archive.utils import parse_retry_after
+from igsr_archive.config import CONFIG
+
+logging.basicConfig(level=logging.DEBUG)
+
+class MockFIRE(object):
+    """
+    FIRE API with the objects in 'paths'. The first request
+    for each of the paths in 'throttle' gets a 429 response
+    """
+    def __init__(self, paths, throttle=()):
+        self.paths = set(paths)
+        self.throttle = set(throttle)
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request):
+        path = request.match_info['path']
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(random.uniform(0, 0.01))
+            if path in self.throttle:
+                self.throttle.remove(path)
+                return web.Response(status=429, headers={'Retry-After': '0'})
+            if path not in self.paths:
+                return web.json_response({'statusCode': 404}, status=404)
+            return web.json_response({'objectId': 1,
+                                      'fireOid': path.replace('/', '_'),
+                                      'objectMd5': '369ccfaf31586363bd645d48b72c09c4',
+                                      'objectSize': 10,
+                                      'filesystemEntry': {'path': f"/{path}",
+                                                          'published': True}})
+        finally:
+            self.in_flight -= 1
+
+def fetch_all(fire, fire_paths, concurrency):
+    """
+    Run 'fire' in a local server and fetch 'fire_paths' from it
+    """
+    async def run():
+        app = web.Application()
+        app.router.add_get('/fire/v1.1/objects/path/{path:.*}', fire.handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        CONFIG['fire']['root_endpoint'] = f"http://127.0.0.1:{port}/fire"
+        try:
+            aapi = AsyncAPI(pwd='pwd', concurrency=concurrency)
+            results = [r async for r in aapi.fetch_objects(iter(fire_paths))]
+        finally:
+            await runner.cleanup()
+        return aapi, results
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+@pytest.fixture
+def fire_config(monkeypatch):
+    monkeypatch.setitem(CONFIG['fire'], 'root_endpoint', CONFIG.get('fire', 'root_endpoint'))
+    monkeypatch.setitem(CONFIG['fire'], 'version', 'v1.1')
+    monkeypatch.setitem(CONFIG['fire'], 'retry_backoff', '0')
+
+def test_fetch_objects(fire_config):
+    log = logging.getLogger('test_fetch_objects')
+    log.debug('Testing that FIRE objects are fetched concurrently and yielded in order')
+
+    fire_paths = [f"ftp/dir/file_{i}.txt" for i in range(50)]
+    fire = MockFIRE(fire_paths[::2])
+
+    aapi, results = fetch_all(fire, fire_paths, concurrency=5)
+
+    assert [p for p, o in results] == fire_paths
+    for i, (p, o) in enumerate(results):
+        if i % 2:
+            assert o is None
+        else:
+            assert o.path == f"/{p}"
+            assert o.objectMd5 == '369ccfaf31586363bd645d48b72c09c4'
+    assert 1 < fire.max_in_flight <= 5
+
+def test_fetch_objects_throttled(fire_config):
+    log = logging.getLogger('test_fetch_objects_throttled')
+    log.debug('Testing that requests getting a 429 response are retried')
+
+    fire_paths = [f"ftp/dir/file_{i}.txt" for i in range(5)]
+    fire = MockFIRE(fire_paths, throttle=fire_paths[:2])
+
+    aapi, results = fetch_all(fire, fire_paths, concurrency=2)
+
+    assert all(o is not None for p, o in results)
+    assert aapi.stats['throttled'] == 2
+    assert aapi.stats['retries'] == 2
+
+def test_parse_retry_after():
+    log = logging.getLogger('test_parse_retry_after')
+    log.debug('Testing the parsing of the Retry-After header')
+
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('not a date') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
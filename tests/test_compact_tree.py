@@ -0,0 +1,83 @@
+import pytest
+import logging
+import os
+
+from igsr_archive.compact_tree import CompactTree, dict_memory_usage
+from igsr_archive.current_tree import CurrentTree
+
+logging.basicConfig(level=logging.DEBUG)
+
+@pytest.fixture
+def data_dict():
+    return {'ftp/pilot_data/README.bas': 'fa808f1eea6b53e65b1ae3c0931023f8',
+            'ftp/pilot_data/README.alignment.index': 'a374bad4b04ad8403b9a7f30f1aaca5f',
+            'ftp/CHANGELOG': 'bffb27eeac035b72c5a472b0fc7fde74',
+            'ftp/release/2009_02/release_2009_02.index': None,
+            'current.tree': 'NOT_A_MD5'}
+
+def test_lookup(data_dict):
+    log = logging.getLogger('test_lookup')
+    log.debug('Testing the dict-like lookup of a CompactTree object')
+
+    ctree = CompactTree(data_dict)
+
+    assert len(ctree) == len(data_dict)
+    assert ctree['ftp/pilot_data/README.bas'] == 'fa808f1eea6b53e65b1ae3c0931023f8'
+    assert ctree['ftp/release/2009_02/release_2009_02.index'] is None
+    assert ctree['current.tree'] == 'NOT_A_MD5'
+    assert 'ftp/pilot_data/README.bas' in ctree
+    assert 'ftp/pilot_data/README' not in ctree
+    with pytest.raises(KeyError):
+        ctree['ftp/README.bas']
+
+def test_iteration_order(data_dict):
+    log = logging.getLogger('test_iteration_order')
+    log.debug('Testing that a CompactTree object is iterated in insertion order')
+
+    ctree = CompactTree(data_dict)
+
+    assert list(ctree) == list(data_dict)
+    assert list(ctree.items()) == list(data_dict.items())
+    assert ctree == data_dict
+
+def test_overwrite(data_dict):
+    log = logging.getLogger('test_overwrite')
+    log.debug('Testing that an existing path can be modified')
+
+    ctree = CompactTree(data_dict)
+    ctree['ftp/release/2009_02/release_2009_02.index'] = '7b94db31f7063f185071e21ba5242ae0'
+
+    assert len(ctree) == len(data_dict)
+    assert ctree['ftp/release/2009_02/release_2009_02.index'] == '7b94db31f7063f185071e21ba5242ae0'
+
+def test_set_operations(data_dict):
+    log = logging.getLogger('test_set_operations')
+    log.debug('Testing the set operations of the CompactTree keys')
+
+    ctree = CompactTree(data_dict)
+
+    assert ctree.keys() - {'ftp/CHANGELOG', 'current.tree'} == \
+           {'ftp/pilot_data/README.bas', 'ftp/pilot_data/README.alignment.index',
+            'ftp/release/2009_02/release_2009_02.index'}
+
+def test_memory_usage():
+    log = logging.getLogger('test_memory_usage')
+    log.debug('Testing that a CompactTree uses less memory than a dict')
+
+    data_dict = {f"ftp/data_collections/1000_genomes_project/data/SAMPLE{i % 100}/file_{i}.cram":
+                 f"{i:032x}" for i in range(10000)}
+    ctree = CompactTree(data_dict)
+
+    assert ctree.memory_usage() < dict_memory_usage(data_dict)
+
+def test_get_file_dict_compact():
+    log = logging.getLogger('test_get_file_dict_compact')
+    log.debug('Testing \'get_file_dict\' function returning a CompactTree object')
+
+    ct_obj = CurrentTree(db=None, api=None, staging_tree=None,
+                         prod_tree=os.getenv('DATADIR')+"/ctree/current.moved.tree")
+
+    ctree = ct_obj.get_file_dict(compact=True)
+
+    assert isinstance(ctree, CompactTree)
+    assert ctree == ct_obj.get_file_dict()
@@ -0,0 +1,149 @@
+import pytest
+import logging
+import threading
+
+import pymysql
+
+from igsr_archive.connection_pool import ConnectionPool
+from igsr_archive.db import DB
+
+logging.basicConfig(level=logging.DEBUG)
+
+class MockCursor(object):
+    """
+    Cursor returning the rows of its connection
+    """
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+class MockConnection(object):
+    """
+    Connection that can be dropped by the 'server'
+    """
+    def __init__(self):
+        self.dropped = False
+        self.closed = False
+        self.rows = []
+
+    def cursor(self, cursor_type=None):
+        return MockCursor(self.rows)
+
+    def commit(self):
+        pass
+
+    def ping(self, reconnect=False):
+        if self.dropped:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+class MockDB(DB):
+    """
+    DB using MockConnection objects
+    """
+    def set_conn(self):
+        return MockConnection()
+
+def test_get_reuses_conn():
+    log = logging.getLogger('test_get_reuses_conn')
+    log.debug('Testing that idle connections are reused')
+
+    pool = ConnectionPool(MockConnection, size=2)
+    conn = pool.get()
+    pool.put(conn)
+
+    assert pool.get() is conn
+    assert pool.stats()['created'] == 1
+
+def test_get_replaces_dropped_conn():
+    log = logging.getLogger('test_get_replaces_dropped_conn')
+    log.debug('Testing that a dropped connection is replaced when checked out')
+
+    pool = ConnectionPool(MockConnection, size=1, check_interval=0)
+    conn = pool.get()
+    conn.dropped = True
+    pool.put(conn)
+
+    new_conn = pool.get()
+
+    assert new_conn is not conn
+    assert conn.closed is True
+    assert pool.stats()['reconnects'] == 1
+
+def test_get_blocks_when_exhausted():
+    log = logging.getLogger('test_get_blocks_when_exhausted')
+    log.debug('Testing that no more than \'size\' connections are opened')
+
+    pool = ConnectionPool(MockConnection, size=1)
+    conn = pool.get()
+
+    with pytest.raises(Exception):
+        pool.get(timeout=0.01)
+
+    # the connection is returned by another thread
+    threading.Timer(0.01, pool.put, args=[conn]).start()
+
+    assert pool.get(timeout=5) is conn
+
+def test_discard():
+    log = logging.getLogger('test_discard')
+    log.debug('Testing that discarding a connection frees its slot in the pool')
+
+    pool = ConnectionPool(MockConnection, size=1)
+    conn = pool.get()
+    pool.discard(conn)
+
+    assert conn.closed is True
+    assert pool.get(timeout=0.01) is not conn
+
+def test_get_default_timeout():
+    log = logging.getLogger('test_get_default_timeout')
+    log.debug('Testing that get() raises after the default timeout of the pool')
+
+    pool = ConnectionPool(MockConnection, size=1, timeout=0.01)
+    pool.get()
+
+    with pytest.raises(Exception):
+        pool.get()
+
+def test_thread_conn_released():
+    log = logging.getLogger('test_thread_conn_released')
+    log.debug('Testing that the connection of a finished thread is returned to the pool')
+
+    db = MockDB(pwd='mockpwd', dbname='mockdb', pool_size=2)
+    conns = []
+    def worker():
+        conns.append(db.conn)
+
+    for _ in range(4):
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+
+    # the main thread and one worker at a time
+    assert db.pool.stats()['created'] == 2
+    assert db.pool.stats()['idle'] == 1
+
+def test_fetch_files_by_pattern_one_conn():
+    log = logging.getLogger('test_fetch_files_by_pattern_one_conn')
+    log.debug('Testing that fetch_files_by_pattern uses the connection of the thread')
+
+    db = MockDB(pwd='mockpwd', dbname='mockdb', pool_size=1)
+    db.pool.timeout = 0.01
+    db.conn.rows.append(("/nfs/1000g-archive/vol1/ftp/file.txt",))
+
+    assert db.fetch_files_by_pattern("/nfs/1000g-archive/vol1/ftp/") == ["/nfs/1000g-archive/vol1/ftp/file.txt"]
+    assert db.pool.stats()['created'] == 1
@@ -93,6 +93,59 @@ def test_cmp_dicts_moved(ct_obj, db_dict):
 
     assert changeObj.moved == expected
 
+def test_cmp_dicts_moved_shared_md5():
+    log = logging.getLogger('test_cmp_dicts_moved_shared_md5')
+
+    log.debug('Testing \'cmp_dicts\' function in which several records '
+              'share the md5 of the moved records')
+
+    ctree = CurrentTree(db=None, api=None, staging_tree=None, prod_tree=None)
+
+    file_dict = {'ftp/a/file1.txt': 'md5_1',
+                 'ftp/a/file2.txt': 'md5_1',
+                 'ftp/a/file3.txt': 'md5_2'}
+    db_dict = {'ftp/b/file1.txt': 'md5_1',
+               'ftp/b/file2.txt': 'md5_1',
+               'ftp/a/file3.txt': 'md5_2',
+               'ftp/changelog_details/changelog_details_20210101_new': 'md5_3'}
+
+    changeObj = ctree.cmp_dicts(db_dict=db_dict, file_dict=file_dict)
+
+    assert changeObj.moved == {'ftp/b/file1.txt': 'ftp/a/file1.txt',
+                               'ftp/b/file2.txt': 'ftp/a/file2.txt'}
+    assert changeObj.new == set()
+    assert changeObj.withdrawn == set()
+    assert changeObj.replacement == {}
+
+@pytest.mark.parametrize("prod_tree", ["current.minus1.tree", "current.plus1.tree",
+                                       "current.moved.tree", "current.mod.tree"])
+@pytest.mark.parametrize("mem_budget", [200, 2**20])
+def test_cmp_trees(db_dict, prod_tree, mem_budget, tmp_path):
+    log = logging.getLogger('test_cmp_trees')
+    log.debug('Testing that \'cmp_trees\' function gives the same result than '
+              '\'cmp_dicts\'')
+
+    # write the records in db_dict to a current.tree file in reverse order, so it
+    # needs to be sorted
+    staging_tree = str(tmp_path / "current.tree")
+    with open(staging_tree, 'w') as f:
+        for name, md5 in reversed(list(db_dict.items())):
+            f.write(f"{name}\tfile\t1\t2021-02-12 14:46:34\t{md5}\t\n")
+
+    ct_obj = CurrentTree(db=None, api=None, staging_tree=staging_tree,
+                         prod_tree=os.getenv('DATADIR')+f"/ctree/{prod_tree}")
+    db_dict = dict(reversed(list(db_dict.items())))
+
+    expected = ct_obj.cmp_dicts(db_dict=db_dict, file_dict=ct_obj.get_file_dict())
+    changeObj = ct_obj.cmp_trees(tmpdir=str(tmp_path), mem_budget=mem_budget)
+
+    assert changeObj.new == expected.new
+    assert changeObj.withdrawn == expected.withdrawn
+    assert changeObj.moved == expected.moved
+    assert changeObj.replacement == expected.replacement
+    # temporary files are removed
+    assert os.listdir(str(tmp_path)) == ["current.tree"]
+
 def test_run_nochges(db_obj, conn_api, load_changelog_file, del_from_db):
     log = logging.getLogger('test_run_nochges')
 
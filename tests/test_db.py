@@ -2,6 +2,7 @@ import pytest
 import logging
 import os
 import pdb
+import threading
 
 from igsr_archive.db import DB
 from igsr_archive.file import File
@@ -48,6 +49,22 @@ def test_conn_e():
         db = DB(pwd="mockpwd",
                 dbname=dbname)
 
+def test_connection(db_obj):
+    log = logging.getLogger('test_connection')
+    log.debug('Testing that each thread checks out its own connection')
+
+    conns = []
+    def worker():
+        with db_obj.connection() as conn:
+            conns.append(conn)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+
+    assert conns[0] is not db_obj.conn
+    assert db_obj.pool.stats()['idle'] == 1
+
 def test_load_f(db_obj, del_obj):
     log = logging.getLogger('test_load_f')
 
@@ -62,6 +79,37 @@ def test_load_f(db_obj, del_obj):
 
     del_obj.append(f)
 
+def test_load_files(db_obj, del_obj):
+    log = logging.getLogger('test_load_files')
+
+    log.debug('Testing \'load_files\' function to load several file entries in DB')
+
+    files = [File(name=os.getenv('DATADIR')+"/test.txt", type="TYPE_F"),
+             File(name=os.getenv('DATADIR')+"/test1.txt", type="TYPE_F")]
+
+    codes = db_obj.load_files(files, batch_size=1, dry=False)
+
+    del_obj.extend(files)
+
+    assert codes == [0, 0]
+    assert db_obj.fetch_file(path=files[1].name) is not None
+
+def test_load_files_existing(db_obj, del_obj):
+    log = logging.getLogger('test_load_files_existing')
+
+    log.debug('Testing that \'load_files\' does not load the entries that are already in the DB')
+
+    files = [File(name=os.getenv('DATADIR')+"/test.txt", type="TYPE_F"),
+             File(name=os.getenv('DATADIR')+"/test1.txt", type="TYPE_F")]
+
+    assert db_obj.load_file(files[0], dry=False) == 0
+    del_obj.extend(files)
+
+    codes = db_obj.load_files(files, dry=False)
+
+    assert codes == [1, 0]
+    assert db_obj.fetch_file(path=files[1].name) is not None
+
 def test_update_f(db_obj, del_obj):
     log = logging.getLogger('test_update_f')
 
@@ -88,6 +136,29 @@ def test_update_f(db_obj, del_obj):
 
     del_obj.append(f1)
 
+def test_update_files(db_obj, del_obj):
+    log = logging.getLogger('test_update_files')
+
+    log.debug("Testing \'update_files\' function to update several attributes "
+              "of several entries in the \'file\' table of the DB")
+
+    f = File(
+        name=os.getenv('DATADIR')+"/test.txt",
+        type="TYPE_F")
+
+    db_obj.load_file(f, dry=False)
+
+    new_name = os.getenv('DATADIR')+"/test_renamed.txt"
+    codes = db_obj.update_files([(f.name, {'type': 'TYPE_G', 'name': new_name}),
+                                 ("/not/in/db.txt", {'type': 'TYPE_G'})],
+                                dry=False)
+
+    f1 = db_obj.fetch_file(path=new_name)
+    del_obj.append(f1)
+
+    assert codes == [0, 1]
+    assert f1.type == 'TYPE_G'
+
 def test_delete_f(db_obj):
     log = logging.getLogger('test_delete_f')
 
@@ -170,6 +241,50 @@ def test_fetch_f_not_exists_w_basename(db_obj):
 
     assert f == None
 
+def test_fetch_files(db_obj, del_obj):
+    log = logging.getLogger('test_fetch_files')
+    log.debug('Testing function to fetch several files by path and basename')
+
+    f = File(
+        name=os.getenv('DATADIR')+"/test.txt",
+        type="TYPE_F"
+    )
+
+    db_obj.load_file(f, dry=False)
+    del_obj.append(f)
+
+    found = db_obj.fetch_files(paths=[f.name, "/not/in/db.txt"],
+                               basenames=["test.txt", "not_in_db.txt"])
+
+    assert set(found.keys()) == {f.name, "test.txt"}
+    assert found["test.txt"].name == f.name
+
+def test_iter_files(db_obj, del_obj):
+    log = logging.getLogger('test_iter_files')
+    log.debug('Testing function to iterate over the files with a certain prefix')
+
+    f = File(
+        name=os.getenv('DATADIR')+"/test.txt",
+        type="TYPE_F"
+    )
+
+    db_obj.load_file(f, dry=False)
+    del_obj.append(f)
+
+    prefix = os.path.dirname(f.name) + "/"
+    files = list(db_obj.iter_files(prefix=prefix, batch_size=1))
+    assert f.name in [fo.name for fo in files]
+
+    rows = list(db_obj.iter_files(prefix=prefix, columns=('name', 'md5'), row_type='tuple'))
+    assert (f.name, f.md5) in rows
+
+    # nothing matches, as the '_' wildcard is escaped
+    assert list(db_obj.iter_files(prefix=prefix.replace("/", "_"))) == []
+
+    # the connection can be used while iterating
+    for fo in db_obj.iter_files(prefix=prefix, row_type='dict'):
+        assert db_obj.fetch_file(path=fo['name']) is not None
+
 def test_get_ctree(db_obj):
     log = logging.getLogger('test_get_ctree_l')
 
@@ -183,3 +298,15 @@ def test_get_ctree(db_obj):
     assert os.path.exists(ctree_path == 1)
     assert len(data_dict.keys()) == 10
 
+def test_get_ctree_wo_dict(db_obj):
+    log = logging.getLogger('test_get_ctree_wo_dict')
+
+    log.debug('Testing \'get_ctree\' function to get the current.same.tree file'
+              'from the DB without creating the {path: md5} dict')
+
+    fields = ['name', 'size', 'updated', 'md5']
+    ctree_path, data_dict = db_obj.get_ctree(fields, outfile=os.getenv('DATADIR')+"/current.same.tree",
+                                             limit=10, batch_size=3, ret_dict=False)
+    assert data_dict is None
+    with open(ctree_path) as f:
+        assert len(f.readlines()) == 10
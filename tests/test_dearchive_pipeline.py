@@ -0,0 +1,197 @@
+import pytest
+import logging
+import hashlib
+import json
+import os
+import threading
+
+from igsr_archive.dearchive_pipeline import DearchivePipeline
+from igsr_archive.file import File
+from igsr_archive.object import fObject
+
+logging.basicConfig(level=logging.DEBUG)
+
+CONTENT = {f"file_{i}.txt": f"file {i}\n".encode() for i in range(5)}
+
+class MockDB(object):
+    """
+    DB with the entries of the archived files
+    """
+    def __init__(self, names):
+        self.files = {n: File(name=n, md5sum="md5", size=1, type="TXT") for n in names}
+        self.deleted = []
+
+    def fetch_files(self, paths=None, basenames=None):
+        found = {p: self.files[p] for p in paths or [] if p in self.files}
+        for b in basenames or []:
+            for n, f in self.files.items():
+                if os.path.basename(n) == b:
+                    found[b] = f
+        return found
+
+    def delete_files(self, names, batch_size=1000, dry=True, missing_ok=False):
+        codes = []
+        for name in names:
+            if self.files.pop(name, None) is not None:
+                self.deleted.append(name)
+                codes.append(0)
+            else:
+                codes.append(0 if missing_ok else 1)
+        return codes
+
+class MockAPI(object):
+    """
+    FIRE API with the objects in CONTENT. The md5sum of
+    the objects in 'corrupted' does not match their content
+    """
+    def __init__(self, corrupted=()):
+        self.corrupted = corrupted
+        self.downloaded = []
+        self.deleted = []
+        self.lock = threading.Lock()
+
+    def fetch_object(self, firePath=None):
+        basename = os.path.basename(firePath)
+        md5 = hashlib.md5(CONTENT[basename]).hexdigest()
+        return fObject(fireOid=basename, objectSize=len(CONTENT[basename]),
+                       objectMd5="0" * 32 if basename in self.corrupted else md5)
+
+    def download_object(self, firePath, outfile, workers=None, expected_size=None):
+        data = CONTENT[os.path.basename(firePath)]
+        with open(outfile, 'wb') as f:
+            f.write(data)
+        with self.lock:
+            self.downloaded.append(firePath)
+        return {'path': outfile, 'md5': hashlib.md5(data).hexdigest(), 'size': len(data)}
+
+    def delete_objects(self, fireOids, workers=None, dry=True):
+        self.deleted.extend(fireOids)
+        return [0] * len(fireOids)
+
+@pytest.fixture
+def archived(tmp_path):
+    names = [f"/nfs/1000g-archive/vol1/ftp/dir/{b}" for b in CONTENT]
+    outdir = tmp_path / "out"
+    outdir.mkdir()
+    return names, str(outdir)
+
+def test_run(archived, tmp_path):
+    log = logging.getLogger('test_run')
+    log.debug('Testing the dearchival of several files at once')
+
+    names, outdir = archived
+    db = MockDB(names)
+    api = MockAPI(corrupted=("file_4.txt",))
+    journal = str(tmp_path / "journal.jsonl")
+
+    pipeline = DearchivePipeline(db=db, api=api, directory=outdir, workers=3, batch_size=2,
+                                 journal=journal, dry=False)
+    # the first file is provided by its basename
+    summary = pipeline.run(["file_0.txt"] + names[1:])
+
+    assert summary['dearchived'] == 4
+    assert list(summary['failed']) == [names[4]]
+    assert summary['failed'][names[4]][0] == 'verify'
+    assert sorted(db.deleted) == names[:4]
+    assert sorted(api.deleted) == [f"file_{i}.txt" for i in range(4)]
+    for i in range(4):
+        with open(os.path.join(outdir, f"file_{i}.txt"), 'rb') as f:
+            assert f.read() == CONTENT[f"file_{i}.txt"]
+    assert os.path.exists(os.path.join(outdir, "file_4.txt")) is False
+
+    with open(journal) as f:
+        states = [json.loads(line)['state'] for line in f]
+    assert states.count('delete_db') == 4
+
+def test_run_resume(archived, tmp_path):
+    log = logging.getLogger('test_run_resume')
+    log.debug('Testing that the files already dearchived in the journal are not downloaded again')
+
+    names, outdir = archived
+    journal = str(tmp_path / "journal.jsonl")
+    with open(journal, 'w') as f:
+        f.write(json.dumps({'path': names[0], 'state': 'delete_db', 'db_name': names[0],
+                            'fireOid': "file_0.txt", 'outfile': None}) + "\n")
+        f.write(json.dumps({'path': names[1], 'state': 'delete_fire', 'db_name': names[1],
+                            'fireOid': "file_1.txt", 'outfile': None}) + "\n")
+        # interrupted while writing
+        f.write('{"path": ')
+
+    db = MockDB(names)
+    api = MockAPI()
+    pipeline = DearchivePipeline(db=db, api=api, directory=outdir, journal=journal, dry=False)
+    summary = pipeline.run(names)
+
+    assert summary['dearchived'] == 5
+    assert sorted(api.downloaded) == [f"ftp/dir/file_{i}.txt" for i in range(2, 5)]
+    assert sorted(api.deleted) == [f"file_{i}.txt" for i in range(2, 5)]
+    assert sorted(db.deleted) == names[1:]
+    # the entries of this run are readable
+    with open(journal) as f:
+        lines = f.read().splitlines()
+    assert lines[2] == '{"path": '
+    assert sum(json.loads(line)['state'] == 'delete_db' for line in lines[3:]) == 4
+
+def test_run_resume_deleted(archived, tmp_path):
+    log = logging.getLogger('test_run_resume_deleted')
+    log.debug('Testing that a resumed file whose DB entry was already deleted is not reported as failed')
+
+    names, outdir = archived
+    journal = str(tmp_path / "journal.jsonl")
+    # the previous run deleted the DB entry of file_0, but
+    # it was interrupted before writing the 'delete_db' line
+    with open(journal, 'w') as f:
+        f.write(json.dumps({'path': names[0], 'state': 'delete_fire', 'db_name': names[0],
+                            'fireOid': "file_0.txt", 'outfile': None}) + "\n")
+
+    db = MockDB(names[1:])
+    api = MockAPI()
+    pipeline = DearchivePipeline(db=db, api=api, directory=outdir, journal=journal, dry=False)
+    summary = pipeline.run(names[:2])
+
+    assert summary['dearchived'] == 2
+    assert summary['failed'] == {}
+    assert db.deleted == [names[1]]
+
+def test_run_resume_verify(archived, tmp_path):
+    log = logging.getLogger('test_run_resume_verify')
+    log.debug('Testing that the verified files in the journal are downloaded again if they changed')
+
+    names, outdir = archived
+    outfiles = [os.path.join(outdir, f"file_{i}.txt") for i in range(3)]
+    # file_0 is intact, file_1 is truncated and file_2 was removed
+    with open(outfiles[0], 'wb') as f:
+        f.write(CONTENT["file_0.txt"])
+    with open(outfiles[1], 'wb') as f:
+        f.write(CONTENT["file_1.txt"][:2])
+    journal = str(tmp_path / "journal.jsonl")
+    with open(journal, 'w') as f:
+        for i in range(3):
+            f.write(json.dumps({'path': names[i], 'state': 'verify', 'db_name': names[i],
+                                'fireOid': f"file_{i}.txt", 'outfile': outfiles[i],
+                                'size': len(CONTENT[f"file_{i}.txt"])}) + "\n")
+
+    db = MockDB(names)
+    api = MockAPI()
+    pipeline = DearchivePipeline(db=db, api=api, directory=outdir, journal=journal, dry=False)
+    summary = pipeline.run(names[:3])
+
+    assert summary['dearchived'] == 3
+    assert sorted(api.downloaded) == ["ftp/dir/file_1.txt", "ftp/dir/file_2.txt"]
+    for i in range(3):
+        with open(outfiles[i], 'rb') as f:
+            assert f.read() == CONTENT[f"file_{i}.txt"]
+
+def test_run_no_space(archived):
+    log = logging.getLogger('test_run_no_space')
+    log.debug('Testing that files are not downloaded if there is no space left')
+
+    names, outdir = archived
+    db = MockDB(names)
+    api = MockAPI()
+    pipeline = DearchivePipeline(db=db, api=api, directory=outdir, min_free=2**62, dry=False)
+    summary = pipeline.run(names)
+
+    assert api.downloaded == []
+    assert db.deleted == []
+    assert all(stage == 'download' for stage, error in summary['failed'].values())
@@ -0,0 +1,54 @@
+import pytest
+import logging
+import random
+
+from igsr_archive.extsort import external_sort, is_sorted
+
+logging.basicConfig(level=logging.DEBUG)
+
+@pytest.fixture
+def unsorted_file(tmp_path):
+    rnd = random.Random(1)
+    lines = [f"ftp/file_{rnd.randint(0, 500)}\t{i}\n" for i in range(2000)]
+    path = tmp_path / "unsorted.txt"
+    path.write_text("".join(lines))
+
+    return str(path), lines
+
+def key(line):
+    return line.split("\t")[0]
+
+def test_external_sort_in_memory(unsorted_file, tmp_path):
+    log = logging.getLogger('test_external_sort_in_memory')
+    log.debug('Testing \'external_sort\' when all lines fit in memory')
+
+    infile, lines = unsorted_file
+    outfile = external_sort(infile, str(tmp_path / "sorted.txt"), key=key)
+
+    assert is_sorted(outfile, key=key) is True
+    with open(outfile) as f:
+        assert f.readlines() == sorted(lines, key=key)
+
+def test_external_sort_runs(unsorted_file, tmp_path, monkeypatch):
+    log = logging.getLogger('test_external_sort_runs')
+    log.debug('Testing \'external_sort\' merging several sorted runs in more than one pass')
+
+    monkeypatch.setattr('igsr_archive.extsort.MAX_FANIN', 4)
+    infile, lines = unsorted_file
+    # sort the file in place
+    outfile = external_sort(infile, infile, key=key, mem_budget=2000, tmpdir=str(tmp_path))
+
+    assert outfile == infile
+    with open(outfile) as f:
+        # the sort is stable
+        assert f.readlines() == sorted(lines, key=key)
+    # temporary runs are removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["unsorted.txt"]
+
+def test_is_sorted(unsorted_file):
+    log = logging.getLogger('test_is_sorted')
+    log.debug('Testing \'is_sorted\' function')
+
+    infile, lines = unsorted_file
+
+    assert is_sorted(infile, key=key) is False
@@ -3,7 +3,7 @@ import datetime
 import os
 import pdb
 
-from igsr_archive.file import File
+from igsr_archive.file import File, md5sum, hash_files
 
 logging.basicConfig(level=logging.DEBUG)
 
@@ -103,3 +103,34 @@ def test_guess_type_default():
 
     assert f.guess_type() == "MISC"
 
+def test_md5sum():
+    log = logging.getLogger('test_md5sum')
+    log.debug('Testing function for calculating the md5sum and size of a file')
+
+    md5, size = md5sum(f"{os.getenv('DATADIR')}/test.txt", block_size=3)
+
+    assert md5 == "0b1578b3dbfca89caa03a88949d68fa4"
+    assert size == 8
+
+def test_f_wo_checksum():
+    log = logging.getLogger('test_f_wo_checksum')
+    log.debug('Instantiation without calculating the md5sum')
+
+    f = File(
+        name=f"{os.getenv('DATADIR')}/test.txt",
+        type="TYPE_F",
+        checksum=False)
+
+    assert not hasattr(f, 'md5')
+    assert f.size == 8
+
+def test_hash_files():
+    log = logging.getLogger('test_hash_files')
+    log.debug('Testing function for calculating the md5sum of several files at once')
+
+    files = [File(name=f"{os.getenv('DATADIR')}/test.txt", checksum=False) for i in range(3)]
+    stats = hash_files(files, workers=2)
+
+    assert [f.md5 for f in files] == ["0b1578b3dbfca89caa03a88949d68fa4"] * 3
+    assert stats['files'] == 3
+    assert stats['bytes'] == 24
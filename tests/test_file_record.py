@@ -0,0 +1,45 @@
+import pytest
+import logging
+import os
+
+from igsr_archive.db import FILE_COLUMNS
+from igsr_archive.file import File
+from igsr_archive.file_record import FileRecord
+
+logging.basicConfig(level=logging.DEBUG)
+
+def test_fields():
+    log = logging.getLogger('test_fields')
+    log.debug('Testing that the fields of FileRecord are the columns of the \'file\' table')
+
+    assert FileRecord._fields == FILE_COLUMNS
+
+def test_no_fs_access(monkeypatch):
+    log = logging.getLogger('test_no_fs_access')
+    log.debug('Testing that creating a FileRecord does not access the filesystem')
+
+    def fail(*args, **kwargs):
+        raise AssertionError("filesystem accessed")
+    monkeypatch.setattr(os.path, 'isfile', fail)
+    monkeypatch.setattr(os, 'stat', fail)
+
+    r = FileRecord._make((1, os.getenv('DATADIR')+"/test.txt", "f5aa4f4f1380b71acc56750e9f8ff825",
+                          "TXT", 8, 1, 0, None, None))
+    f = r.to_file()
+
+    assert isinstance(f, File)
+    assert f.name == r.name
+    assert f.md5 == "f5aa4f4f1380b71acc56750e9f8ff825"
+    assert f.size == 8
+    assert not hasattr(f, 'created')
+
+def test_read_only():
+    log = logging.getLogger('test_read_only')
+    log.debug('Testing that a FileRecord can not be modified')
+
+    r = FileRecord(name="/path/to/file.txt")
+
+    assert r.md5 is None
+    with pytest.raises(AttributeError):
+        r.md5 = "f5aa4f4f1380b71acc56750e9f8ff825"
+    assert r.to_file().host_id == 1
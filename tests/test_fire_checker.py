@@ -0,0 +1,142 @@
+import pytest
+import logging
+import json
+import os
+
+from igsr_archive.fire_checker import FireChecker
+from igsr_archive.config import CONFIG
+from igsr_archive.object import fObject
+
+logging.basicConfig(level=logging.DEBUG)
+
+class MockDB(object):
+    """
+    DB with the entries in 'rows'
+    """
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda r: (r['name'], r['file_id']))
+
+    def fetch_files_page(self, prefix, after=None, limit=1000):
+        rows = [r for r in self.rows if r['name'].startswith(prefix) and
+                (after is None or (r['name'], r['file_id']) > after)]
+        return rows[:limit]
+
+class MockAsyncAPI(object):
+    """
+    FIRE API with the objects in 'objects'. It raises
+    an Exception after 'fail_after' objects are fetched
+    """
+    def __init__(self, objects, fail_after=None):
+        self.objects = objects
+        self.fail_after = fail_after
+        self.fetched = []
+
+    async def fetch_objects(self, fire_paths, concurrency=None):
+        async for fire_path in fire_paths:
+            if self.fail_after is not None and len(self.fetched) == self.fail_after:
+                raise Exception("FIRE API is down")
+            self.fetched.append(fire_path)
+            yield fire_path, self.objects.get(fire_path)
+
+class MockAPI(object):
+    """
+    Synchronous FIRE API with the objects in 'objects'
+    """
+    def __init__(self, objects):
+        self.objects = objects
+        self.fetched = []
+
+    def fetch_object(self, firePath=None):
+        self.fetched.append(firePath)
+        return self.objects.get(firePath)
+
+@pytest.fixture
+def archive(monkeypatch):
+    monkeypatch.setitem(CONFIG['ftp'], 'ftp_mount', '/archive')
+
+    rows = [{'file_id': i + 1, 'name': f"/archive/ftp/file_{i}.txt", 'md5': f"md5_{i}", 'size': i}
+            for i in range(10)]
+    objects = {f"ftp/file_{i}.txt": fObject(objectMd5=f"md5_{i}", objectSize=i) for i in range(10)}
+    # file_3 is not archived, file_5 has a different size and file_7 a different md5
+    del objects["ftp/file_3.txt"]
+    objects["ftp/file_5.txt"].objectSize = 50
+    objects["ftp/file_7.txt"].objectMd5 = "md5_x"
+
+    return MockDB(rows), objects
+
+def read_report(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_run(archive, tmp_path):
+    log = logging.getLogger('test_run')
+    log.debug('Testing the check of the DB entries against FIRE')
+
+    db, objects = archive
+    report = str(tmp_path / "report.jsonl")
+    checker = FireChecker(db=db, aapi=MockAsyncAPI(objects), report=report, page_size=3)
+    summary = checker.run()
+
+    assert summary['checked'] == 10
+    assert summary['ok'] == 7
+    assert [(e['name'], e['issue']) for e in read_report(report)] == [
+        ("/archive/ftp/file_3.txt", 'missing'),
+        ("/archive/ftp/file_5.txt", 'size_mismatch'),
+        ("/archive/ftp/file_7.txt", 'md5_mismatch')]
+    assert os.path.exists(checker.checkpoint) is False
+
+def test_run_resume(archive, tmp_path):
+    log = logging.getLogger('test_run_resume')
+    log.debug('Testing that an interrupted check continues from the last checkpoint')
+
+    db, objects = archive
+    report = str(tmp_path / "report.jsonl")
+    aapi = MockAsyncAPI(objects, fail_after=6)
+    checker = FireChecker(db=db, aapi=aapi, report=report, page_size=3, checkpoint_every=2)
+
+    with pytest.raises(Exception):
+        checker.run()
+    assert os.path.exists(checker.checkpoint) is True
+
+    aapi = MockAsyncAPI(objects)
+    checker = FireChecker(db=db, aapi=aapi, report=report, page_size=3, checkpoint_every=2)
+    summary = checker.run()
+
+    # only the files after the checkpoint are fetched again
+    assert aapi.fetched == [f"ftp/file_{i}.txt" for i in range(6, 10)]
+    assert summary['checked'] == 10
+    assert [e['name'] for e in read_report(report)] == ["/archive/ftp/file_3.txt",
+                                                        "/archive/ftp/file_5.txt",
+                                                        "/archive/ftp/file_7.txt"]
+
+def test_run_same_name(archive, tmp_path):
+    log = logging.getLogger('test_run_same_name')
+    log.debug('Testing that the entries with the same name are all checked')
+
+    db, objects = archive
+    # entries with the same name and a different md5 at the end of a page
+    db.rows.insert(3, {'file_id': 11, 'name': "/archive/ftp/file_2.txt", 'md5': "md5_x", 'size': 2})
+    db.rows.insert(4, {'file_id': 12, 'name': "/archive/ftp/file_2.txt", 'md5': "md5_y", 'size': 2})
+    report = str(tmp_path / "report.jsonl")
+    checker = FireChecker(db=db, aapi=MockAsyncAPI(objects), report=report, page_size=3)
+    summary = checker.run()
+
+    assert summary['checked'] == 12
+    assert summary['md5_mismatch'] == 3
+
+def test_run_sync(archive, tmp_path):
+    log = logging.getLogger('test_run_sync')
+    log.debug('Testing the check of the DB entries against FIRE without an AsyncAPI')
+
+    db, objects = archive
+    report = str(tmp_path / "report.jsonl")
+    api = MockAPI(objects)
+    checker = FireChecker(db=db, aapi=None, api=api, report=report, page_size=3)
+    summary = checker.run()
+
+    assert summary['checked'] == 10
+    assert len(api.fetched) == 10
+    assert [(e['name'], e['issue']) for e in read_report(report)] == [
+        ("/archive/ftp/file_3.txt", 'missing'),
+        ("/archive/ftp/file_5.txt", 'size_mismatch'),
+        ("/archive/ftp/file_7.txt", 'md5_mismatch')]
@@ -0,0 +1,74 @@
+import pytest
+import logging
+import os
+
+from igsr_archive.md5_cache import MD5Cache
+from igsr_archive.file import File, hash_files, set_md5_cache
+
+logging.basicConfig(level=logging.DEBUG)
+
+@pytest.fixture
+def md5_cache(tmp_path):
+    cache = MD5Cache(str(tmp_path / "md5_cache.sqlite"))
+    set_md5_cache(cache)
+    yield cache
+    set_md5_cache(None)
+    cache.close()
+
+@pytest.fixture
+def staged_file(tmp_path):
+    path = tmp_path / "staged.txt"
+    path.write_text("staged\n")
+
+    return str(path)
+
+def test_calc_md5_w_cache(md5_cache, staged_file):
+    log = logging.getLogger('test_calc_md5_w_cache')
+    log.debug('Testing that a md5sum is only calculated once when using a md5 cache')
+
+    f1 = File(name=staged_file)
+    f2 = File(name=staged_file)
+
+    assert f1.md5 == f2.md5
+    assert md5_cache.hits == 1
+    assert md5_cache.misses == 1
+
+def test_calc_md5_w_stale_entry(md5_cache, staged_file):
+    log = logging.getLogger('test_calc_md5_w_stale_entry')
+    log.debug('Testing that a stale entry in the md5 cache is evicted')
+
+    f = File(name=staged_file)
+    # modify the file and force a different mtime
+    with open(staged_file, 'a') as fh:
+        fh.write("modified\n")
+    st = os.stat(staged_file)
+    os.utime(staged_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    f1 = File(name=staged_file)
+
+    assert f1.md5 != f.md5
+    assert md5_cache.evictions == 1
+    assert md5_cache.stats()['entries'] == 1
+
+def test_hash_files_w_cache(md5_cache, staged_file):
+    log = logging.getLogger('test_hash_files_w_cache')
+    log.debug('Testing \'hash_files\' when using a md5 cache')
+
+    md5 = File(name=staged_file).md5
+    files = [File(name=staged_file, checksum=False),
+             File(name=f"{os.getenv('DATADIR')}/test.txt", checksum=False)]
+    stats = hash_files(files, workers=2)
+
+    assert stats['cached'] == 1
+    assert stats['files'] == 1
+    assert [f.md5 for f in files] == [md5, "0b1578b3dbfca89caa03a88949d68fa4"]
+
+def test_purge(md5_cache, staged_file):
+    log = logging.getLogger('test_purge')
+    log.debug('Testing the purge of entries for files that do not exist anymore')
+
+    File(name=staged_file)
+    os.remove(staged_file)
+
+    assert md5_cache.purge() == 1
+    assert md5_cache.stats()['entries'] == 0